@@ -0,0 +1,219 @@
+"""Simulated-fleet benchmark.
+
+    python -m bench --agents 500 --duration 60                 # in-process, ASGI transport
+    python -m bench --url http://localhost:8080 --agents 2000  # running server
+    python -m bench --compare bench/results/old.json bench/results/new.json
+
+Agents are provisioned as real servers/agent_keys rows in the configured
+database (ids from --base-id) and removed afterwards unless --keep.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import time
+from datetime import UTC, datetime
+from pathlib import Path
+
+import httpx
+
+from bench.fleet import AdminReader, Mix, Recorder, VirtualAgent, cleanup, provision
+
+RESULTS_DIR = Path(__file__).parent / "results"
+STATEMENT_COUNT_PREFIX = "db_statement_duration_seconds_count"
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def statement_count(client: httpx.AsyncClient) -> int | None:
+    """Total SQL statements executed, summed from /metrics (per worker process)."""
+    try:
+        response = await client.get("/metrics")
+    except httpx.HTTPError:
+        return None
+    if response.status_code != 200:
+        return None
+    total = 0
+    for line in response.text.splitlines():
+        if line.startswith(STATEMENT_COUNT_PREFIX):
+            total += int(float(line.rsplit(" ", 1)[1]))
+    return total
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summarize(recorder: Recorder, elapsed: float, statements: int | None) -> dict:
+    operations = {}
+    total = 0
+    for op, values in sorted(recorder.latencies.items()):
+        values.sort()
+        total += len(values)
+        operations[op] = {
+            "requests": len(values),
+            "errors": recorder.errors.get(op, 0),
+            "rps": round(len(values) / elapsed, 1),
+            "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+            "max_ms": round(values[-1] * 1000, 2),
+        }
+    return {
+        "requests": total,
+        "errors": sum(recorder.errors.values()),
+        "rps": round(total / elapsed, 1),
+        "db_statements": statements,
+        "db_statements_per_request": round(statements / total, 3) if statements is not None and total else None,
+        "operations": operations,
+    }
+
+
+async def drive(client: httpx.AsyncClient, args, agents: list[tuple[int, str]]) -> dict:
+    mix = Mix(
+        interval=args.interval,
+        alerts_ratio=args.alerts_ratio,
+        alerts_per_request=args.alerts_per_request,
+        repeat_ratio=args.repeat_ratio,
+        poll_commands=not args.no_commands,
+    )
+    recorder = Recorder()
+    statements_before = await statement_count(client)
+
+    started = time.monotonic()
+    deadline = started + args.duration
+    tasks = [VirtualAgent(client, server_id, key, mix, recorder).run(deadline) for server_id, key in agents]
+    if args.admin_user:
+        server_ids = [server_id for server_id, _ in agents]
+        tasks += [
+            AdminReader(client, args.admin_user, server_ids, args.admin_interval, recorder).run(deadline)
+            for _ in range(args.admin_readers)
+        ]
+    await asyncio.gather(*tasks)
+    elapsed = time.monotonic() - started
+
+    statements_after = await statement_count(client)
+    statements = None
+    if statements_before is not None and statements_after is not None:
+        statements = statements_after - statements_before
+    return summarize(recorder, elapsed, statements)
+
+
+async def run(args) -> dict:
+    agents = await provision(args.agents, args.base_id)
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    try:
+        if args.url:
+            async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+                summary = await drive(client, args, agents)
+        else:
+            from src.main import app
+
+            # lifespan вручную: ASGITransport его не запускает, а без него не работают write-behind и снапшот
+            async with app.router.lifespan_context(app):
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(
+                    transport=transport, base_url="http://bench", limits=limits, timeout=args.timeout
+                ) as client:
+                    summary = await drive(client, args, agents)
+    finally:
+        if not args.keep:
+            await cleanup(args.agents, args.base_id)
+
+    return {
+        "label": args.label,
+        "revision": git_revision(),
+        "started_at": datetime.now(UTC).isoformat(),
+        "target": args.url or "asgi",
+        "python": platform.python_version(),
+        "config": {
+            "agents": args.agents,
+            "duration": args.duration,
+            "interval": args.interval,
+            "alerts_ratio": args.alerts_ratio,
+            "alerts_per_request": args.alerts_per_request,
+            "repeat_ratio": args.repeat_ratio,
+            "poll_commands": not args.no_commands,
+            "admin_readers": args.admin_readers if args.admin_user else 0,
+        },
+        "summary": summary,
+    }
+
+
+def print_summary(result: dict) -> None:
+    summary = result["summary"]
+    print(f"{result['target']} @ {result['revision']}: {summary['requests']} requests, {summary['rps']} req/s, "
+          f"{summary['errors']} errors, {summary['db_statements_per_request']} statements/request")
+    print(f"{'operation':<16}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for op, row in summary["operations"].items():
+        print(f"{op:<16}{row['requests']:>10}{row['errors']:>8}{row['rps']:>10}"
+              f"{row['p50_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}")
+
+
+def _delta(old, new) -> str:
+    if old is None or new is None:
+        return "n/a"
+    if not old:
+        return f"{new}"
+    return f"{new} ({(new - old) / old * 100:+.1f}%)"
+
+
+def compare(old_path: Path, new_path: Path) -> None:
+    old = json.loads(old_path.read_text())
+    new = json.loads(new_path.read_text())
+    print(f"{old.get('revision')} -> {new.get('revision')}")
+    for key in ("rps", "errors", "db_statements_per_request"):
+        print(f"  {key:<28}{old['summary'][key]!s:>12} -> {_delta(old['summary'][key], new['summary'][key])}")
+    for op, new_row in new["summary"]["operations"].items():
+        old_row = old["summary"]["operations"].get(op, {})
+        print(f"  {op}")
+        for key in ("rps", "p50_ms", "p99_ms", "errors"):
+            print(f"    {key:<26}{old_row.get(key)!s:>12} -> {_delta(old_row.get(key), new_row[key])}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Simulated agent fleet benchmark")
+    parser.add_argument("--url", help="Benchmark a running server instead of the app in-process")
+    parser.add_argument("--agents", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds")
+    parser.add_argument("--interval", type=float, default=Mix.interval, help="Heartbeat interval per agent; 0 = saturate")
+    parser.add_argument("--alerts-ratio", type=float, default=Mix.alerts_ratio)
+    parser.add_argument("--alerts-per-request", type=int, default=Mix.alerts_per_request)
+    parser.add_argument("--repeat-ratio", type=float, default=Mix.repeat_ratio)
+    parser.add_argument("--no-commands", action="store_true", help="Do not poll GET /agent/commands")
+    parser.add_argument("--admin-user", help="Existing admin_users name; enables dashboard readers")
+    parser.add_argument("--admin-readers", type=int, default=2)
+    parser.add_argument("--admin-interval", type=float, default=1.0)
+    parser.add_argument("--connections", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--base-id", type=int, default=900_000_000, help="First server id of the virtual fleet")
+    parser.add_argument("--keep", action="store_true", help="Keep provisioned servers and keys")
+    parser.add_argument("--label", default="", help="Free-form tag stored in the result")
+    parser.add_argument("--output", type=Path, help=f"Result JSON (default: {RESULTS_DIR}/<timestamp>.json)")
+    parser.add_argument("--compare", nargs=2, type=Path, metavar=("OLD", "NEW"), help="Compare two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    result = asyncio.run(run(args))
+    print_summary(result)
+    output = args.output or RESULTS_DIR / f"{datetime.now(UTC):%Y%m%dT%H%M%S}-{result['revision'] or 'local'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+    print(f"Saved {output}")
+
+
+if __name__ == "__main__":
+    main()
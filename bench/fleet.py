@@ -0,0 +1,183 @@
+"""Virtual agent fleet: provisioning and traffic generation for the benchmark."""
+import asyncio
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+
+import httpx
+from sqlalchemy import delete, insert
+
+from src.config import settings
+from src.database import async_session
+from src.models.db_models import AgentKey, Server
+from src.security.admin_jwt import create_jwt
+from src.security.agent_key import generate_agent_key
+
+API = settings.API_VERSION
+
+SEVERITIES = ["Normal", "Minor", "Major", "Critical"]
+SEVERITY_WEIGHTS = [50, 30, 15, 5]
+SOURCES = ["cgm", "admin", "disk", "network", "db"]
+ALERT_TEMPLATES = [
+    "Disk usage {n}% on /var",
+    "Service restarted after {n} s",
+    "Connection to db timed out after {n} ms",
+    "Queue length {n} exceeds threshold",
+    "Certificate expires in {n} days",
+]
+
+
+@dataclass
+class Mix:
+    """Traffic mix of one virtual agent."""
+
+    # секунд между heartbeat; 0 — без пауз (режим насыщения)
+    interval: float = float(settings.AGENT_HEARTBEAT_INTERVAL)
+    # вероятность отправить пачку алертов вместе с heartbeat
+    alerts_ratio: float = 0.2
+    alerts_per_request: int = 5
+    # доля уже известных алертов (повторы с тем же текстом — типичный случай)
+    repeat_ratio: float = 0.8
+    poll_commands: bool = True
+
+
+@dataclass
+class Recorder:
+    latencies: dict[str, list[float]] = field(default_factory=dict)
+    errors: dict[str, int] = field(default_factory=dict)
+
+    def observe(self, op: str, seconds: float, ok: bool) -> None:
+        self.latencies.setdefault(op, []).append(seconds)
+        if not ok:
+            self.errors[op] = self.errors.get(op, 0) + 1
+
+
+async def provision(count: int, base_id: int) -> list[tuple[int, str]]:
+    """Creates servers base_id..base_id+count-1 with one agent key each; returns (server_id, key)."""
+    agents = []
+    key_rows = []
+    for server_id in range(base_id, base_id + count):
+        key, key_hash = generate_agent_key()
+        agents.append((server_id, key))
+        key_rows.append({"server_id": server_id, "key_hash": key_hash})
+    async with async_session() as session:
+        await session.execute(insert(Server), [{"id": server_id} for server_id, _ in agents])
+        await session.execute(insert(AgentKey), key_rows)
+        await session.commit()
+    return agents
+
+
+async def cleanup(count: int, base_id: int) -> None:
+    # ключи, алерты и команды удаляются каскадом
+    async with async_session() as session:
+        await session.execute(delete(Server).where(Server.id.between(base_id, base_id + count - 1)))
+        await session.commit()
+
+
+class VirtualAgent:
+    def __init__(self, client: httpx.AsyncClient, server_id: int, key: str, mix: Mix, recorder: Recorder):
+        self.client = client
+        self.server_id = server_id
+        self.headers = {"x-api-key": key}
+        self.mix = mix
+        self.recorder = recorder
+        self.rng = random.Random(server_id)
+        self.ip = f"10.{server_id >> 16 & 255}.{server_id >> 8 & 255}.{server_id & 255}"
+        self.known_alerts: list[dict] = []
+
+    async def _call(self, op: str, method: str, url: str, **kwargs) -> httpx.Response | None:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=self.headers, **kwargs)
+        except httpx.HTTPError:
+            self.recorder.observe(op, time.perf_counter() - started, False)
+            return None
+        self.recorder.observe(op, time.perf_counter() - started, response.status_code < 400)
+        return response
+
+    def status_body(self) -> dict:
+        return {
+            "agent_key": self.headers["x-api-key"],
+            "server_id": self.server_id,
+            "ip": self.ip,
+            "cgm_version": "4.2.1",
+            "admin_version": "1.9.0",
+            "timestamp": datetime.now(UTC).isoformat(),
+            "metrics": {
+                "cpu": round(self.rng.uniform(0, 100), 1),
+                "mem_used_pct": round(self.rng.uniform(20, 95), 1),
+                "disk_used_pct": round(self.rng.uniform(10, 99), 1),
+            },
+        }
+
+    def alert_items(self) -> list[dict]:
+        items = []
+        for _ in range(self.mix.alerts_per_request):
+            if self.known_alerts and self.rng.random() < self.mix.repeat_ratio:
+                item = dict(self.rng.choice(self.known_alerts))
+                item["counter"] += 1
+            else:
+                item = {
+                    "severity": self.rng.choices(SEVERITIES, SEVERITY_WEIGHTS)[0],
+                    "source": self.rng.choice(SOURCES),
+                    "alert": self.rng.choice(ALERT_TEMPLATES).format(n=self.rng.randint(1, 999)),
+                    "counter": 1,
+                }
+                self.known_alerts.append(item)
+            items.append(item)
+        return items
+
+    async def tick(self) -> None:
+        await self._call("status", "POST", f"{API}/agent/status", json=self.status_body())
+        if self.rng.random() < self.mix.alerts_ratio:
+            body = {"agent_key": self.headers["x-api-key"], "server_id": self.server_id, "alerts": self.alert_items()}
+            await self._call("alerts", "POST", f"{API}/agent/alerts", json=body)
+        if self.mix.poll_commands:
+            await self._call("commands", "GET", f"{API}/agent/commands", params={"server_id": self.server_id})
+
+    async def run(self, deadline: float) -> None:
+        # разнесение старта, чтобы агенты не били синхронно
+        if self.mix.interval:
+            await asyncio.sleep(self.rng.uniform(0, self.mix.interval))
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            await self.tick()
+            if self.mix.interval:
+                await asyncio.sleep(max(0.0, self.mix.interval - (time.monotonic() - started)))
+
+
+class AdminReader:
+    """Polls the admin read endpoints the dashboard uses."""
+
+    def __init__(self, client: httpx.AsyncClient, username: str, server_ids: list[int], interval: float, recorder: Recorder):
+        self.client = client
+        self.headers = {"Authorization": f"Bearer {create_jwt(username)}"}
+        self.server_ids = server_ids
+        self.interval = interval
+        self.recorder = recorder
+        self.rng = random.Random(username)
+        self.etag: str | None = None
+
+    async def _call(self, op: str, url: str, headers: dict, **kwargs) -> httpx.Response | None:
+        started = time.perf_counter()
+        try:
+            response = await self.client.get(url, headers=headers, **kwargs)
+        except httpx.HTTPError:
+            self.recorder.observe(op, time.perf_counter() - started, False)
+            return None
+        self.recorder.observe(op, time.perf_counter() - started, response.status_code < 400)
+        return response
+
+    async def run(self, deadline: float) -> None:
+        while time.monotonic() < deadline:
+            headers = dict(self.headers)
+            if self.etag:
+                headers["If-None-Match"] = self.etag
+            response = await self._call("admin_servers", f"{API}/admin/servers", headers)
+            if response is not None and response.status_code == 200:
+                self.etag = response.headers.get("etag")
+
+            server_id = self.rng.choice(self.server_ids)
+            await self._call("admin_alerts", f"{API}/admin/alerts", self.headers, params={"server_id": server_id, "limit": 50})
+            await asyncio.sleep(self.interval)
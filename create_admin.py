@@ -0,0 +1,23 @@
+import argparse
+import asyncio
+import getpass
+
+from src.database import async_session
+from src.models.db_models import AdminUser
+from src.security.admin_jwt import hash_password
+
+
+async def main(username: str, role: str) -> None:
+    password = getpass.getpass(f"Password for {username}: ")
+    async with async_session() as session:
+        session.add(AdminUser(username=username, password_hash=hash_password(password), role=role))
+        await session.commit()
+    print(f"Created {role} user {username}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create an admin_users account")
+    parser.add_argument("username")
+    parser.add_argument("--role", choices=["admin", "viewer"], default="viewer")
+    args = parser.parse_args()
+    asyncio.run(main(args.username, args.role))
@@ -0,0 +1,44 @@
+"""command_queue notify
+
+Revision ID: 2f6d0b8e91a4
+Revises: 7c1e9a2d4b30
+Create Date: 2026-10-18 11:02:17.530961
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '2f6d0b8e91a4'
+down_revision: Union[str, Sequence[str], None] = '7c1e9a2d4b30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # wakes up long-poll GET /agent/commands?wait= (src/services/commands.py)
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_command_queue() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('command_queue', NEW.server_id::text);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER trg_command_queue_notify
+        AFTER INSERT ON command_queue
+        FOR EACH ROW EXECUTE FUNCTION notify_command_queue();
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS trg_command_queue_notify ON command_queue")
+    op.execute("DROP FUNCTION IF EXISTS notify_command_queue()")
@@ -0,0 +1,105 @@
+"""partition alert_history
+
+Revision ID: 5b0e3c9f7a12
+Revises: d4e8f1a6c352
+Create Date: 2026-10-18 14:05:52.640115
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '5b0e3c9f7a12'
+down_revision: Union[str, Sequence[str], None] = 'd4e8f1a6c352'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = "id, server_id, severity, source, alert_text, counter, stacktrace, timestamp, archived_at"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("ALTER TABLE alert_history RENAME TO alert_history_legacy")
+    op.execute("ALTER INDEX idx_alert_history_server RENAME TO idx_alert_history_legacy_server")
+    # the new table keeps using the old id sequence
+    op.execute("ALTER SEQUENCE alert_history_id_seq OWNED BY NONE")
+    op.execute(
+        """
+        CREATE TABLE alert_history (
+            id BIGINT NOT NULL DEFAULT nextval('alert_history_id_seq'),
+            server_id BIGINT,
+            severity alert_severity,
+            source TEXT,
+            alert_text TEXT,
+            counter INTEGER,
+            stacktrace TEXT,
+            timestamp TIMESTAMP WITH TIME ZONE,
+            archived_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            PRIMARY KEY (id, archived_at)
+        ) PARTITION BY RANGE (archived_at)
+        """
+    )
+    op.execute("ALTER SEQUENCE alert_history_id_seq OWNED BY alert_history.id")
+    op.create_index("idx_alert_history_server", "alert_history", ["server_id"], unique=False)
+
+    # monthly partitions (UTC) from the oldest archived row up to two months ahead,
+    # named like src.services.alert_archive.partition_name
+    op.execute(
+        """
+        DO $$
+        DECLARE
+            month timestamptz := date_trunc('month', coalesce(
+                (SELECT min(archived_at) FROM alert_history_legacy), now()) AT TIME ZONE 'UTC') AT TIME ZONE 'UTC';
+            last_month timestamptz := date_trunc('month', now() AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'
+                + interval '2 months';
+        BEGIN
+            WHILE month <= last_month LOOP
+                EXECUTE format(
+                    'CREATE TABLE IF NOT EXISTS %I PARTITION OF alert_history FOR VALUES FROM (%L) TO (%L)',
+                    'alert_history_' || to_char(month AT TIME ZONE 'UTC', '"y"YYYY"m"MM'),
+                    month, month + interval '1 month');
+                month := month + interval '1 month';
+            END LOOP;
+        END $$;
+        """
+    )
+    op.execute(f"INSERT INTO alert_history ({COLUMNS}) SELECT {COLUMNS} FROM alert_history_legacy")
+    op.execute("DROP TABLE alert_history_legacy")
+
+    op.create_index(
+        "idx_alerts_inactive",
+        "alerts",
+        ["id"],
+        unique=False,
+        postgresql_where=sa.text("NOT active"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("idx_alerts_inactive", table_name="alerts")
+
+    op.execute("ALTER TABLE alert_history RENAME TO alert_history_partitioned")
+    op.execute("ALTER INDEX idx_alert_history_server RENAME TO idx_alert_history_partitioned_server")
+    op.execute("ALTER SEQUENCE alert_history_id_seq OWNED BY NONE")
+    op.execute(
+        """
+        CREATE TABLE alert_history (
+            id BIGINT NOT NULL DEFAULT nextval('alert_history_id_seq') PRIMARY KEY,
+            server_id BIGINT,
+            severity alert_severity,
+            source TEXT,
+            alert_text TEXT,
+            counter INTEGER,
+            stacktrace TEXT,
+            timestamp TIMESTAMP WITH TIME ZONE,
+            archived_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+        )
+        """
+    )
+    op.execute("ALTER SEQUENCE alert_history_id_seq OWNED BY alert_history.id")
+    op.create_index("idx_alert_history_server", "alert_history", ["server_id"], unique=False)
+    op.execute(f"INSERT INTO alert_history ({COLUMNS}) SELECT {COLUMNS} FROM alert_history_partitioned")
+    op.execute("DROP TABLE alert_history_partitioned")
@@ -0,0 +1,57 @@
+"""alert fingerprint
+
+Revision ID: 7c1e9a2d4b30
+Revises: 48220e642b7b
+Create Date: 2026-10-18 10:12:41.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '7c1e9a2d4b30'
+down_revision: Union[str, Sequence[str], None] = '48220e642b7b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("alerts", sa.Column("fingerprint", sa.Text(), nullable=True))
+
+    # same formula as src.services.alert_ingest.alert_fingerprint
+    op.execute(
+        r"""
+        UPDATE alerts SET fingerprint = encode(digest(
+            severity::text || '|' || coalesce(source, '') || '|'
+            || lower(btrim(regexp_replace(alert_text, '\s+', ' ', 'g'))),
+            'sha1'), 'hex')
+        """
+    )
+    # keep only the newest active row per fingerprint before the unique index
+    op.execute(
+        """
+        UPDATE alerts a SET active = false
+        FROM alerts b
+        WHERE a.active AND b.active
+          AND a.server_id = b.server_id
+          AND a.fingerprint = b.fingerprint
+          AND a.id < b.id
+        """
+    )
+    op.alter_column("alerts", "fingerprint", nullable=False)
+    op.create_index(
+        "uq_alerts_active_fingerprint",
+        "alerts",
+        ["server_id", "fingerprint"],
+        unique=True,
+        postgresql_where=sa.text("active"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("uq_alerts_active_fingerprint", table_name="alerts")
+    op.drop_column("alerts", "fingerprint")
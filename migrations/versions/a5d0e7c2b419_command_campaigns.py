@@ -0,0 +1,50 @@
+"""command campaigns
+
+Revision ID: a5d0e7c2b419
+Revises: f1b6c8a3e527
+Create Date: 2026-10-18 21:03:15.774810
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'a5d0e7c2b419'
+down_revision: Union[str, Sequence[str], None] = 'f1b6c8a3e527'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # counters are kept by src/services/campaigns.py; commands queued before this
+    # migration have no campaign row and are not tracked
+    op.create_table(
+        "command_campaigns",
+        sa.Column("correlation_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("type", postgresql.ENUM("DELETE_ALERT", "CUSTOM", name="command_type", create_type=False), nullable=False),
+        sa.Column("total", sa.Integer(), server_default=sa.text("0"), nullable=False),
+        sa.Column("pending", sa.Integer(), server_default=sa.text("0"), nullable=False),
+        sa.Column("sent", sa.Integer(), server_default=sa.text("0"), nullable=False),
+        sa.Column("done", sa.Integer(), server_default=sa.text("0"), nullable=False),
+        sa.Column("failed", sa.Integer(), server_default=sa.text("0"), nullable=False),
+        sa.Column("created_at", sa.TIMESTAMP(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.Column("updated_at", sa.TIMESTAMP(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.PrimaryKeyConstraint("correlation_id"),
+    )
+    op.create_index(
+        "idx_commands_correlation_status",
+        "command_queue",
+        ["correlation_id", "status", "id"],
+        unique=False,
+        postgresql_where=sa.text("correlation_id IS NOT NULL"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("idx_commands_correlation_status", table_name="command_queue")
+    op.drop_table("command_campaigns")
@@ -0,0 +1,48 @@
+"""command leases
+
+Revision ID: a93b5c07e2d1
+Revises: 2f6d0b8e91a4
+Create Date: 2026-10-18 11:48:05.204417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'a93b5c07e2d1'
+down_revision: Union[str, Sequence[str], None] = '2f6d0b8e91a4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "command_queue",
+        sa.Column("lease_until", sa.TIMESTAMP(timezone=True), nullable=True),
+    )
+    # commands returned to pending by the lease sweeper must wake long-polls too
+    op.execute("DROP TRIGGER IF EXISTS trg_command_queue_notify ON command_queue")
+    op.execute(
+        """
+        CREATE TRIGGER trg_command_queue_notify
+        AFTER INSERT OR UPDATE OF status ON command_queue
+        FOR EACH ROW WHEN (NEW.status = 'pending')
+        EXECUTE FUNCTION notify_command_queue();
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS trg_command_queue_notify ON command_queue")
+    op.execute(
+        """
+        CREATE TRIGGER trg_command_queue_notify
+        AFTER INSERT ON command_queue
+        FOR EACH ROW EXECUTE FUNCTION notify_command_queue();
+        """
+    )
+    op.drop_column("command_queue", "lease_until")
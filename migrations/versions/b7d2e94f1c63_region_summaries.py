@@ -0,0 +1,40 @@
+"""region summaries
+
+Revision ID: b7d2e94f1c63
+Revises: e61f2a8d0c57
+Create Date: 2026-10-18 17:02:51.604118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2e94f1c63'
+down_revision: Union[str, Sequence[str], None] = 'e61f2a8d0c57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # filled by the first full recompute of src/services/region_rollup.py on startup
+    op.create_table(
+        "region_summaries",
+        sa.Column("region_id", sa.Integer(), nullable=False),
+        sa.Column("server_count", sa.Integer(), server_default=sa.text("0"), nullable=False),
+        sa.Column("online_count", sa.Integer(), server_default=sa.text("0"), nullable=False),
+        sa.Column("alerts_normal", sa.Integer(), server_default=sa.text("0"), nullable=False),
+        sa.Column("alerts_minor", sa.Integer(), server_default=sa.text("0"), nullable=False),
+        sa.Column("alerts_major", sa.Integer(), server_default=sa.text("0"), nullable=False),
+        sa.Column("alerts_critical", sa.Integer(), server_default=sa.text("0"), nullable=False),
+        sa.Column("updated_at", sa.TIMESTAMP(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.ForeignKeyConstraint(["region_id"], ["regions.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("region_id"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("region_summaries")
@@ -0,0 +1,31 @@
+"""alert listing indexes
+
+Revision ID: b9f4d2a6c801
+Revises: e2c7a9d5f318
+Create Date: 2026-10-19 12:40:13.208519
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9f4d2a6c801'
+down_revision: Union[str, Sequence[str], None] = 'e2c7a9d5f318'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # GET /admin/alerts pages by (timestamp DESC, id DESC); a backward index scan
+    # serves it without sorting, for the whole table and for one server
+    op.create_index("idx_alerts_timestamp_id", "alerts", ["timestamp", "id"])
+    op.create_index("idx_alerts_server_timestamp_id", "alerts", ["server_id", "timestamp", "id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("idx_alerts_server_timestamp_id", table_name="alerts")
+    op.drop_index("idx_alerts_timestamp_id", table_name="alerts")
@@ -0,0 +1,39 @@
+"""idempotency keys
+
+Revision ID: c3a9f5e0d846
+Revises: b7d2e94f1c63
+Create Date: 2026-10-18 19:24:07.351920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3a9f5e0d846'
+down_revision: Union[str, Sequence[str], None] = 'b7d2e94f1c63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # rows older than IDEMPOTENCY_TTL are deleted by src/services/idempotency.py
+    op.create_table(
+        "idempotency_keys",
+        sa.Column("server_id", sa.BigInteger(), nullable=False),
+        sa.Column("scope", sa.Text(), nullable=False),
+        sa.Column("key", sa.Text(), nullable=False),
+        sa.Column("response", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column("created_at", sa.TIMESTAMP(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.PrimaryKeyConstraint("server_id", "scope", "key"),
+    )
+    op.create_index("idx_idempotency_keys_created", "idempotency_keys", ["created_at"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("idx_idempotency_keys_created", table_name="idempotency_keys")
+    op.drop_table("idempotency_keys")
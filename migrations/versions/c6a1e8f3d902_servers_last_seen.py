@@ -0,0 +1,30 @@
+"""servers last_seen
+
+Revision ID: c6a1e8f3d902
+Revises: b9f4d2a6c801
+Create Date: 2026-10-19 15:02:44.517930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'c6a1e8f3d902'
+down_revision: Union[str, Sequence[str], None] = 'b9f4d2a6c801'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # database time of the last stored heartbeat; last_update is the agent's own clock,
+    # which offline detection must not depend on
+    op.add_column("servers", sa.Column("last_seen", sa.TIMESTAMP(timezone=True), nullable=True))
+    op.execute("UPDATE servers SET last_seen = last_update WHERE last_update IS NOT NULL")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("servers", "last_seen")
@@ -0,0 +1,50 @@
+"""agent_keys notify
+
+Revision ID: d4e8f1a6c352
+Revises: a93b5c07e2d1
+Create Date: 2026-10-18 12:30:44.871290
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4e8f1a6c352'
+down_revision: Union[str, Sequence[str], None] = 'a93b5c07e2d1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # drops cached verifications in every API worker (src/security/agent_key.py):
+    # revoked/deleted keys from the positive cache, new keys from the negative one
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_agent_keys() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                PERFORM pg_notify('agent_keys', OLD.key_hash);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM pg_notify('agent_keys', NEW.key_hash);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER trg_agent_keys_notify
+        AFTER INSERT OR UPDATE OR DELETE ON agent_keys
+        FOR EACH ROW EXECUTE FUNCTION notify_agent_keys();
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS trg_agent_keys_notify ON agent_keys")
+    op.execute("DROP FUNCTION IF EXISTS notify_agent_keys()")
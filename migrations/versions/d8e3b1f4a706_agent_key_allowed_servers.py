@@ -0,0 +1,29 @@
+"""agent key allowed servers
+
+Revision ID: d8e3b1f4a706
+Revises: a5d0e7c2b419
+Create Date: 2026-10-19 10:12:44.218503
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8e3b1f4a706'
+down_revision: Union[str, Sequence[str], None] = 'a5d0e7c2b419'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # an agent key writes only for its own server_id; relays list the other servers here
+    op.add_column("agent_keys", sa.Column("allowed_server_ids", postgresql.ARRAY(sa.BigInteger()), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("agent_keys", "allowed_server_ids")
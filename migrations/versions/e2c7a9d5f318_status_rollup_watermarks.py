@@ -0,0 +1,33 @@
+"""status rollup watermarks
+
+Revision ID: e2c7a9d5f318
+Revises: d8e3b1f4a706
+Create Date: 2026-10-19 11:05:27.640183
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2c7a9d5f318'
+down_revision: Union[str, Sequence[str], None] = 'd8e3b1f4a706'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # without a row the rollup job starts from max(bucket) of the resolution, as before
+    op.create_table(
+        "status_rollup_watermarks",
+        sa.Column("resolution", sa.Text(), nullable=False),
+        sa.Column("rolled_until", sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("resolution"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("status_rollup_watermarks")
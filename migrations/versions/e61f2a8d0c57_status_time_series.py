@@ -0,0 +1,73 @@
+"""status time series
+
+Revision ID: e61f2a8d0c57
+Revises: 5b0e3c9f7a12
+Create Date: 2026-10-18 15:21:09.377842
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'e61f2a8d0c57'
+down_revision: Union[str, Sequence[str], None] = '5b0e3c9f7a12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "status_samples",
+        sa.Column("server_id", sa.BigInteger(), nullable=False),
+        sa.Column("ts", sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column("metrics", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.PrimaryKeyConstraint("server_id", "ts"),
+        postgresql_partition_by="RANGE (ts)",
+    )
+    # first daily partitions; the rollup job keeps creating them ahead
+    op.execute(
+        """
+        DO $$
+        DECLARE
+            day timestamptz := date_trunc('day', now(), 'UTC');
+        BEGIN
+            FOR i IN 0..2 LOOP
+                EXECUTE format(
+                    'CREATE TABLE IF NOT EXISTS %I PARTITION OF status_samples FOR VALUES FROM (%L) TO (%L)',
+                    'status_samples_d' || to_char(day AT TIME ZONE 'UTC', 'YYYYMMDD'),
+                    day, day + interval '1 day');
+                day := day + interval '1 day';
+            END LOOP;
+        END $$;
+        """
+    )
+
+    op.create_table(
+        "status_rollups",
+        sa.Column("resolution", sa.Text(), nullable=False),
+        sa.Column("server_id", sa.BigInteger(), nullable=False),
+        sa.Column("metric", sa.Text(), nullable=False),
+        sa.Column("bucket", sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column("samples", sa.Integer(), nullable=False),
+        sa.Column("value_min", sa.Float(), nullable=False),
+        sa.Column("value_max", sa.Float(), nullable=False),
+        sa.Column("value_sum", sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint("resolution", "server_id", "metric", "bucket"),
+    )
+    op.create_index(
+        "idx_status_rollups_resolution_bucket",
+        "status_rollups",
+        ["resolution", "bucket"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("idx_status_rollups_resolution_bucket", table_name="status_rollups")
+    op.drop_table("status_rollups")
+    op.drop_table("status_samples")
@@ -0,0 +1,100 @@
+"""command queue notify per statement
+
+Revision ID: f1b6c8a3e527
+Revises: c3a9f5e0d846
+Create Date: 2026-10-18 20:11:38.902614
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1b6c8a3e527'
+down_revision: Union[str, Sequence[str], None] = 'c3a9f5e0d846'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # fan-out (POST /admin/commands/send) inserts thousands of rows in one statement:
+    # instead of a NOTIFY per row, server ids go out comma-separated, 300 per payload
+    # (payload limit is 8000 bytes, a bigint with a comma is at most 21)
+    op.execute("DROP TRIGGER IF EXISTS trg_command_queue_notify ON command_queue")
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_command_queue() RETURNS trigger AS $$
+        DECLARE
+            chunk text;
+        BEGIN
+            FOR chunk IN
+                SELECT string_agg(server_id::text, ',')
+                FROM (
+                    SELECT server_id, (row_number() OVER (ORDER BY server_id) - 1) / 300 AS part
+                    FROM (SELECT DISTINCT server_id FROM new_rows) AS ids
+                ) AS numbered
+                GROUP BY part
+            LOOP
+                PERFORM pg_notify('command_queue', chunk);
+            END LOOP;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER trg_command_queue_notify
+        AFTER INSERT ON command_queue
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_command_queue();
+        """
+    )
+    # commands returned to pending by the lease sweeper must wake long-polls too (see
+    # a93b5c07e2d1); a column list rules out transition tables, so this one stays per row.
+    # Identical notifications within a transaction are delivered once.
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_command_requeued() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('command_queue', NEW.server_id::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER trg_command_queue_requeue_notify
+        AFTER UPDATE OF status ON command_queue
+        FOR EACH ROW WHEN (NEW.status = 'pending' AND OLD.status IS DISTINCT FROM 'pending')
+        EXECUTE FUNCTION notify_command_requeued();
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS trg_command_queue_requeue_notify ON command_queue")
+    op.execute("DROP FUNCTION IF EXISTS notify_command_requeued()")
+    op.execute("DROP TRIGGER IF EXISTS trg_command_queue_notify ON command_queue")
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_command_queue() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('command_queue', NEW.server_id::text);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER trg_command_queue_notify
+        AFTER INSERT OR UPDATE OF status ON command_queue
+        FOR EACH ROW WHEN (NEW.status = 'pending')
+        EXECUTE FUNCTION notify_command_queue();
+        """
+    )
@@ -1,4 +1,36 @@
+import argparse
+import os
+
 import uvicorn
 
+from src.config import settings
+
 if __name__ == "__main__":
-    uvicorn.run("app.main:app", host="localhost", port=8080, reload=True)
+    parser = argparse.ArgumentParser(description="Run the monitoring API")
+    parser.add_argument("--prod", action="store_true", help="Multi-worker uvloop/httptools server without reload")
+    parser.add_argument("--host", help=f"Default: localhost, {settings.HOST} in --prod mode")
+    parser.add_argument("--port", type=int, default=settings.PORT)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=settings.WEB_CONCURRENCY or os.cpu_count() or 1,
+        help="Worker processes in --prod mode; each has its own DB pool (DB_POOL_SIZE + DB_MAX_OVERFLOW)",
+    )
+    parser.add_argument("--access-log", action="store_true", help="Access log in --prod mode")
+    args = parser.parse_args()
+
+    if args.prod:
+        uvicorn.run(
+            "src.main:app",
+            host=args.host or settings.HOST,
+            port=args.port,
+            workers=args.workers,
+            loop="uvloop",
+            http="httptools",
+            access_log=args.access_log,
+            proxy_headers=True,
+            # незавершённые запросы дорабатывают, затем lifespan сбрасывает буферы статусов и аудита
+            timeout_graceful_shutdown=settings.GRACEFUL_SHUTDOWN_TIMEOUT,
+        )
+    else:
+        uvicorn.run("src.main:app", host=args.host or "localhost", port=args.port, reload=True)
@@ -1,40 +1,284 @@
-from fastapi import APIRouter, HTTPException, Depends
+from datetime import datetime, timedelta, UTC
+from typing import List, Literal, Optional
+from uuid import UUID
+
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from fastapi.sse import EventSourceResponse, ServerSentEvent
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.config import settings
+from src.database import get_session
 from src.models.admin_models import *
-from src.security.admin_jwt import create_jwt
-from src.mocks.admin_data import SERVERS
+from src.models.agent_models import AlertSeverity
+from src.models.db_models import CommandCampaign
+from src.security.admin_jwt import (
+    AdminPrincipal,
+    admin_token_cache,
+    authenticate,
+    create_jwt,
+    require_admin,
+    require_viewer,
+)
+from src.security.agent_key import agent_key_cache
+from src.security.rate_limit import agent_rate_limiter, ingest_gate
+from src.services.alert_ingest import alert_ingestor
+from src.services.audit import audit_sink
+from src.services.campaigns import campaign_progress
+from src.services.commands import fan_out_commands
+from src.services.exports import EXPORT_FORMATS, alert_history_query, audit_log_query, stream_export
+from src.services.fleet_snapshot import fleet_snapshot
+from src.services.events import EventFilter, event_hub
+from src.services.heartbeat import heartbeat_tracker
+from src.services.idempotency import idempotency_store
+from src.services.listings import list_alerts, list_command_failures, list_servers
+from src.services.region_rollup import region_rollup
+from src.services.rules import rule_engine
+from src.services.status_series import query_history
+from src.services.status_writer import status_writer
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
 
-def auth_admin():
-    # Моковая проверка
-    return True
+def _client_addr(request: Request) -> str | None:
+    return request.client.host if request.client else None
 
 
 @router.post("/auth/login", response_model=LoginResponse)
-def login(req: LoginRequest):
-    if req.username != "admin" or req.password != "password":
+async def login(req: LoginRequest, request: Request):
+    admin = await authenticate(req.username, req.password)
+    if admin is None:
+        await audit_sink.record(
+            "login_failed", payload={"username": req.username}, remote_addr=_client_addr(request)
+        )
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    token = create_jwt(req.username)
+    await audit_sink.record("login", user_id=admin.user_id, remote_addr=_client_addr(request))
+    token = create_jwt(admin.username)
     return LoginResponse(access_token=token)
 
 
-@router.get("/servers", response_model=list[Server])
-def get_servers(authorized: bool = Depends(auth_admin)):
-    return SERVERS
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+
+@router.get("/servers")
+async def get_servers(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=settings.PAGE_SIZE_MAX),
+    region_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated, e.g. id,ip,last_status"),
+    admin: AdminPrincipal = Depends(require_viewer),
+    session: AsyncSession = Depends(get_session),
+):
+    """Without parameters: the whole fleet (list[Server]) from the snapshot, with ETag.
+    With any of them: a keyset page {"servers": [...], "next_cursor": ...} from the database.
+    """
+    if any(value is not None for value in (cursor, limit, region_id, since, fields)):
+        return await list_servers(
+            session,
+            limit=limit or settings.PAGE_SIZE_DEFAULT,
+            cursor=cursor,
+            region_id=region_id,
+            since=since,
+            fields=fields,
+        )
+
+    await fleet_snapshot.ready()
+    body, etag = fleet_snapshot.render()
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+
+@router.get("/regions/summary")
+async def get_regions_summary(request: Request, admin: AdminPrincipal = Depends(require_viewer)):
+    """Per region: server_count, online_count and active alerts by severity, from memory, with ETag."""
+    await region_rollup.ready()
+    body, etag = region_rollup.render()
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+
+@router.get("/events", response_class=EventSourceResponse)
+async def stream_events(
+    region_id: List[int] = Query([]),
+    severity: List[AlertSeverity] = Query([]),
+    server_id: List[int] = Query([]),
+    admin: AdminPrincipal = Depends(require_viewer),
+):
+    """Server-Sent Events: alert.opened, alert.resolved, server.status, command.result.
+
+    A slow client gets the latest event per server/alert/command; "overflow"
+    and "resync" events mean some were lost and the views should be reloaded.
+    """
+    event_filter = EventFilter(region_ids=set(region_id), severities=set(severity), server_ids=set(server_id))
+    with event_hub.subscribe(event_filter) as subscriber:
+        reported_drops = 0
+        while True:
+            batch = await subscriber.next_batch()
+            if subscriber.dropped > reported_drops:
+                yield ServerSentEvent(event="overflow", data={"dropped": subscriber.dropped - reported_drops})
+                reported_drops = subscriber.dropped
+            for kind, data in batch:
+                yield ServerSentEvent(event=kind, raw_data=data)
+
+
+@router.get("/servers/{server_id}/status-history")
+async def get_status_history(
+    server_id: int,
+    metric: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    max_points: int = Query(500, ge=10, le=5000),
+    admin: AdminPrincipal = Depends(require_viewer),
+    session: AsyncSession = Depends(get_session),
+):
+    """Resolution (raw, 1m, 1h, 1d) is picked so the range fits into max_points."""
+    end = end or datetime.now(UTC)
+    start = start or end - timedelta(days=1)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return await query_history(session, server_id, metric, start, end, max_points)
 
 
 @router.get("/alerts")
-def get_alerts(server_id: int, authorized: bool = Depends(auth_admin)):
-    return {"server_id": server_id, "alerts": []}
+async def get_alerts(
+    server_id: Optional[int] = None,
+    region_id: Optional[int] = None,
+    severity: Optional[AlertSeverity] = None,
+    active: Optional[bool] = None,
+    since: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+    fields: Optional[str] = Query(None, description="Comma-separated, e.g. id,severity,alert_text"),
+    admin: AdminPrincipal = Depends(require_viewer),
+    session: AsyncSession = Depends(get_session),
+):
+    page = await list_alerts(
+        session,
+        limit=limit,
+        cursor=cursor,
+        server_id=server_id,
+        region_id=region_id,
+        severity=severity,
+        active=active,
+        since=since,
+        fields=fields,
+    )
+    return {"server_id": server_id, **page}
+
+
+def _export_response(query, fmt: str, name: str) -> StreamingResponse:
+    return StreamingResponse(
+        stream_export(query, fmt),
+        media_type=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'},
+    )
+
+
+@router.get("/export/alert-history")
+def export_alert_history(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    server_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    admin: AdminPrincipal = Depends(require_admin),
+):
+    return _export_response(alert_history_query(server_id, start, end), format, "alert_history")
+
+
+@router.get("/export/audit-logs")
+def export_audit_logs(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    server_id: Optional[int] = None,
+    action: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    admin: AdminPrincipal = Depends(require_admin),
+):
+    return _export_response(audit_log_query(server_id, action, start, end), format, "audit_logs")
 
 
 @router.delete("/alerts/{filename}")
-def delete_alert(filename: str, authorized: bool = Depends(auth_admin)):
+async def delete_alert(filename: str, request: Request, admin: AdminPrincipal = Depends(require_admin)):
+    await audit_sink.record(
+        "delete_alert", user_id=admin.user_id, payload={"filename": filename}, remote_addr=_client_addr(request)
+    )
     return {"message": "Deletion command created", "filename": filename}
 
 
-@router.post("/commands/send")
-def send_command(authorized: bool = Depends(auth_admin)):
-    return {"message": "Command queued"}
+@router.post("/commands/send", status_code=202, response_model=CommandFanoutResponse)
+async def send_command(
+    req: CommandFanoutRequest,
+    request: Request,
+    admin: AdminPrincipal = Depends(require_admin),
+    session: AsyncSession = Depends(get_session),
+):
+    """Queues a command for a region, a list of servers or the whole fleet; progress is tracked by correlation_id."""
+    correlation_id, queued = await fan_out_commands(session, req)
+    await session.commit()
+    await audit_sink.record(
+        "send_command",
+        user_id=admin.user_id,
+        payload={
+            "correlation_id": str(correlation_id),
+            "type": req.type,
+            "region_id": req.region_id,
+            # по server_ids работает фильтр server_id в /admin/export/audit-logs
+            "server_ids": req.server_ids,
+            "all_servers": req.all_servers,
+            "queued": queued,
+        },
+        remote_addr=_client_addr(request),
+    )
+    return CommandFanoutResponse(correlation_id=correlation_id, queued=queued)
+
+
+@router.get("/commands/{correlation_id}/progress", response_model=CommandProgress)
+async def get_command_progress(
+    correlation_id: UUID,
+    admin: AdminPrincipal = Depends(require_viewer),
+    session: AsyncSession = Depends(get_session),
+):
+    """Counters of a fan-out by status; they trail the commands by up to CAMPAIGN_FLUSH_INTERVAL seconds."""
+    campaign = await session.get(CommandCampaign, correlation_id)
+    if campaign is None:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    return CommandProgress.model_validate(campaign, from_attributes=True)
+
+
+@router.get("/commands/{correlation_id}/failures")
+async def get_command_failures(
+    correlation_id: UUID,
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+    admin: AdminPrincipal = Depends(require_viewer),
+    session: AsyncSession = Depends(get_session),
+):
+    page = await list_command_failures(session, correlation_id, limit=limit, cursor=cursor)
+    return {"correlation_id": correlation_id, **page}
+
+
+@router.get("/stats")
+def get_stats(admin: AdminPrincipal = Depends(require_viewer)):
+    return {
+        "status": status_writer.stats(),
+        "alerts": alert_ingestor.stats(),
+        "agent_keys": agent_key_cache.stats(),
+        "admin_tokens": admin_token_cache.stats(),
+        "audit": audit_sink.stats(),
+        "heartbeat": heartbeat_tracker.stats(),
+        "rules": rule_engine.stats(),
+        "regions": region_rollup.stats(),
+        "events": event_hub.stats(),
+        "rate_limit": agent_rate_limiter.stats(),
+        "ingest_gate": ingest_gate.stats(),
+        "idempotency": idempotency_store.stats(),
+        "campaigns": campaign_progress.stats(),
+    }
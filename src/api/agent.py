@@ -1,26 +1,126 @@
-from fastapi import APIRouter, Depends
-from src.security.agent_key import verify_agent_key
+import asyncio
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from src.config import settings
+from src.database import async_session
+from src.security.agent_key import AgentIdentity, ensure_server, verify_agent_key
+from src.security.rate_limit import AgentIngestRoute
 from src.models.agent_models import *
-from src.mocks.agent_data import COMMANDS
+from src.services.alert_ingest import alert_ingestor
+from src.services.batch_ingest import ingest_batch
+from src.services.commands import claim_commands, command_waiters, complete_command
+from src.services.heartbeat import heartbeat_tracker
+from src.services.idempotency import RequestKey, idempotency_store
+from src.services.status_writer import status_writer
+from src.utils.encoding import AgentRoute
+
+router = APIRouter(prefix="/agent", tags=["Agent"], route_class=AgentRoute)
+# Приём статусов и алертов: лимиты проверяются до чтения тела (см. AgentIngestRoute)
+ingest_router = APIRouter(prefix="/agent", tags=["Agent"], route_class=AgentIngestRoute)
 
-router = APIRouter(prefix="/agent", tags=["Agent"])
 
+@ingest_router.post("/status")
+async def post_status(
+    req: AgentStatusRequest,
+    agent: AgentIdentity = Depends(verify_agent_key),
+    idempotency_key: str | None = Header(None),
+):
+    ensure_server(agent, req.server_id)
+    # Без заголовка повтор узнаётся по timestamp статуса
+    key = idempotency_store.key(req.server_id, "status", idempotency_key or req.timestamp.isoformat())
+    return await idempotency_store.run(key, lambda: _submit_status(req))
 
-@router.post("/status")
-def post_status(req: AgentStatusRequest, key: str = Depends(verify_agent_key)):
+
+async def _submit_status(req: AgentStatusRequest) -> dict:
+    # Запись в БД идёт пачками в фоне (write-behind); повтор статуса БД не меняет, ключ там не хранится
+    status_writer.submit(req)
+    heartbeat_tracker.touch(req.server_id)
     return {"message": "Status stored", "server_id": req.server_id}
 
 
-@router.post("/alerts")
-def post_alerts(req: AgentAlertsRequest, key: str = Depends(verify_agent_key)):
-    return {"message": "Alerts stored", "count": len(req.alerts)}
+@ingest_router.post("/alerts")
+async def post_alerts(
+    req: AgentAlertsRequest,
+    agent: AgentIdentity = Depends(verify_agent_key),
+    idempotency_key: str | None = Header(None),
+):
+    ensure_server(agent, req.server_id)
+    key = idempotency_store.key(req.server_id, "alerts", idempotency_key)
+    return await idempotency_store.run(key, lambda: _store_alerts(req, key))
+
+
+async def _store_alerts(req: AgentAlertsRequest, key: RequestKey | None) -> dict:
+    response = {"message": "Alerts stored", "count": len(req.alerts), "written": 0}
+
+    async def commit(session, rows: list[dict]) -> bool:
+        nonlocal response
+        response, committed = await idempotency_store.commit(session, key, {**response, "written": len(rows)})
+        return committed
+
+    await alert_ingestor.ingest(req.server_id, req.alerts, commit)
+    return response
+
 
+@ingest_router.post("/batch", response_model=AgentBatchResponse)
+async def post_batch(req: AgentBatchRequest, agent: AgentIdentity = Depends(verify_agent_key)):
+    """Mixed status/alerts envelopes from a relay: one auth check, one transaction, per-item results."""
+    if len(req.items) > settings.AGENT_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.AGENT_BATCH_MAX_ITEMS} items per batch")
+    return await ingest_batch(req.items, agent)
 
-@router.get("/commands")
-def get_commands(server_id: int, key: str = Depends(verify_agent_key)):
-    return COMMANDS.get(server_id, [])
+
+async def _claim_commands(server_id: int, limit: int) -> list[Command]:
+    # Сессия берётся только на время запроса, а не на всё ожидание long-poll
+    async with async_session() as session:
+        commands = await claim_commands(session, server_id, limit)
+        await session.commit()
+        return commands
+
+
+@router.get("/commands", response_model=list[Command])
+async def get_commands(
+    server_id: int | None = Query(None, description="Only for relay keys; defaults to the key's server"),
+    wait: int = Query(0, ge=0, le=settings.COMMANDS_MAX_WAIT, description="Long-poll timeout, seconds"),
+    limit: int = Query(settings.COMMAND_CLAIM_LIMIT, ge=1, le=100),
+    agent: AgentIdentity = Depends(verify_agent_key),
+):
+    if server_id is None:
+        server_id = agent.server_id
+    else:
+        ensure_server(agent, server_id)
+
+    if wait == 0:
+        return await _claim_commands(server_id, limit)
+
+    with command_waiters.watch(server_id) as event:
+        commands = await _claim_commands(server_id, limit)
+        if commands:
+            return commands
+        try:
+            await asyncio.wait_for(event.wait(), timeout=wait)
+        except asyncio.TimeoutError:
+            return []
+    return await _claim_commands(server_id, limit)
 
 
 @router.post("/commands/{command_id}/result")
-def command_result(command_id: int, req: CommandResultRequest, key: str = Depends(verify_agent_key)):
-    return {"message": "Result saved", "command_id": command_id}
+async def command_result(
+    command_id: int,
+    req: CommandResultRequest,
+    agent: AgentIdentity = Depends(verify_agent_key),
+    idempotency_key: str | None = Header(None),
+):
+    # Без заголовка у команды может быть только один результат
+    key = idempotency_store.key(agent.server_id, "result", idempotency_key or str(command_id))
+    return await idempotency_store.run(key, lambda: _store_result(command_id, req, agent, key))
+
+
+async def _store_result(
+    command_id: int, req: CommandResultRequest, agent: AgentIdentity, key: RequestKey | None
+) -> dict:
+    async with async_session() as session:
+        # чужая команда неотличима от несуществующей
+        if not await complete_command(session, command_id, req, agent):
+            raise HTTPException(status_code=404, detail="Command not found")
+        response, _ = await idempotency_store.commit(session, key, {"message": "Result saved", "command_id": command_id})
+    return response
@@ -3,5 +3,6 @@ from src.api import admin, agent
 from src.config import settings
 
 api_router = APIRouter(prefix=settings.API_VERSION)
+api_router.include_router(agent.ingest_router)
 api_router.include_router(agent.router)
 api_router.include_router(admin.router)
@@ -9,13 +9,33 @@ class Settings:
     # JWT
     JWT_SECRET = os.getenv("JWT_SECRET", "dev-secret")
     JWT_ALGORITHM = "HS256"
+    # Кэш проверенных admin-токенов
+    ADMIN_TOKEN_CACHE_SIZE = int(os.getenv("ADMIN_TOKEN_CACHE_SIZE", "1000"))
+    ADMIN_TOKEN_CACHE_MAX_AGE = float(os.getenv("ADMIN_TOKEN_CACHE_MAX_AGE", "600"))  # секунды
+
+    # Кэш проверенных agent API keys (agent_keys.key_hash -> server_id)
+    AGENT_KEY_CACHE_SIZE = int(os.getenv("AGENT_KEY_CACHE_SIZE", "100000"))
+    AGENT_KEY_CACHE_TTL = float(os.getenv("AGENT_KEY_CACHE_TTL", "300"))  # секунды
+    AGENT_KEY_NEGATIVE_CACHE_SIZE = int(os.getenv("AGENT_KEY_NEGATIVE_CACHE_SIZE", "10000"))
+    AGENT_KEY_NEGATIVE_TTL = float(os.getenv("AGENT_KEY_NEGATIVE_TTL", "30"))  # секунды
+    # Ограничение приёма от агентов: token bucket на ключ агента и общий предел одновременных запросов;
+    # оба проверяются до чтения тела запроса
+    RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+    AGENT_RATE_PER_SECOND = float(os.getenv("AGENT_RATE_PER_SECOND", "1"))
+    AGENT_RATE_BURST = float(os.getenv("AGENT_RATE_BURST", "20"))
+    AGENT_RATE_MAX_KEYS = int(os.getenv("AGENT_RATE_MAX_KEYS", "100000"))  # LRU-предел числа bucket
+    # отдельный LRU для ключей, которых ещё нет в кэше проверенных: поток случайных ключей вытесняет только их
+    AGENT_RATE_MAX_UNVERIFIED_KEYS = int(os.getenv("AGENT_RATE_MAX_UNVERIFIED_KEYS", "1000"))
+    # JSON: {"<server_id или key_hash>": {"rate": 5, "burst": 100}}, например для ретрансляторов
+    AGENT_RATE_OVERRIDES = os.getenv("AGENT_RATE_OVERRIDES", "")
+    INGEST_MAX_CONCURRENCY = int(os.getenv("INGEST_MAX_CONCURRENCY", "256"))
+    OVERLOAD_RETRY_AFTER = float(os.getenv("OVERLOAD_RETRY_AFTER", "5"))  # секунды
+    RETRY_AFTER_JITTER = float(os.getenv("RETRY_AFTER_JITTER", "10"))  # секунды, случайная добавка к Retry-After
+    # Повторы запросов агентов: заголовок Idempotency-Key (для статусов — server_id + timestamp)
+    IDEMPOTENCY_WINDOW_SIZE = int(os.getenv("IDEMPOTENCY_WINDOW_SIZE", "100000"))
+    IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "3600"))  # секунды
+    IDEMPOTENCY_PURGE_INTERVAL = float(os.getenv("IDEMPOTENCY_PURGE_INTERVAL", "300"))  # секунды
 
-    # Agent API keys (пока просто список)
-    VALID_AGENT_KEYS = {
-        "agent-key-1",
-        "agent-key-2"
-    }
-    
     db_host = os.getenv("DB_HOST", "localhost")
     db_port = os.getenv("DB_PORT", "5432")  
     db_user = os.getenv("DB_USER", "user")
@@ -23,5 +43,92 @@ class Settings:
     db_name = os.getenv("DB_NAME", "monitoring")
 
     DATABASE_URL = f"postgresql+asyncpg://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}"
+    DB_ECHO = os.getenv("DB_ECHO", "0") == "1"
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+
+    # Write-behind буфер для /agent/status
+    STATUS_FLUSH_INTERVAL = float(os.getenv("STATUS_FLUSH_INTERVAL", "1.0"))  # секунды
+    STATUS_BATCH_SIZE = int(os.getenv("STATUS_BATCH_SIZE", "1000"))
+    # после стольких неудачных flush подряд пакет пишется половинами, пока не останутся отдельные
+    # статусы; статус, который БД отвергает сам по себе (ошибка данных), отбрасывается
+    STATUS_FLUSH_MAX_ATTEMPTS = int(os.getenv("STATUS_FLUSH_MAX_ATTEMPTS", "3"))
+    # Ожидаемый период heartbeat агента
+    AGENT_HEARTBEAT_INTERVAL = float(os.getenv("AGENT_HEARTBEAT_INTERVAL", "10"))  # секунды
+    # Сервер считается недоступным после стольких пропущенных heartbeat
+    HEARTBEAT_MISSED_INTERVALS = float(os.getenv("HEARTBEAT_MISSED_INTERVALS", "3"))
+    HEARTBEAT_TICK = float(os.getenv("HEARTBEAT_TICK", "1.0"))  # секунды, шаг колеса таймеров
+    # Пороговые правила по heartbeat (JSON), перечитываются при изменении файла
+    RULES_FILE = os.getenv("RULES_FILE", "rules.json")
+    RULES_RELOAD_INTERVAL = float(os.getenv("RULES_RELOAD_INTERVAL", "5"))  # секунды
+
+    # История метрик: сырые сэмплы (дневные партиции) и агрегаты 1m/1h/1d
+    STATUS_ROLLUP_INTERVAL = float(os.getenv("STATUS_ROLLUP_INTERVAL", "60"))  # секунды
+    STATUS_RAW_RETENTION_DAYS = int(os.getenv("STATUS_RAW_RETENTION_DAYS", "2"))
+    STATUS_1M_RETENTION_DAYS = int(os.getenv("STATUS_1M_RETENTION_DAYS", "14"))
+    STATUS_1H_RETENTION_DAYS = int(os.getenv("STATUS_1H_RETENTION_DAYS", "180"))
+    STATUS_1D_RETENTION_DAYS = int(os.getenv("STATUS_1D_RETENTION_DAYS", "1825"))
+
+    # Снапшот парка серверов для GET /admin/servers
+    FLEET_RECONCILE_INTERVAL = float(os.getenv("FLEET_RECONCILE_INTERVAL", "30"))  # секунды
+    # Сводка по регионам: запись дельт в region_summaries и полный пересчёт
+    REGION_SUMMARY_FLUSH_INTERVAL = float(os.getenv("REGION_SUMMARY_FLUSH_INTERVAL", "5"))  # секунды
+    REGION_RECOMPUTE_INTERVAL = float(os.getenv("REGION_RECOMPUTE_INTERVAL", "300"))  # секунды
+    # Поток событий GET /admin/events: размер буфера на одного клиента
+    EVENT_BUFFER_SIZE = int(os.getenv("EVENT_BUFFER_SIZE", "1000"))
+
+    # Постраничная выдача admin-списков
+    PAGE_SIZE_DEFAULT = int(os.getenv("PAGE_SIZE_DEFAULT", "100"))
+    PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", "1000"))
+
+    # Буферизованная запись audit_logs; AUDIT_OVERFLOW_POLICY: block / drop_oldest / spill
+    AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+    AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1.0"))  # секунды
+    AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+    AUDIT_OVERFLOW_POLICY = os.getenv("AUDIT_OVERFLOW_POLICY", "spill")
+    AUDIT_SPILL_PATH = os.getenv("AUDIT_SPILL_PATH", "audit_spill.jsonl")
+
+    # Потоковая выгрузка alert_history / audit_logs: строк за один fetch курсора
+    EXPORT_FETCH_SIZE = int(os.getenv("EXPORT_FETCH_SIZE", "2000"))
+
+    # Кэш недавних отпечатков алертов (пропуск повторов без запроса в БД)
+    ALERT_CACHE_SIZE = int(os.getenv("ALERT_CACHE_SIZE", "100000"))
+    ALERT_CACHE_TTL = float(os.getenv("ALERT_CACHE_TTL", "300"))  # секунды
+
+    # Перенос неактивных алертов в alert_history (месячные партиции)
+    ALERT_ARCHIVE_INTERVAL = float(os.getenv("ALERT_ARCHIVE_INTERVAL", "60"))  # секунды
+    ALERT_ARCHIVE_BATCH = int(os.getenv("ALERT_ARCHIVE_BATCH", "5000"))
+    ALERT_HISTORY_MONTHS_AHEAD = int(os.getenv("ALERT_HISTORY_MONTHS_AHEAD", "2"))
+    ALERT_HISTORY_RETENTION_MONTHS = int(os.getenv("ALERT_HISTORY_RETENTION_MONTHS", "12"))
+
+    # Long-poll для GET /agent/commands?wait=
+    COMMANDS_MAX_WAIT = int(os.getenv("COMMANDS_MAX_WAIT", "60"))  # секунды
+
+    # Максимальный размер тела запроса агента после распаковки gzip/zstd
+    AGENT_MAX_BODY_BYTES = int(os.getenv("AGENT_MAX_BODY_BYTES", str(8 * 1024 * 1024)))
+
+    # POST /agent/batch (relay/gateway)
+    AGENT_BATCH_MAX_ITEMS = int(os.getenv("AGENT_BATCH_MAX_ITEMS", "2000"))
+
+    # Выдача команд агентам (lease)
+    COMMAND_CLAIM_LIMIT = int(os.getenv("COMMAND_CLAIM_LIMIT", "10"))
+    COMMAND_LEASE_SECONDS = int(os.getenv("COMMAND_LEASE_SECONDS", "120"))
+    COMMAND_MAX_ATTEMPTS = int(os.getenv("COMMAND_MAX_ATTEMPTS", "5"))
+    COMMAND_SWEEP_INTERVAL = float(os.getenv("COMMAND_SWEEP_INTERVAL", "10"))  # секунды
+    COMMAND_SWEEP_BATCH = int(os.getenv("COMMAND_SWEEP_BATCH", "1000"))
+
+    # Счётчики прогресса рассылок команд (command_campaigns)
+    CAMPAIGN_FLUSH_INTERVAL = float(os.getenv("CAMPAIGN_FLUSH_INTERVAL", "2"))  # секунды
+    CAMPAIGN_RECOUNT_INTERVAL = float(os.getenv("CAMPAIGN_RECOUNT_INTERVAL", "300"))  # секунды
+
+    # Запуск (run.py) и остановка
+    HOST = os.getenv("HOST", "0.0.0.0")
+    PORT = int(os.getenv("PORT", "8080"))
+    # 0 — по числу ядер
+    WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "0"))
+    # сколько uvicorn ждёт незавершённые запросы при остановке
+    GRACEFUL_SHUTDOWN_TIMEOUT = int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", "30"))  # секунды
+    # сколько при остановке повторяется запись буфера статусов, если БД недоступна
+    SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "10"))  # секунды
 
 settings = Settings()
@@ -1,13 +1,43 @@
+import time
 from typing import AsyncGenerator
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from src.config import settings
+from src.utils.metrics import registry
+
+pool_checkout_seconds = registry.histogram(
+    "db_pool_checkout_seconds",
+    "Time spent waiting for a pooled connection",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Pool that records how long each checkout waited."""
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            pool_checkout_seconds.observe(time.perf_counter() - started)
+
 
 # Асинхронные engine и фабрика сессий
-# - echo=True полезно в разработке; убрать в продакшене
-engine = create_async_engine(settings.DATABASE_URL, echo=True)
+# - DB_ECHO=1 логирует все SQL-запросы, полезно только в разработке
+engine = create_async_engine(
+    settings.DATABASE_URL,
+    echo=settings.DB_ECHO,
+    poolclass=TimedQueuePool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+)
 async_session = async_sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
 
+# asyncpg ограничивает число параметров в одном запросе (32767) — столько строк за раз в multi-row INSERT
+UPSERT_CHUNK_SIZE = 4000
+
 # Базовый класс для моделей SQLAlchemy
 Base = declarative_base()
 
@@ -1,9 +1,78 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from src.api.router import api_router
+from src.database import engine
+from src.security.agent_key import AGENT_KEYS_CHANNEL, agent_key_cache
+from src.services.alert_archive import alert_archiver
+from src.services.audit import audit_sink
+from src.services.campaigns import CAMPAIGNS_CHANNEL, campaign_progress
+from src.services.commands import COMMANDS_CHANNEL, command_sweeper, command_waiters
+from src.services.events import EVENTS_CHANNEL, event_hub
+from src.services.fleet_snapshot import fleet_snapshot
+from src.services.heartbeat import heartbeat_tracker
+from src.services.idempotency import idempotency_store
+from src.services.pg_listener import pg_listener
+from src.services.region_rollup import REGIONS_CHANNEL, region_rollup
+from src.services.status_series import status_rollup_job
+from src.services.status_writer import status_writer
+from src.utils.instrumentation import MetricsMiddleware, install_sql_metrics
+from src.utils.metrics import registry
+from src.utils.responses import ORJSONResponse
+
+install_sql_metrics(engine)
+
+pg_listener.subscribe(COMMANDS_CHANNEL, command_waiters.on_notify)
+pg_listener.on_reconnect(command_waiters.wake_all)
+pg_listener.subscribe(AGENT_KEYS_CHANNEL, agent_key_cache.on_notify)
+pg_listener.on_reconnect(agent_key_cache.clear)
+pg_listener.subscribe(EVENTS_CHANNEL, event_hub.on_notify)
+pg_listener.on_reconnect(event_hub.resync)
+pg_listener.subscribe(CAMPAIGNS_CHANNEL, campaign_progress.on_notify)
+pg_listener.subscribe(REGIONS_CHANNEL, region_rollup.on_notify)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await pg_listener.start()
+    await status_writer.start()
+    await command_sweeper.start()
+    await fleet_snapshot.start()
+    await alert_archiver.start()
+    await status_rollup_job.start()
+    await audit_sink.start()
+    await heartbeat_tracker.start()
+    await region_rollup.start()
+    await idempotency_store.start()
+    await campaign_progress.start()
+    try:
+        yield
+    finally:
+        await campaign_progress.stop()
+        await idempotency_store.stop()
+        await region_rollup.stop()
+        await heartbeat_tracker.stop()
+        await audit_sink.stop()
+        await status_rollup_job.stop()
+        await alert_archiver.stop()
+        await fleet_snapshot.stop()
+        await command_sweeper.stop()
+        await status_writer.stop()
+        await pg_listener.stop()
+
 
 app = FastAPI(
     title="ESN Monitoring API",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
 
+app.add_middleware(MetricsMiddleware)
 app.include_router(api_router)
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -1,5 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
 from datetime import datetime
+from typing import List, Literal, Optional
+from uuid import UUID
 
 
 class LoginRequest(BaseModel):
@@ -13,11 +15,47 @@ class LoginResponse(BaseModel):
 
 
 class Server(BaseModel):
+    # серверы, ещё не приславшие статус, есть в БД только с id
     id: int
-    region_id: int
-    region_name: str
-    ip: str
-    cgm_version: str
-    admin_version: str
-    last_update: datetime
+    region_id: Optional[int] = None
+    region_name: Optional[str] = None
+    ip: Optional[str] = None
+    cgm_version: Optional[str] = None
+    admin_version: Optional[str] = None
+    last_update: Optional[datetime] = None
     has_critical_alerts: bool
+
+
+class CommandFanoutRequest(BaseModel):
+    type: Literal["DELETE_ALERT", "CUSTOM"]
+    payload: Optional[dict] = None
+    # ровно одна цель: регион, список серверов или весь парк
+    region_id: Optional[int] = None
+    server_ids: Optional[List[int]] = Field(None, min_length=1)
+    all_servers: bool = False
+    # через сколько секунд невыполненная команда считается failed
+    ttl_seconds: Optional[int] = Field(None, gt=0)
+
+    @model_validator(mode="after")
+    def check_target(self):
+        targets = (self.region_id is not None) + (self.server_ids is not None) + self.all_servers
+        if targets != 1:
+            raise ValueError("Set exactly one of 'region_id', 'server_ids' or 'all_servers'")
+        return self
+
+
+class CommandFanoutResponse(BaseModel):
+    correlation_id: UUID
+    queued: int
+
+
+class CommandProgress(BaseModel):
+    correlation_id: UUID
+    type: str
+    total: int
+    pending: int
+    sent: int
+    done: int
+    failed: int
+    created_at: datetime
+    updated_at: datetime
@@ -1,19 +1,26 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import Annotated, Any, Dict, List, Literal, Optional, Union
 from datetime import datetime
 
 
 class AgentStatusRequest(BaseModel):
-    agent_key: str
+    agent_key: str = Field(max_length=256)
     server_id: int
-    ip: str
-    cgm_version: str
-    admin_version: str
+    # строки попадают в события server.status (NOTIFY, лимит 8000 байт)
+    ip: str = Field(max_length=64)
+    cgm_version: str = Field(max_length=128)
+    admin_version: str = Field(max_length=128)
     timestamp: datetime
+    # числовые метрики heartbeat (cpu, disk_used_pct, ...), пишутся в status_samples;
+    # NaN/Infinity JSONB не примет, а упавший пакет write-behind остановил бы запись всех статусов
+    metrics: Optional[Dict[str, Annotated[float, Field(allow_inf_nan=False)]]] = None
+
+
+AlertSeverity = Literal["Normal", "Minor", "Major", "Critical"]
 
 
 class AlertItem(BaseModel):
-    severity: str
+    severity: AlertSeverity
     source: str
     alert: str
     counter: int
@@ -33,5 +40,35 @@ class Command(BaseModel):
 
 
 class CommandResultRequest(BaseModel):
-    status: str
+    status: Literal["success", "failed"]
     message: Optional[str] = None
+
+
+class StatusEnvelope(BaseModel):
+    type: Literal["status"]
+    data: AgentStatusRequest
+
+
+class AlertsEnvelope(BaseModel):
+    type: Literal["alerts"]
+    data: AgentAlertsRequest
+
+
+BatchEnvelope = Annotated[Union[StatusEnvelope, AlertsEnvelope], Field(discriminator="type")]
+
+
+class AgentBatchRequest(BaseModel):
+    # Каждый элемент валидируется отдельно (BatchEnvelope), чтобы одна ошибка не отклоняла весь пакет
+    items: List[Any]
+
+
+class BatchItemResult(BaseModel):
+    index: int
+    status: Literal["ok", "error"]
+    detail: Optional[Any] = None
+
+
+class AgentBatchResponse(BaseModel):
+    accepted: int
+    rejected: int
+    results: List[BatchItemResult]
@@ -5,13 +5,14 @@ from sqlalchemy import (
     Text,
     TIMESTAMP,
     Boolean,
+    Float,
     Index,
     ForeignKey,
     func,
     text,
     Enum as SAEnum,
 )
-from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy.dialects.postgresql import ARRAY, UUID, JSONB
 from sqlalchemy.orm import relationship
 from src.database import Base
 
@@ -68,6 +69,8 @@ class Server(Base):
     cgm_version = Column(Text)
     admin_version = Column(Text)
     last_update = Column(TIMESTAMP(timezone=True))
+    # database time of the last stored heartbeat (last_update is the agent's clock)
+    last_seen = Column(TIMESTAMP(timezone=True))
     last_status = Column(JSONB)
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
 
@@ -87,6 +90,8 @@ class AgentKey(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, server_default=text("gen_random_uuid()"))
     server_id = Column(BigInteger, ForeignKey("servers.id", ondelete="CASCADE"), nullable=False)
     key_hash = Column(Text, nullable=False)
+    # other servers this key may post for (relays/gateways); NULL - only server_id
+    allowed_server_ids = Column(ARRAY(BigInteger), nullable=True)
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
     revoked_at = Column(TIMESTAMP(timezone=True), nullable=True)
 
@@ -106,6 +111,8 @@ class Alert(Base):
     severity = Column(AlertSeverityEnum, nullable=False)
     source = Column(Text)
     alert_text = Column(Text, nullable=False)
+    # sha1(severity | source | normalized alert_text), see src/services/alert_ingest.py
+    fingerprint = Column(Text, nullable=False)
     counter = Column(Integer, server_default=text("1"), nullable=False)
     stacktrace = Column(Text)
     timestamp = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
@@ -117,10 +124,26 @@ class Alert(Base):
 
 Index("idx_alerts_server_active", Alert.server_id, Alert.active)
 Index("idx_alerts_severity", Alert.severity)
+# keyset pages of GET /admin/alerts (timestamp DESC, id DESC), all alerts and per server
+Index("idx_alerts_timestamp_id", Alert.timestamp, Alert.id)
+Index("idx_alerts_server_timestamp_id", Alert.server_id, Alert.timestamp, Alert.id)
+# lets the archiver find resolved alerts without scanning the active ones
+Index("idx_alerts_inactive", Alert.id, postgresql_where=~Alert.active)
+# Only one active row per fingerprint: repeated alerts are upserted into it
+Index(
+    "uq_alerts_active_fingerprint",
+    Alert.server_id,
+    Alert.fingerprint,
+    unique=True,
+    postgresql_where=Alert.active,
+)
 
 
 class AlertHistory(Base):
     __tablename__ = "alert_history"
+    # Monthly partitions are created ahead and dropped for retention by
+    # src/services/alert_archive.py; the partition key must be part of the PK
+    __table_args__ = {"postgresql_partition_by": "RANGE (archived_at)"}
 
     id = Column(BigInteger, primary_key=True, autoincrement=True)
     server_id = Column(BigInteger)
@@ -130,12 +153,77 @@ class AlertHistory(Base):
     counter = Column(Integer)
     stacktrace = Column(Text)
     timestamp = Column(TIMESTAMP(timezone=True))
-    archived_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
+    archived_at = Column(TIMESTAMP(timezone=True), primary_key=True, server_default=func.now(), nullable=False)
 
 
 Index("idx_alert_history_server", AlertHistory.server_id)
 
 
+class StatusSample(Base):
+    __tablename__ = "status_samples"
+    # Daily partitions, dropped for retention by src/services/status_series.py
+    __table_args__ = {"postgresql_partition_by": "RANGE (ts)"}
+
+    server_id = Column(BigInteger, primary_key=True)
+    ts = Column(TIMESTAMP(timezone=True), primary_key=True)
+    metrics = Column(JSONB, nullable=False)
+
+
+class StatusRollup(Base):
+    __tablename__ = "status_rollups"
+
+    resolution = Column(Text, primary_key=True)  # 1m / 1h / 1d
+    server_id = Column(BigInteger, primary_key=True)
+    metric = Column(Text, primary_key=True)
+    bucket = Column(TIMESTAMP(timezone=True), primary_key=True)
+    samples = Column(Integer, nullable=False)
+    value_min = Column(Float, nullable=False)
+    value_max = Column(Float, nullable=False)
+    value_sum = Column(Float, nullable=False)
+
+
+Index("idx_status_rollups_resolution_bucket", StatusRollup.resolution, StatusRollup.bucket)
+
+
+class StatusRollupWatermark(Base):
+    """Per resolution: everything before rolled_until is aggregated, see src/services/status_series.py."""
+
+    __tablename__ = "status_rollup_watermarks"
+
+    resolution = Column(Text, primary_key=True)
+    rolled_until = Column(TIMESTAMP(timezone=True), nullable=False)
+
+
+class RegionSummary(Base):
+    """Per-region counters behind GET /admin/regions/summary, see src/services/region_rollup.py."""
+
+    __tablename__ = "region_summaries"
+
+    region_id = Column(Integer, ForeignKey("regions.id", ondelete="CASCADE"), primary_key=True)
+    server_count = Column(Integer, server_default=text("0"), nullable=False)
+    online_count = Column(Integer, server_default=text("0"), nullable=False)
+    alerts_normal = Column(Integer, server_default=text("0"), nullable=False)
+    alerts_minor = Column(Integer, server_default=text("0"), nullable=False)
+    alerts_major = Column(Integer, server_default=text("0"), nullable=False)
+    alerts_critical = Column(Integer, server_default=text("0"), nullable=False)
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
+
+
+class IdempotencyKey(Base):
+    """Responses of agent writes by Idempotency-Key, see src/services/idempotency.py."""
+
+    __tablename__ = "idempotency_keys"
+
+    server_id = Column(BigInteger, primary_key=True)
+    scope = Column(Text, primary_key=True)  # alerts / result
+    key = Column(Text, primary_key=True)
+    response = Column(JSONB, nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
+
+
+Index("idx_idempotency_keys_created", IdempotencyKey.created_at)
+
+
 class CommandQueue(Base):
     __tablename__ = "command_queue"
 
@@ -149,6 +237,8 @@ class CommandQueue(Base):
     correlation_id = Column(UUID(as_uuid=True))
     attempts = Column(Integer, server_default=text("0"), nullable=False)
     ttl_until = Column(TIMESTAMP(timezone=True))
+    # set when the command is handed to an agent; expired leases go back to pending
+    lease_until = Column(TIMESTAMP(timezone=True))
 
     server = relationship("Server", back_populates="commands")
     results = relationship("CommandResult", back_populates="command", cascade="all, delete-orphan")
@@ -156,6 +246,30 @@ class CommandQueue(Base):
 
 Index("idx_commands_server_status", CommandQueue.server_id, CommandQueue.status)
 Index("idx_commands_status_created", CommandQueue.status, CommandQueue.created_at)
+# progress and failure listing of fan-out campaigns, see src/services/campaigns.py
+Index(
+    "idx_commands_correlation_status",
+    CommandQueue.correlation_id,
+    CommandQueue.status,
+    CommandQueue.id,
+    postgresql_where=CommandQueue.correlation_id.isnot(None),
+)
+
+
+class CommandCampaign(Base):
+    """Per-correlation_id command counters of a fan-out, see src/services/campaigns.py."""
+
+    __tablename__ = "command_campaigns"
+
+    correlation_id = Column(UUID(as_uuid=True), primary_key=True)
+    type = Column(CommandTypeEnum, nullable=False)
+    total = Column(Integer, server_default=text("0"), nullable=False)
+    pending = Column(Integer, server_default=text("0"), nullable=False)
+    sent = Column(Integer, server_default=text("0"), nullable=False)
+    done = Column(Integer, server_default=text("0"), nullable=False)
+    failed = Column(Integer, server_default=text("0"), nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
 
 
 class CommandResult(Base):
@@ -0,0 +1,43 @@
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Literal, Optional, Union
+
+from src.models.agent_models import AlertSeverity
+
+NumericOp = Literal[">", ">=", "<", "<=", "==", "!="]
+TextOp = Literal["==", "!=", "in", "not in", "version<", "version<=", "version>", "version>="]
+
+
+class RuleCondition(BaseModel):
+    # ровно одно из двух: числовая метрика из heartbeat или текстовое поле статуса
+    metric: Optional[str] = None
+    field: Optional[Literal["cgm_version", "admin_version", "ip"]] = None
+    op: Union[NumericOp, TextOp]
+    value: Union[float, str, List[str]]
+
+    @model_validator(mode="after")
+    def check_operand(self):
+        if (self.metric is None) == (self.field is None):
+            raise ValueError("Set exactly one of 'metric' or 'field'")
+        if self.metric is not None and not isinstance(self.value, float):
+            raise ValueError("Metric conditions compare with a number")
+        if self.metric is not None and self.op not in NumericOp.__args__:
+            raise ValueError(f"Operator {self.op!r} does not apply to metrics")
+        if self.field is not None and self.op in ("in", "not in") and not isinstance(self.value, list):
+            raise ValueError(f"Operator {self.op!r} needs a list of values")
+        if self.field is not None and self.op not in ("in", "not in") and not isinstance(self.value, str):
+            raise ValueError(f"Operator {self.op!r} on a field needs a string value")
+        return self
+
+
+class ThresholdRule(BaseModel):
+    name: str
+    severity: AlertSeverity
+    # текст алерта; постоянный, чтобы отпечаток алерта не менялся от проверки к проверке
+    text: str
+    # все условия должны выполняться одновременно
+    when: List[RuleCondition] = Field(min_length=1)
+    enabled: bool = True
+
+
+class RuleSet(BaseModel):
+    rules: List[ThresholdRule]
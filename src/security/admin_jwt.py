@@ -1,6 +1,44 @@
-import jwt
+import asyncio
+import base64
+import hashlib
+import hmac
+import secrets
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta, UTC
+
+import jwt
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy import select
+
 from src.config import settings
+from src.database import async_session
+from src.models.db_models import AdminUser
+
+PASSWORD_HASH_ITERATIONS = 600_000
+
+
+def hash_password(password: str) -> str:
+    salt = secrets.token_bytes(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, PASSWORD_HASH_ITERATIONS)
+    return "pbkdf2_sha256${}${}${}".format(
+        PASSWORD_HASH_ITERATIONS,
+        base64.b64encode(salt).decode(),
+        base64.b64encode(digest).decode(),
+    )
+
+
+def verify_password(password: str, password_hash: str) -> bool:
+    try:
+        algorithm, iterations, salt, digest = password_hash.split("$")
+    except ValueError:
+        return False
+    if algorithm != "pbkdf2_sha256":
+        return False
+    candidate = hashlib.pbkdf2_hmac("sha256", password.encode(), base64.b64decode(salt), int(iterations))
+    return hmac.compare_digest(candidate, base64.b64decode(digest))
 
 
 def create_jwt(username: str):
@@ -9,3 +47,115 @@ def create_jwt(username: str):
         "exp": datetime.now(UTC) + timedelta(hours=8)
     }
     return jwt.encode(payload, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
+
+
+@dataclass(frozen=True)
+class AdminPrincipal:
+    user_id: int
+    username: str
+    role: str
+
+
+class AdminTokenCache:
+    """Bounded LRU of already verified tokens, each valid until its `exp` (capped by max_age)."""
+
+    def __init__(self, max_size: int, max_age: float):
+        self.max_size = max_size
+        self.max_age = max_age
+        self._tokens: OrderedDict[str, tuple[AdminPrincipal, float]] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> AdminPrincipal | None:
+        entry = self._tokens.get(token)
+        if entry is not None:
+            if entry[1] > time.time():
+                self._tokens.move_to_end(token)
+                self.hits += 1
+                return entry[0]
+            del self._tokens[token]
+        self.misses += 1
+        return None
+
+    def put(self, token: str, principal: AdminPrincipal, exp: float) -> None:
+        self._tokens[token] = (principal, min(exp, time.time() + self.max_age))
+        self._tokens.move_to_end(token)
+        while len(self._tokens) > self.max_size:
+            self._tokens.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"size": len(self._tokens), "hits": self.hits, "misses": self.misses}
+
+
+admin_token_cache = AdminTokenCache(settings.ADMIN_TOKEN_CACHE_SIZE, settings.ADMIN_TOKEN_CACHE_MAX_AGE)
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
+
+async def authenticate(username: str, password: str) -> AdminPrincipal | None:
+    """Checks credentials against admin_users and updates last_login."""
+    async with async_session() as session:
+        user = await session.scalar(select(AdminUser).where(AdminUser.username == username))
+        if user is None:
+            return None
+        # pbkdf2 занимает сотни миллисекунд — не блокируем event loop
+        if not await asyncio.to_thread(verify_password, password, user.password_hash):
+            return None
+        user.last_login = datetime.now(UTC)
+        await session.commit()
+        return AdminPrincipal(user_id=user.id, username=user.username, role=user.role)
+
+
+async def get_current_admin(
+    credentials: HTTPAuthorizationCredentials | None = Depends(bearer_scheme),
+) -> AdminPrincipal:
+    if credentials is None:
+        raise _unauthorized("Not authenticated")
+    token = credentials.credentials
+
+    principal = admin_token_cache.get(token)
+    if principal is not None:
+        return principal
+
+    try:
+        payload = jwt.decode(
+            token,
+            settings.JWT_SECRET,
+            algorithms=[settings.JWT_ALGORITHM],
+            options={"require": ["exp", "sub"]},
+        )
+    except jwt.PyJWTError:
+        raise _unauthorized("Invalid or expired token")
+
+    async with async_session() as session:
+        row = (
+            await session.execute(
+                select(AdminUser.id, AdminUser.username, AdminUser.role).where(AdminUser.username == payload["sub"])
+            )
+        ).first()
+    if row is None:
+        raise _unauthorized("Unknown user")
+
+    principal = AdminPrincipal(user_id=row.id, username=row.username, role=row.role)
+    admin_token_cache.put(token, principal, payload["exp"])
+    return principal
+
+
+def require_role(*roles: str):
+    """Route dependency: the role comes from the cached principal, no extra query."""
+
+    async def dependency(admin: AdminPrincipal = Depends(get_current_admin)) -> AdminPrincipal:
+        if admin.role not in roles:
+            raise HTTPException(status_code=403, detail="Insufficient role")
+        return admin
+
+    return dependency
+
+
+require_viewer = require_role("admin", "viewer")
+require_admin = require_role("admin")
@@ -1,7 +1,204 @@
+import asyncio
+import hashlib
+import secrets
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
 from fastapi import Header, HTTPException
+from sqlalchemy import select
+
 from src.config import settings
+from src.database import async_session
+from src.models.db_models import AgentKey
+from src.utils.metrics import registry
+
+# Канал, в который триггер agent_keys шлёт key_hash (см. миграцию d4e8f1a6c352)
+AGENT_KEYS_CHANNEL = "agent_keys"
+
+
+@dataclass(frozen=True)
+class AgentIdentity:
+    server_id: int
+    key_hash: str
+    # другие серверы, от имени которых ключ может писать (ретрансляторы), см. agent_keys.allowed_server_ids
+    allowed_server_ids: frozenset[int] = frozenset()
+
+    def may_act_for(self, server_id: int) -> bool:
+        return server_id == self.server_id or server_id in self.allowed_server_ids
+
+
+def ensure_server(agent: AgentIdentity, server_id: int) -> None:
+    """403 unless the agent key belongs to `server_id` or lists it in its allow-list."""
+    if not agent.may_act_for(server_id):
+        raise HTTPException(status_code=403, detail=f"Agent key is not valid for server {server_id}")
+
+
+def hash_agent_key(key: str) -> str:
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def generate_agent_key() -> tuple[str, str]:
+    """Returns (key, key_hash). Only the hash is stored in agent_keys."""
+    key = secrets.token_urlsafe(32)
+    return key, hash_agent_key(key)
+
+
+# значение get() для ключа из негативного кэша
+INVALID_KEY = object()
+
+
+class AgentKeyCache:
+    """key_hash -> AgentIdentity with TTL and LRU eviction, plus a negative cache for unknown keys."""
+
+    def __init__(self, max_size: int, ttl: float, negative_max_size: int, negative_ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_max_size = negative_max_size
+        self.negative_ttl = negative_ttl
+        self._positive: OrderedDict[str, tuple[AgentIdentity, float]] = OrderedDict()
+        self._negative: OrderedDict[str, float] = OrderedDict()
+        # растёт при каждой инвалидации: результат запроса, начатого раньше, не кэшируется
+        self.generation = 0
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key_hash: str) -> AgentIdentity | object | None:
+        """AgentIdentity on a hit, INVALID_KEY for a cached unknown key, None on a miss."""
+        now = time.monotonic()
+        entry = self._positive.get(key_hash)
+        if entry is not None:
+            if entry[1] > now:
+                self._positive.move_to_end(key_hash)
+                self.hits += 1
+                return entry[0]
+            del self._positive[key_hash]
+
+        expires = self._negative.get(key_hash)
+        if expires is not None:
+            if expires > now:
+                self.negative_hits += 1
+                return INVALID_KEY
+            del self._negative[key_hash]
+
+        self.misses += 1
+        return None
+
+    def peek(self, key_hash: str) -> AgentIdentity | None:
+        """Cached identity without touching LRU order or hit counters."""
+        entry = self._positive.get(key_hash)
+        return entry[0] if entry is not None and entry[1] > time.monotonic() else None
+
+    def put(self, key_hash: str, identity: AgentIdentity | None) -> None:
+        now = time.monotonic()
+        if identity is None:
+            cache, size, value = self._negative, self.negative_max_size, now + self.negative_ttl
+        else:
+            cache, size, value = self._positive, self.max_size, (identity, now + self.ttl)
+        cache[key_hash] = value
+        cache.move_to_end(key_hash)
+        while len(cache) > size:
+            cache.popitem(last=False)
+
+    def invalidate(self, key_hash: str) -> None:
+        self.generation += 1
+        self.invalidations += 1
+        self._positive.pop(key_hash, None)
+        self._negative.pop(key_hash, None)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._positive.clear()
+        self._negative.clear()
+
+    def on_notify(self, conn, pid, channel, payload: str) -> None:
+        self.invalidate(payload)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._positive),
+            "negative_size": len(self._negative),
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+
+agent_key_cache = AgentKeyCache(
+    settings.AGENT_KEY_CACHE_SIZE,
+    settings.AGENT_KEY_CACHE_TTL,
+    settings.AGENT_KEY_NEGATIVE_CACHE_SIZE,
+    settings.AGENT_KEY_NEGATIVE_TTL,
+)
+
+registry.callback_counter(
+    "agent_key_cache_lookups_total",
+    "Agent key verifications by cache outcome",
+    lambda: {
+        ("hit",): agent_key_cache.hits,
+        ("negative_hit",): agent_key_cache.negative_hits,
+        ("miss",): agent_key_cache.misses,
+    },
+    ("result",),
+)
+
+# Параллельные промахи по одному ключу ждут один и тот же запрос в БД
+_lookups: dict[str, asyncio.Future] = {}
+
+
+async def _lookup_identity(key_hash: str) -> AgentIdentity | None:
+    async with async_session() as session:
+        row = (
+            await session.execute(
+                select(AgentKey.server_id, AgentKey.allowed_server_ids).where(
+                    AgentKey.key_hash == key_hash, AgentKey.revoked_at.is_(None)
+                )
+            )
+        ).first()
+    if row is None:
+        return None
+    return AgentIdentity(
+        server_id=row.server_id, key_hash=key_hash, allowed_server_ids=frozenset(row.allowed_server_ids or ())
+    )
+
+
+async def verify_agent_key(x_api_key: str = Header(...)) -> AgentIdentity:
+    key_hash = hash_agent_key(x_api_key)
+    identity = agent_key_cache.get(key_hash)
+
+    if identity is None:
+        future = _lookups.get(key_hash)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            _lookups[key_hash] = future
+            generation = agent_key_cache.generation
+            try:
+                result = await _lookup_identity(key_hash)
+                if agent_key_cache.generation == generation:
+                    agent_key_cache.put(key_hash, result)
+                future.set_result(result)
+            except BaseException as exc:
+                # в том числе отмена (клиент отключился): ожидающие не должны зависнуть
+                if isinstance(exc, Exception):
+                    future.set_exception(exc)
+                    future.exception()  # помечаем как полученное, если никто больше не ждёт
+                else:
+                    future.cancel()
+                raise
+            finally:
+                del _lookups[key_hash]
+        # отмена лидера не должна отменять ожидающих: они повторят поиск сами
+        try:
+            identity = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+            return await verify_agent_key(x_api_key)
 
-def verify_agent_key(x_api_key: str = Header(...)):
-    if x_api_key not in settings.VALID_AGENT_KEYS:
+    if identity is None or identity is INVALID_KEY:
         raise HTTPException(status_code=401, detail="Invalid agent API key")
-    return x_api_key
+    return identity
@@ -0,0 +1,192 @@
+import json
+import math
+import random
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Coroutine
+
+from fastapi import HTTPException, Request, Response
+
+from src.config import settings
+from src.security.agent_key import AgentIdentity, agent_key_cache, hash_agent_key
+from src.utils.encoding import AgentRoute
+from src.utils.metrics import registry
+
+agent_rejections = registry.counter(
+    "agent_requests_rejected_total",
+    "Agent ingestion requests answered with 429",
+    ("reason",),
+)
+
+
+def parse_overrides(raw: str) -> dict[str, tuple[float, float]]:
+    """'{"42": {"rate": 5, "burst": 100}, "<key_hash>": {...}}' -> {"42": (5.0, 100.0), ...}."""
+    if not raw:
+        return {}
+    return {
+        str(key): (float(limit["rate"]), float(limit["burst"]))
+        for key, limit in json.loads(raw).items()
+    }
+
+
+def retry_after(seconds: float, jitter: float) -> str:
+    """Whole seconds for Retry-After, spread by up to `jitter` extra seconds."""
+    return str(max(1, math.ceil(seconds + random.uniform(0, jitter))))
+
+
+class AgentRateLimiter:
+    """Token buckets per agent key (key hash), LRU-bounded.
+
+    A bucket holds up to `burst` tokens and refills at `rate` per second;
+    every admitted request takes one. The bucket is picked from the X-API-Key
+    header before the body is read: an ordinary key writes only for its own
+    server, a relay key gets one bucket for all of its servers. Per-agent
+    limits come from `overrides`, keyed by agent key hash or by the key's
+    server_id (once the key is in the agent key cache). Keys not yet in that
+    cache (new or unknown) get buckets in a separate, smaller LRU, so a flood
+    of random keys cannot evict the buckets of real agents. Limits apply per
+    worker process.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        overrides: dict[str, tuple[float, float]],
+        max_keys: int,
+        max_unverified_keys: int,
+        jitter: float,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.overrides = overrides
+        self.max_keys = max_keys
+        self.max_unverified_keys = max_unverified_keys
+        self.jitter = jitter
+        # key_hash -> (tokens, monotonic time of the last refill); ключи из кэша agent_key_cache
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        # то же для ещё не проверенных ключей
+        self._unverified: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+        self.admitted = 0
+        self.rejected = 0
+
+    def limits(self, key_hash: str, identity: AgentIdentity | None = None) -> tuple[float, float]:
+        if self.overrides:
+            limit = self.overrides.get(key_hash)
+            if limit is None and identity is not None:
+                limit = self.overrides.get(str(identity.server_id))
+            if limit is not None:
+                return limit
+        return self.rate, self.burst
+
+    def check(self, key_hash: str) -> None:
+        """Takes a token or raises 429 with the time until the next one (plus jitter)."""
+        identity = agent_key_cache.peek(key_hash)
+        rate, burst = self.limits(key_hash, identity)
+        now = time.monotonic()
+        if identity is not None:
+            buckets, max_keys = self._buckets, self.max_keys
+            # ключ проверен — bucket переезжает из LRU непроверенных вместе с остатком токенов
+            state = self._unverified.pop(key_hash, None)
+            if state is not None and key_hash not in buckets:
+                buckets[key_hash] = state
+        else:
+            buckets, max_keys = self._unverified, self.max_unverified_keys
+        tokens, last = buckets.get(key_hash, (burst, now))
+        tokens = min(burst, tokens + (now - last) * rate)
+
+        if tokens < 1:
+            buckets[key_hash] = (tokens, now)
+            self.rejected += 1
+            agent_rejections.inc("rate_limit")
+            wait = (1 - tokens) / rate if rate > 0 else 60.0
+            raise HTTPException(
+                status_code=429,
+                detail="Agent rate limit exceeded",
+                headers={"Retry-After": retry_after(wait, self.jitter)},
+            )
+
+        buckets[key_hash] = (tokens - 1, now)
+        buckets.move_to_end(key_hash)
+        while len(buckets) > max_keys:
+            buckets.popitem(last=False)
+        self.admitted += 1
+
+    def stats(self) -> dict:
+        return {
+            "buckets": len(self._buckets),
+            "unverified_buckets": len(self._unverified),
+            "overrides": len(self.overrides),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+class ConcurrencyGate:
+    """Caps ingestion requests in progress; past the cap requests are shed at once, not queued."""
+
+    def __init__(self, limit: int, retry_after: float, jitter: float):
+        self.limit = limit
+        self.retry_after = retry_after
+        self.jitter = jitter
+        self.in_flight = 0
+        self.rejected = 0
+
+    @contextmanager
+    def slot(self):
+        if self.in_flight >= self.limit:
+            self.rejected += 1
+            agent_rejections.inc("overload")
+            # при массовом переподключении джиттер разносит повторы агентов во времени
+            raise HTTPException(
+                status_code=429,
+                detail="Server is overloaded, retry later",
+                headers={"Retry-After": retry_after(self.retry_after, self.jitter)},
+            )
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {"limit": self.limit, "in_flight": self.in_flight, "rejected": self.rejected}
+
+
+agent_rate_limiter = AgentRateLimiter(
+    settings.AGENT_RATE_PER_SECOND,
+    settings.AGENT_RATE_BURST,
+    parse_overrides(settings.AGENT_RATE_OVERRIDES),
+    settings.AGENT_RATE_MAX_KEYS,
+    settings.AGENT_RATE_MAX_UNVERIFIED_KEYS,
+    settings.RETRY_AFTER_JITTER,
+)
+ingest_gate = ConcurrencyGate(settings.INGEST_MAX_CONCURRENCY, settings.OVERLOAD_RETRY_AFTER, settings.RETRY_AFTER_JITTER)
+
+registry.callback_gauge("agent_ingest_in_flight", "Agent ingestion requests in progress", lambda: ingest_gate.in_flight)
+
+
+class AgentIngestRoute(AgentRoute):
+    """AgentRoute with admission control for the ingestion endpoints.
+
+    The concurrency slot and the rate bucket are taken before the body is
+    read, decompressed or the key is looked up, so a shed request costs
+    only a hash of its X-API-Key header.
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            if not settings.RATE_LIMIT_ENABLED:
+                return await handler(request)
+            with ingest_gate.slot():
+                # без заголовка запрос отклонит сама проверка ключа
+                api_key = request.headers.get("x-api-key")
+                if api_key is not None:
+                    agent_rate_limiter.check(hash_agent_key(api_key))
+                return await handler(request)
+
+        return route_handler
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+from datetime import UTC, datetime
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import settings
+from src.database import async_session
+from src.services.partitions import add_months, create_partition, drop_partitions_before, try_lock
+
+logger = logging.getLogger(__name__)
+
+# произвольная константа для pg_try_advisory_xact_lock: обслуживание партиций делает один воркер
+PARTITION_MAINTENANCE_LOCK = 4_810_932
+
+MOVE_BATCH_SQL = text(
+    """
+    WITH moved AS (
+        DELETE FROM alerts
+        WHERE id IN (
+            SELECT id FROM alerts
+            WHERE NOT active
+            ORDER BY id
+            LIMIT :batch_size
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING server_id, severity, source, alert_text, counter, stacktrace, timestamp
+    )
+    INSERT INTO alert_history (server_id, severity, source, alert_text, counter, stacktrace, timestamp)
+    SELECT server_id, severity, source, alert_text, counter, stacktrace, timestamp FROM moved
+    """
+)
+
+
+def partition_name(month: datetime) -> str:
+    return f"alert_history_y{month.year:04d}m{month.month:02d}"
+
+
+class AlertArchiver:
+    """Moves resolved alerts into the monthly-partitioned `alert_history`.
+
+    Each pass makes sure partitions exist `months_ahead` into the future,
+    moves inactive alerts in bounded DELETE ... RETURNING + INSERT batches,
+    and enforces retention by dropping whole partitions.
+    """
+
+    def __init__(self, interval: float, batch_size: int, months_ahead: int, retention_months: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.months_ahead = months_ahead
+        self.retention_months = retention_months
+        self._task: asyncio.Task | None = None
+
+        self.moved = 0
+        self.dropped_partitions = 0
+
+    async def maintain_partitions(self, session: AsyncSession) -> None:
+        if not await try_lock(session, PARTITION_MAINTENANCE_LOCK):
+            return
+
+        current = datetime.now(UTC).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        for offset in range(self.months_ahead + 1):
+            month = add_months(current, offset)
+            await create_partition(session, "alert_history", partition_name(month), month, add_months(month, 1))
+
+        cutoff = add_months(current, -self.retention_months)
+        for name in await drop_partitions_before(session, "alert_history", cutoff):
+            self.dropped_partitions += 1
+            logger.info("Dropped alert_history partition %s", name)
+
+    async def move_batch(self, session: AsyncSession) -> int:
+        result = await session.execute(MOVE_BATCH_SQL, {"batch_size": self.batch_size})
+        return result.rowcount
+
+    async def run_once(self) -> None:
+        async with async_session() as session:
+            await self.maintain_partitions(session)
+            await session.commit()
+
+        while True:
+            async with async_session() as session:
+                moved = await self.move_batch(session)
+                await session.commit()
+            self.moved += moved
+            if moved < self.batch_size:
+                return
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Alert archiving failed")
+            await asyncio.sleep(self.interval)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+alert_archiver = AlertArchiver(
+    settings.ALERT_ARCHIVE_INTERVAL,
+    settings.ALERT_ARCHIVE_BATCH,
+    settings.ALERT_HISTORY_MONTHS_AHEAD,
+    settings.ALERT_HISTORY_RETENTION_MONTHS,
+)
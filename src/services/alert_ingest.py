@@ -0,0 +1,183 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Iterable, Sequence
+
+from sqlalchemy import func, literal_column
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import settings
+from src.database import UPSERT_CHUNK_SIZE, async_session
+from src.models.agent_models import AlertItem
+from src.models.db_models import Alert, Server
+from src.services.fleet_snapshot import fleet_snapshot
+from src.utils.metrics import registry
+from src.utils.session_notes import add_notes
+
+
+def normalize_alert_text(alert_text: str) -> str:
+    return " ".join(alert_text.split()).lower()
+
+
+def alert_fingerprint(severity: str, source: str | None, alert_text: str) -> str:
+    """Same formula as the backfill in migration 7c1e9a2d4b30."""
+    raw = f"{severity}|{source or ''}|{normalize_alert_text(alert_text)}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+# (session, rows) -> закоммичена ли транзакция
+CommitHook = Callable[[AsyncSession, list[dict]], Awaitable[bool]]
+
+
+def record_alert_changes(
+    session: AsyncSession,
+    opened: Iterable[tuple[int, str, str]] = (),
+    closed: Iterable[tuple[int, str, str]] = (),
+) -> None:
+    """Notes (server_id, severity, fingerprint) of alerts activated or resolved in the session's
+    transaction; after-commit listeners (see region_rollup) consume them, a rollback (also of the
+    enclosing savepoint) discards them."""
+    add_notes(session, "alerts_opened", opened)
+    add_notes(session, "alerts_closed", closed)
+
+
+class AlertIngestor:
+    """Deduplicates agent alerts and upserts them into `alerts`.
+
+    Every alert is keyed by (server_id, fingerprint). Matching active rows get
+    their `counter` and `timestamp` bumped instead of a new row being inserted.
+    Fingerprints whose counter was already written recently are skipped
+    without touching the database.
+    """
+
+    def __init__(self, cache_size: int, cache_ttl: float):
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        # (server_id, fingerprint) -> (counter, monotonic time of the write)
+        self._recent: OrderedDict[tuple[int, str], tuple[int, float]] = OrderedDict()
+        self._known_servers: set[int] = set()
+
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def prepare(self, server_id: int, items: Iterable[AlertItem]) -> list[dict]:
+        """Turns alert items into rows, dropping in-request duplicates and unchanged alerts."""
+        rows: dict[str, dict] = {}
+        for item in items:
+            fp = alert_fingerprint(item.severity, item.source, item.alert)
+            row = rows.get(fp)
+            if row is not None and row["counter"] >= item.counter:
+                continue
+            rows[fp] = {
+                "server_id": server_id,
+                "severity": item.severity,
+                "source": item.source,
+                "alert_text": item.alert,
+                "fingerprint": fp,
+                "counter": item.counter,
+                "stacktrace": item.stackTrace,
+            }
+
+        now = time.monotonic()
+        changed = []
+        for fp, row in rows.items():
+            cached = self._recent.get((server_id, fp))
+            if cached is not None and cached[0] == row["counter"] and now - cached[1] < self.cache_ttl:
+                self.cache_hits += 1
+                continue
+            self.cache_misses += 1
+            changed.append(row)
+        return changed
+
+    async def write(self, session: AsyncSession, rows: Sequence[dict]) -> None:
+        """One upsert statement for all rows (chunked only for huge batches). The caller commits."""
+        if not rows:
+            return
+        # ON CONFLICT не может обновить одну строку дважды — схлопываем дубли между серверами/запросами
+        merged: dict[tuple[int, str], dict] = {}
+        for row in rows:
+            key = (row["server_id"], row["fingerprint"])
+            if key not in merged or merged[key]["counter"] < row["counter"]:
+                merged[key] = row
+        rows = list(merged.values())
+
+        await self._ensure_servers(session, {row["server_id"] for row in rows})
+        for i in range(0, len(rows), UPSERT_CHUNK_SIZE):
+            stmt = insert(Alert).values(rows[i:i + UPSERT_CHUNK_SIZE])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Alert.server_id, Alert.fingerprint],
+                index_where=Alert.active,
+                set_={
+                    "counter": func.greatest(Alert.counter, stmt.excluded.counter),
+                    "timestamp": func.now(),
+                    "stacktrace": func.coalesce(stmt.excluded.stacktrace, Alert.stacktrace),
+                },
+            )
+            # xmax = 0 только у вставленных строк: так отличаем новый алерт от обновления счётчика
+            stmt = stmt.returning(Alert.server_id, Alert.severity, Alert.fingerprint, literal_column("xmax = 0"))
+            result = await session.execute(stmt)
+            record_alert_changes(session, opened=[row[:3] for row in result if row[3]])
+
+    def remember(self, rows: Iterable[dict]) -> None:
+        """Called after a successful commit."""
+        rows = list(rows)
+        fleet_snapshot.apply_alerts(rows)
+        now = time.monotonic()
+        for row in rows:
+            self._known_servers.add(row["server_id"])
+            key = (row["server_id"], row["fingerprint"])
+            self._recent[key] = (row["counter"], now)
+            self._recent.move_to_end(key)
+        while len(self._recent) > self.cache_size:
+            self._recent.popitem(last=False)
+
+    def forget(self, keys: Iterable[tuple[int, str]]) -> None:
+        """Drops cached (server_id, fingerprint) pairs, e.g. after those alerts were resolved."""
+        for key in keys:
+            self._recent.pop(key, None)
+
+    def forget_server(self, server_id: int) -> None:
+        """Drops cached fingerprints of a server, e.g. after its alerts were resolved."""
+        for key in [k for k in self._recent if k[0] == server_id]:
+            del self._recent[key]
+
+    async def ingest(self, server_id: int, items: Iterable[AlertItem], commit: CommitHook | None = None) -> int:
+        """prepare + write + commit + remember. `commit(session, rows)` replaces the plain commit
+        (e.g. to store an idempotency key with it) and returns whether the transaction was committed."""
+        rows = self.prepare(server_id, items)
+        if not rows:
+            return 0
+        async with async_session() as session:
+            await self.write(session, rows)
+            if commit is None:
+                await session.commit()
+            elif not await commit(session, rows):
+                return 0
+        self.remember(rows)
+        return len(rows)
+
+    async def _ensure_servers(self, session: AsyncSession, server_ids: set[int]) -> None:
+        # Статус может ещё лежать в write-behind буфере, а FK на servers нужен уже сейчас
+        unknown = server_ids - self._known_servers
+        if not unknown:
+            return
+        stmt = insert(Server).values([{"id": sid} for sid in unknown]).on_conflict_do_nothing()
+        await session.execute(stmt)
+
+    def stats(self) -> dict:
+        return {
+            "cached_fingerprints": len(self._recent),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+        }
+
+
+alert_ingestor = AlertIngestor(settings.ALERT_CACHE_SIZE, settings.ALERT_CACHE_TTL)
+
+registry.callback_counter(
+    "alert_fingerprint_cache_hits_total", "Alerts skipped as unchanged", lambda: alert_ingestor.cache_hits
+)
+registry.callback_counter(
+    "alert_fingerprint_cache_misses_total", "Alerts sent to the upsert", lambda: alert_ingestor.cache_misses
+)
@@ -0,0 +1,238 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+from collections import deque
+from datetime import UTC, datetime
+
+from sqlalchemy import insert
+
+from src.config import settings
+from src.database import async_session
+from src.models.db_models import AuditLog
+from src.utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("block", "drop_oldest", "spill")
+
+
+class AuditSink:
+    """Buffers audit records in memory and writes them with multi-row INSERTs on a timer.
+
+    When the queue is full, `overflow_policy` decides: `block` makes the caller
+    wait for room, `drop_oldest` discards the oldest record, `spill` appends the
+    new one to a local JSON-lines file. The file is rotated aside and loaded
+    back in portions that fit into the queue, reading from a byte offset.
+    """
+
+    def __init__(self, max_size: int, flush_interval: float, batch_size: int, overflow_policy: str, spill_path: str):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown audit overflow policy: {overflow_policy}")
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.overflow_policy = overflow_policy
+        self.spill_path = spill_path
+        self._queue: deque[dict] = deque()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self._flush_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        # сколько байт файла .draining уже перенесено в очередь
+        self._spill_offset = 0
+        # дозапись в файл и его переименование не должны пересекаться
+        self._spill_lock = asyncio.Lock()
+        self._spill_pending: list[dict] = []
+
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.unspilled = 0
+        self.flush_errors = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    async def record(
+        self,
+        action: str,
+        *,
+        user_id: int | None = None,
+        actor_type: str = "admin",
+        payload: dict | None = None,
+        remote_addr: str | None = None,
+    ) -> None:
+        entry = {
+            "user_id": user_id,
+            "actor_type": actor_type,
+            "action": action,
+            "payload": payload,
+            "remote_addr": remote_addr,
+            "created_at": datetime.now(UTC),
+        }
+        self.recorded += 1
+
+        if len(self._queue) >= self.max_size:
+            if self.overflow_policy == "block":
+                while len(self._queue) >= self.max_size:
+                    self._not_full.clear()
+                    await self._not_full.wait()
+            elif self.overflow_policy == "drop_oldest":
+                self._queue.popleft()
+                self.dropped += 1
+            else:
+                await self._spill([entry])
+                return
+        self._queue.append(entry)
+
+    def _write_spill(self, entries: list[dict]) -> None:
+        """Appends records to the spill file. Runs in a thread."""
+        with open(self.spill_path, "a", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(dict(entry, created_at=entry["created_at"].isoformat())) + "\n")
+
+    async def _spill(self, entries: list[dict]) -> None:
+        """Appends records to the spill file off the event loop; returns once they are written."""
+        self._spill_pending.extend(entries)
+        async with self._spill_lock:
+            # записи, накопленные пока файл был занят, пишет одним вызовом первый получивший блокировку
+            if not self._spill_pending:
+                return
+            batch, self._spill_pending = self._spill_pending, []
+            try:
+                await asyncio.to_thread(self._write_spill, batch)
+            except Exception:
+                self.dropped += len(batch)
+                raise
+            self.spilled += len(batch)
+
+    @property
+    def _draining_path(self) -> str:
+        return self.spill_path + ".draining"
+
+    def _read_draining(self, limit: int) -> list[dict]:
+        """Next `limit` records of the draining file from `_spill_offset`; removes the file once read. Runs in a thread."""
+        entries = []
+        with open(self._draining_path, "rb") as f:
+            f.seek(self._spill_offset)
+            while len(entries) < limit:
+                line = f.readline()
+                if not line:
+                    break
+                self._spill_offset += len(line)
+                if line.strip():
+                    entries.append(json.loads(line))
+            exhausted = not f.read(1)
+        if exhausted:
+            os.remove(self._draining_path)
+            self._spill_offset = 0
+        return entries
+
+    def _compact_draining(self) -> None:
+        """Drops the already loaded prefix of the draining file, so a restart does not load it again."""
+        if not self._spill_offset or not os.path.exists(self._draining_path):
+            return
+        tmp_path = self._draining_path + ".tmp"
+        with open(self._draining_path, "rb") as src, open(tmp_path, "wb") as dst:
+            src.seek(self._spill_offset)
+            shutil.copyfileobj(src, dst)
+        os.replace(tmp_path, self._draining_path)
+        self._spill_offset = 0
+
+    async def _load_spilled(self) -> None:
+        """Moves spilled records back into the queue, as many as it has room for."""
+        room = self.max_size - len(self._queue)
+        if room <= 0:
+            return
+        if not os.path.exists(self._draining_path):
+            async with self._spill_lock:
+                if not os.path.exists(self.spill_path):
+                    return
+                # дозапись сейчас не идёт, новые записи уйдут в новый файл
+                os.replace(self.spill_path, self._draining_path)
+                self._spill_offset = 0
+        entries = await asyncio.to_thread(self._read_draining, room)
+        for entry in entries:
+            entry["created_at"] = datetime.fromisoformat(entry["created_at"])
+            self._queue.append(entry)
+        self.unspilled += len(entries)
+
+    async def flush(self) -> int:
+        written = 0
+        async with self._flush_lock:
+            while self._queue:
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                self._not_full.set()
+                try:
+                    async with async_session() as session:
+                        await session.execute(insert(AuditLog), batch)
+                        await session.commit()
+                except Exception:
+                    self.flush_errors += 1
+                    self._queue.extendleft(reversed(batch))
+                    raise
+                written += len(batch)
+                self.written += len(batch)
+        return written
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                if self.overflow_policy == "spill":
+                    await self._load_spilled()
+                await self.flush()
+            except Exception:
+                logger.exception("Audit flush failed, %d records pending", self.queue_depth)
+
+    async def start(self) -> None:
+        if self._task is None:
+            if self.overflow_policy == "spill":
+                await self._load_spilled()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Final audit flush failed")
+            if self.overflow_policy == "spill":
+                entries = list(self._queue)
+                self._queue.clear()
+                await self._spill(entries)
+        if self.overflow_policy == "spill":
+            await asyncio.to_thread(self._compact_draining)
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue_depth,
+            "recorded": self.recorded,
+            "written": self.written,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+            "unspilled": self.unspilled,
+            "flush_errors": self.flush_errors,
+        }
+
+
+audit_sink = AuditSink(
+    settings.AUDIT_QUEUE_SIZE,
+    settings.AUDIT_FLUSH_INTERVAL,
+    settings.AUDIT_BATCH_SIZE,
+    settings.AUDIT_OVERFLOW_POLICY,
+    settings.AUDIT_SPILL_PATH,
+)
+
+registry.callback_gauge("audit_queue_depth", "Audit records waiting to be written", lambda: audit_sink.queue_depth)
+registry.callback_counter("audit_dropped_total", "Audit records dropped on overflow", lambda: audit_sink.dropped)
@@ -0,0 +1,58 @@
+from typing import Any, Sequence
+
+from pydantic import TypeAdapter, ValidationError
+
+from src.database import async_session
+from src.security.agent_key import AgentIdentity, ensure_server
+from src.models.agent_models import (
+    AgentBatchResponse,
+    AgentStatusRequest,
+    AlertsEnvelope,
+    BatchEnvelope,
+    BatchItemResult,
+    StatusEnvelope,
+)
+from src.services.alert_ingest import alert_ingestor
+from src.services.heartbeat import heartbeat_tracker
+from src.services.status_writer import latest_per_server, persist_statuses, statuses_committed
+
+_envelope_adapter = TypeAdapter(BatchEnvelope)
+
+
+async def ingest_batch(items: Sequence[Any], agent: AgentIdentity) -> AgentBatchResponse:
+    """Validates mixed status/alerts envelopes in one pass and writes them in one transaction.
+
+    Every item must be for a server the agent key may post for, otherwise the whole batch is refused (403).
+    """
+    results: list[BatchItemResult] = []
+    statuses: list[AgentStatusRequest] = []
+    alert_rows: list[dict] = []
+
+    for index, raw in enumerate(items):
+        try:
+            envelope = _envelope_adapter.validate_python(raw)
+        except ValidationError as exc:
+            errors = exc.errors(include_url=False, include_context=False, include_input=False)
+            results.append(BatchItemResult(index=index, status="error", detail=errors))
+            continue
+        ensure_server(agent, envelope.data.server_id)
+        if isinstance(envelope, StatusEnvelope):
+            statuses.append(envelope.data)
+        elif isinstance(envelope, AlertsEnvelope):
+            alert_rows.extend(alert_ingestor.prepare(envelope.data.server_id, envelope.data.alerts))
+        results.append(BatchItemResult(index=index, status="ok"))
+
+    statuses = latest_per_server(statuses)
+    if statuses or alert_rows:
+        rule_alerts = []
+        async with async_session() as session:
+            if statuses:
+                rule_alerts = await persist_statuses(session, statuses)
+            await alert_ingestor.write(session, alert_rows)
+            await session.commit()
+        statuses_committed(statuses, rule_alerts)
+        heartbeat_tracker.touch_many(status.server_id for status in statuses)
+        alert_ingestor.remember(alert_rows)
+
+    accepted = sum(1 for result in results if result.status == "ok")
+    return AgentBatchResponse(accepted=accepted, rejected=len(results) - accepted, results=results)
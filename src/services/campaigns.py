@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import uuid
+from collections import Counter
+from typing import Iterable
+
+from sqlalchemy import bindparam, event, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.database import async_session
+from src.models.db_models import CommandCampaign
+from src.services.partitions import try_lock
+from src.utils.session_notes import add_notes, pop_notes
+
+logger = logging.getLogger(__name__)
+
+# произвольная константа для pg_try_advisory_xact_lock: пересчёт делает один воркер
+CAMPAIGN_RECOUNT_LOCK = 4_810_935
+
+# Канал, по которому пересчёт велит всем воркерам сбросить незаписанные дельты
+CAMPAIGNS_CHANNEL = "command_campaigns"
+
+STATUS_COLUMNS = ("pending", "sent", "done", "failed")
+
+# пересчитываются незавершённые и несогласованные рассылки, а также недавно изменённые:
+# в них могли попасть дельты, уже учтённые прошлым пересчётом. updated_at меняется
+# только при расхождении, так что согласованная рассылка выпадает из выборки.
+# Индекс idx_commands_correlation_status
+RECOUNT_SQL = text(
+    """
+    UPDATE command_campaigns c SET
+        total = q.total, pending = q.pending, sent = q.sent, done = q.done, failed = q.failed,
+        updated_at = now()
+    FROM (
+        SELECT correlation_id,
+               count(*) AS total,
+               count(*) FILTER (WHERE status = 'pending') AS pending,
+               count(*) FILTER (WHERE status = 'sent') AS sent,
+               count(*) FILTER (WHERE status = 'done') AS done,
+               count(*) FILTER (WHERE status = 'failed') AS failed
+        FROM command_queue
+        WHERE correlation_id IN (
+            SELECT correlation_id FROM command_campaigns
+            WHERE pending + sent <> 0
+               OR pending < 0 OR sent < 0 OR done < 0 OR failed < 0
+               OR done + failed <> total
+               OR updated_at > now() - make_interval(secs => :recent_seconds)
+        )
+        GROUP BY correlation_id
+    ) q
+    WHERE c.correlation_id = q.correlation_id
+      AND (c.total, c.pending, c.sent, c.done, c.failed) IS DISTINCT FROM (q.total, q.pending, q.sent, q.done, q.failed)
+    """
+)
+
+NOTIFY_SQL = text("SELECT pg_notify(:channel, '')")
+
+
+def record_command_transitions(session: AsyncSession, transitions: Iterable[tuple[uuid.UUID | None, str, str]]) -> None:
+    """Notes (correlation_id, old status, new status) of commands changed in the session's transaction;
+    applied to the campaign counters after the commit. Commands without a correlation_id are skipped."""
+    transitions = [row for row in transitions if row[0] is not None and row[1] != row[2]]
+    if transitions:
+        add_notes(session, "command_transitions", transitions)
+
+
+class CampaignProgress:
+    """Per-correlation_id pending/sent/done/failed counters in `command_campaigns`.
+
+    The fan-out creates the row; claims, results and the lease sweeper note
+    status transitions (`record_command_transitions`), which become counter
+    deltas here after the commit. Deltas are added to the table every
+    `flush_interval` seconds in one statement, so thousands of agents
+    reporting at once do not queue up on the campaign's row lock. Reading the
+    progress is a primary key lookup. Unfinished, inconsistent and recently
+    changed campaigns are recounted from `command_queue` every
+    `recount_interval` seconds (one worker, advisory lock) to correct drift,
+    e.g. deltas lost with a crashed worker. The recount NOTIFYs every worker to
+    drop its unflushed deltas, which the recount has already counted.
+    """
+
+    def __init__(self, flush_interval: float, recount_interval: float):
+        self.flush_interval = flush_interval
+        self.recount_interval = recount_interval
+        # correlation_id -> ещё не записанные в таблицу дельты этого воркера
+        self._pending: dict[uuid.UUID, Counter] = {}
+        self._task: asyncio.Task | None = None
+
+        self.transitions = 0
+        self.flushes = 0
+        self.recounts = 0
+
+    def apply(self, transitions: Iterable[tuple[uuid.UUID, str, str]]) -> None:
+        for correlation_id, old, new in transitions:
+            delta = self._pending.setdefault(correlation_id, Counter())
+            delta[old] -= 1
+            delta[new] += 1
+            self.transitions += 1
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        rows = [
+            {"cid": correlation_id, **{f"d_{column}": delta[column] for column in STATUS_COLUMNS}}
+            for correlation_id, delta in pending.items()
+            if any(delta.values())
+        ]
+        table = CommandCampaign.__table__
+        stmt = (
+            update(table)
+            .where(table.c.correlation_id == bindparam("cid"))
+            .values(
+                **{column: table.c[column] + bindparam(f"d_{column}") for column in STATUS_COLUMNS},
+                updated_at=text("now()"),
+            )
+        )
+        try:
+            if rows:
+                async with async_session() as session:
+                    # executemany одного UPDATE по первичному ключу
+                    connection = await session.connection()
+                    await connection.execute(stmt, rows)
+                    await session.commit()
+        except Exception:
+            for correlation_id, delta in pending.items():
+                self._pending.setdefault(correlation_id, Counter()).update(delta)
+            raise
+        self.flushes += 1
+
+    async def recount(self) -> bool:
+        async with async_session() as session:
+            if not await try_lock(session, CAMPAIGN_RECOUNT_LOCK):
+                return False
+            # уже закоммиченные переходы пересчёт увидит сам; другие воркеры сбросят
+            # свои дельты по NOTIFY, а попавшие в таблицу до него исправит следующий пересчёт
+            self._pending = {}
+            await session.execute(RECOUNT_SQL, {"recent_seconds": 2 * self.recount_interval})
+            await session.execute(NOTIFY_SQL, {"channel": CAMPAIGNS_CHANNEL})
+            await session.commit()
+        self.recounts += 1
+        return True
+
+    def on_notify(self, conn, pid, channel, payload: str) -> None:
+        self._pending = {}
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_recount = loop.time()
+        while True:
+            try:
+                # при старте пересчёт обязателен: дельты упавшего воркера в таблицу не попали
+                if loop.time() >= next_recount:
+                    await self.recount()
+                    next_recount = loop.time() + self.recount_interval
+                await self.flush()
+            except Exception:
+                logger.exception("Campaign progress flush failed")
+            await asyncio.sleep(self.flush_interval)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Final campaign progress flush failed")
+
+    def stats(self) -> dict:
+        return {
+            "pending_campaigns": len(self._pending),
+            "transitions": self.transitions,
+            "flushes": self.flushes,
+            "recounts": self.recounts,
+        }
+
+
+campaign_progress = CampaignProgress(settings.CAMPAIGN_FLUSH_INTERVAL, settings.CAMPAIGN_RECOUNT_INTERVAL)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_command_transitions(session: Session) -> None:
+    transitions = pop_notes(session, "command_transitions")
+    if transitions:
+        campaign_progress.apply(transitions)
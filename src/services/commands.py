@@ -0,0 +1,278 @@
+import asyncio
+import logging
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Iterator
+
+from sqlalchemy import BigInteger, any_, bindparam, case, cast, func, insert, literal, null, or_, select, update
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import settings
+from src.database import async_session
+from src.models.admin_models import CommandFanoutRequest
+from src.models.agent_models import Command, CommandResultRequest
+from src.models.db_models import (
+    CommandCampaign,
+    CommandQueue,
+    CommandResult,
+    CommandStatusEnum,
+    CommandTypeEnum,
+    Server,
+)
+from src.security.agent_key import AgentIdentity
+from src.services.campaigns import record_command_transitions
+from src.services.events import emit
+from src.utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Канал, в который триггер command_queue шлёт server_id через запятую (см. миграцию f1b6c8a3e527)
+COMMANDS_CHANNEL = "command_queue"
+
+
+async def fan_out_commands(session: AsyncSession, req: CommandFanoutRequest) -> tuple[uuid.UUID, int]:
+    """Queues one command per target server with a single INSERT ... SELECT under a shared correlation_id
+    and creates its progress counters (command_campaigns).
+
+    Unknown server ids are skipped. Returns (correlation_id, commands queued). The caller commits.
+    """
+    correlation_id = uuid.uuid4()
+    targets = select(
+        Server.id,
+        literal(req.type, CommandTypeEnum),
+        literal(req.payload, JSONB) if req.payload is not None else null(),
+        literal(correlation_id, UUID(as_uuid=True)),
+        func.now() + timedelta(seconds=req.ttl_seconds) if req.ttl_seconds else null(),
+    )
+    if req.region_id is not None:
+        targets = targets.where(Server.region_id == req.region_id)
+    elif req.server_ids is not None:
+        # один параметр-массив вместо тысяч параметров IN (...)
+        targets = targets.where(Server.id == any_(bindparam("server_ids", req.server_ids, type_=ARRAY(BigInteger))))
+    result = await session.execute(
+        insert(CommandQueue).from_select(
+            ["server_id", "type", "payload", "correlation_id", "ttl_until"],
+            targets,
+        )
+    )
+    queued = result.rowcount
+    await session.execute(
+        insert(CommandCampaign).values(correlation_id=correlation_id, type=req.type, total=queued, pending=queued)
+    )
+    return correlation_id, queued
+
+
+async def claim_commands(session: AsyncSession, server_id: int, limit: int) -> list[Command]:
+    """Atomically moves up to `limit` pending commands of a server to `sent`.
+
+    Rows locked by a concurrent claim are skipped (FOR UPDATE SKIP LOCKED), so
+    any number of workers can serve the same queue without handing out a
+    command twice. The caller commits.
+    """
+    claimable = (
+        select(CommandQueue.id)
+        .where(
+            CommandQueue.server_id == server_id,
+            CommandQueue.status == "pending",
+            or_(CommandQueue.ttl_until.is_(None), CommandQueue.ttl_until > func.now()),
+        )
+        .order_by(CommandQueue.created_at, CommandQueue.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .cte("claimable")
+    )
+    result = await session.execute(
+        update(CommandQueue)
+        .where(CommandQueue.id.in_(select(claimable.c.id)))
+        .values(
+            status="sent",
+            attempts=CommandQueue.attempts + 1,
+            lease_until=func.now() + timedelta(seconds=settings.COMMAND_LEASE_SECONDS),
+        )
+        .returning(
+            CommandQueue.id,
+            CommandQueue.type,
+            CommandQueue.payload,
+            CommandQueue.created_at,
+            CommandQueue.correlation_id,
+        )
+    )
+    rows = sorted(result, key=lambda row: (row.created_at, row.id))
+    record_command_transitions(session, ((row.correlation_id, "pending", "sent") for row in rows))
+    return [Command(command_id=row.id, type=row.type, payload=row.payload) for row in rows]
+
+
+async def complete_command(
+    session: AsyncSession, command_id: int, req: CommandResultRequest, agent: AgentIdentity
+) -> bool:
+    """Stores the agent's result and closes the command.
+
+    Returns False for unknown commands and for commands of servers the agent key does not act for.
+    """
+    # блокировка строки: статус не должен смениться (sweeper) между чтением и обновлением
+    command = (
+        await session.execute(
+            select(CommandQueue.server_id, CommandQueue.status, CommandQueue.correlation_id)
+            .where(CommandQueue.id == command_id)
+            .with_for_update()
+        )
+    ).first()
+    if command is None or not agent.may_act_for(command.server_id):
+        return False
+    # Результат, пришедший после истечения lease, всё равно закрывает команду
+    if command.status in ("pending", "sent"):
+        status = "done" if req.status == "success" else "failed"
+        await session.execute(
+            update(CommandQueue)
+            .where(CommandQueue.id == command_id)
+            .values(status=status, executed_at=func.now(), lease_until=None)
+        )
+        record_command_transitions(session, [(command.correlation_id, command.status, status)])
+    session.add(CommandResult(command_id=command_id, status=req.status, message=req.message))
+    emit(
+        session,
+        [{"type": "command.result", "command_id": command_id, "server_id": command.server_id, "status": req.status}],
+    )
+    return True
+
+
+async def sweep_commands(session: AsyncSession, batch_size: int) -> tuple[int, int]:
+    """Fails commands past `ttl_until` and releases expired leases.
+
+    A command whose lease expired goes back to `pending`, or to `failed` once
+    it has used up COMMAND_MAX_ATTEMPTS. Returns (expired, released) row counts.
+    """
+    expired_ids = (
+        select(CommandQueue.id, CommandQueue.status)
+        .where(CommandQueue.status.in_(("pending", "sent")), CommandQueue.ttl_until < func.now())
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .cte("expired")
+    )
+    # статус из CTE — прежний, до UPDATE: он нужен счётчикам рассылок
+    expired = (
+        await session.execute(
+            update(CommandQueue)
+            .where(CommandQueue.id == expired_ids.c.id)
+            .values(status="failed", lease_until=None)
+            .returning(CommandQueue.correlation_id, expired_ids.c.status)
+        )
+    ).all()
+    record_command_transitions(session, ((row.correlation_id, row.status, "failed") for row in expired))
+
+    leased_ids = (
+        select(CommandQueue.id)
+        .where(CommandQueue.status == "sent", CommandQueue.lease_until < func.now())
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .cte("lease_expired")
+    )
+    released = (
+        await session.execute(
+            update(CommandQueue)
+            .where(CommandQueue.id.in_(select(leased_ids.c.id)))
+            .values(
+                status=case(
+                    (CommandQueue.attempts >= settings.COMMAND_MAX_ATTEMPTS, cast("failed", CommandStatusEnum)),
+                    else_=cast("pending", CommandStatusEnum),
+                ),
+                lease_until=None,
+            )
+            .returning(CommandQueue.correlation_id, CommandQueue.status)
+        )
+    ).all()
+    record_command_transitions(session, ((row.correlation_id, "sent", row.status) for row in released))
+    return len(expired), len(released)
+
+
+class CommandLeaseSweeper:
+    """Background task that periodically runs `sweep_commands` until a pass finds nothing."""
+
+    def __init__(self, interval: float, batch_size: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: asyncio.Task | None = None
+
+        self.expired = 0
+        self.released = 0
+
+    async def sweep(self) -> None:
+        while True:
+            async with async_session() as session:
+                expired, released = await sweep_commands(session, self.batch_size)
+                await session.commit()
+            self.expired += expired
+            self.released += released
+            if expired < self.batch_size and released < self.batch_size:
+                return
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Command lease sweep failed")
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class CommandWaiters:
+    """Long-poll requests waiting for new commands, woken by NOTIFY on COMMANDS_CHANNEL."""
+
+    def __init__(self):
+        self._waiters: dict[int, set[asyncio.Event]] = {}
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(events) for events in self._waiters.values())
+
+    @contextmanager
+    def watch(self, server_id: int) -> Iterator[asyncio.Event]:
+        """Register before loading commands, so a NOTIFY in between is not lost."""
+        event = asyncio.Event()
+        self._waiters.setdefault(server_id, set()).add(event)
+        try:
+            yield event
+        finally:
+            events = self._waiters.get(server_id)
+            if events is not None:
+                events.discard(event)
+                if not events:
+                    del self._waiters[server_id]
+
+    def on_notify(self, conn, pid, channel, payload: str) -> None:
+        if not self._waiters:
+            return
+        try:
+            server_ids = [int(server_id) for server_id in payload.split(",")]
+        except ValueError:
+            return
+        for server_id in server_ids:
+            for event in self._waiters.get(server_id, ()):
+                event.set()
+
+    def wake_all(self) -> None:
+        # после переподключения LISTEN уведомления могли потеряться
+        for events in self._waiters.values():
+            for event in events:
+                event.set()
+
+
+command_waiters = CommandWaiters()
+command_sweeper = CommandLeaseSweeper(settings.COMMAND_SWEEP_INTERVAL, settings.COMMAND_SWEEP_BATCH)
+
+registry.callback_gauge("command_long_polls_waiting", "GET /agent/commands long-polls in progress", lambda: command_waiters.waiting)
@@ -0,0 +1,212 @@
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.services.fleet_snapshot import fleet_snapshot
+from src.utils.session_notes import add_notes, get_notes, pop_notes
+
+logger = logging.getLogger(__name__)
+
+# Канал NOTIFY для событий админского потока (GET /admin/events)
+EVENTS_CHANNEL = "monitoring_events"
+# лимит payload у NOTIFY — 8000 байт; события пакуются в JSON-массивы до этого размера
+MAX_PAYLOAD_BYTES = 7500
+# поля, которые остаются у события, не влезающего в payload (подписчик перечитает остальное)
+KEY_FIELDS = ("type", "server_id", "command_id", "severity", "fingerprint", "status")
+
+NOTIFY_SQL = text("SELECT pg_notify(:channel, :payload)")
+
+
+def emit(session, events: Iterable[dict]) -> None:
+    """Queues events on the session; they are NOTIFYed in the same transaction right before commit."""
+    add_notes(session, "events", events)
+
+
+def _alert_events(kind: str, rows) -> list[dict]:
+    return [
+        {"type": kind, "server_id": server_id, "severity": severity, "fingerprint": fingerprint}
+        for server_id, severity, fingerprint in rows
+    ]
+
+
+def _encode(item: dict) -> str | None:
+    """Compact JSON of an event; an oversized one keeps only KEY_FIELDS plus "truncated", or is dropped."""
+    encoded = json.dumps(item, separators=(",", ":"), default=str)
+    if len(encoded) + 2 <= MAX_PAYLOAD_BYTES:
+        return encoded
+    short = {name: item[name] for name in KEY_FIELDS if name in item}
+    short["truncated"] = True
+    encoded = json.dumps(short, separators=(",", ":"), default=str)
+    if len(encoded) + 2 <= MAX_PAYLOAD_BYTES:
+        return encoded
+    logger.warning("Dropped oversized %s event", item.get("type"))
+    return None
+
+
+def _payloads(events: list[dict]) -> list[str]:
+    """JSON arrays of events, each within MAX_PAYLOAD_BYTES, so pg_notify never fails the transaction."""
+    payloads = []
+    chunk: list[str] = []
+    size = 2
+    for item in events:
+        encoded = _encode(item)
+        if encoded is None:
+            continue
+        if chunk and size + len(encoded) + 1 > MAX_PAYLOAD_BYTES:
+            payloads.append("[" + ",".join(chunk) + "]")
+            chunk, size = [], 2
+        chunk.append(encoded)
+        size += len(encoded) + 1
+    if chunk:
+        payloads.append("[" + ",".join(chunk) + "]")
+    return payloads
+
+
+@event.listens_for(Session, "before_commit")
+def _publish(session: Session) -> None:
+    events = pop_notes(session, "events")
+    # изменения алертов отмечает record_alert_changes (alert_ingest); их же после коммита забирает region_rollup
+    events += _alert_events("alert.opened", get_notes(session, "alerts_opened"))
+    events += _alert_events("alert.resolved", get_notes(session, "alerts_closed"))
+    for payload in _payloads(events):
+        session.execute(NOTIFY_SQL, {"channel": EVENTS_CHANNEL, "payload": payload})
+
+
+def coalesce_key(item: dict):
+    """Events with the same key replace each other in a slow subscriber's buffer."""
+    kind = item["type"]
+    if kind == "server.status":
+        return kind, item["server_id"]
+    if kind.startswith("alert."):
+        return "alert", item["server_id"], item["fingerprint"]
+    if kind == "command.result":
+        return kind, item["command_id"]
+    return None
+
+
+@dataclass
+class EventFilter:
+    region_ids: set[int] = field(default_factory=set)
+    severities: set[str] = field(default_factory=set)
+    server_ids: set[int] = field(default_factory=set)
+
+    def matches(self, item: dict, region_id: int | None) -> bool:
+        if self.server_ids and item.get("server_id") not in self.server_ids:
+            return False
+        if self.region_ids and region_id not in self.region_ids:
+            return False
+        # фильтр по важности касается только алертов
+        if self.severities and "severity" in item and item["severity"] not in self.severities:
+            return False
+        return True
+
+
+class Subscriber:
+    """Bounded per-client buffer: newer events replace queued ones with the same key,
+    and when it is full the oldest event is dropped."""
+
+    def __init__(self, event_filter: EventFilter, max_size: int):
+        self.filter = event_filter
+        self.max_size = max_size
+        # key -> (event type, JSON)
+        self._buffer: OrderedDict = OrderedDict()
+        self._seq = 0
+        self._wakeup = asyncio.Event()
+        self.dropped = 0
+        self.merged = 0
+
+    def offer(self, key, kind: str, data: str) -> None:
+        if key is None:
+            self._seq += 1
+            key = ("seq", self._seq)
+        elif key in self._buffer:
+            self.merged += 1
+            # объединённое событие встаёт в конец: порядок важнее позиции старой версии
+            del self._buffer[key]
+        self._buffer[key] = (kind, data)
+        while len(self._buffer) > self.max_size:
+            self._buffer.popitem(last=False)
+            self.dropped += 1
+        self._wakeup.set()
+
+    async def next_batch(self) -> list[tuple[str, str]]:
+        """Waits for events and takes everything buffered."""
+        while not self._buffer:
+            self._wakeup.clear()
+            await self._wakeup.wait()
+        batch = list(self._buffer.values())
+        self._buffer.clear()
+        return batch
+
+
+class EventHub:
+    """Fans NOTIFY events from the worker's shared LISTEN connection out to SSE subscribers.
+
+    Each event is parsed and serialized once per worker, whatever the number
+    of subscribers; per subscriber there is only the filter check and a
+    buffer insert. The database sees one LISTEN per worker.
+    """
+
+    def __init__(self, buffer_size: int):
+        self.buffer_size = buffer_size
+        self._subscribers: set[Subscriber] = set()
+        self.received = 0
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    @contextmanager
+    def subscribe(self, event_filter: EventFilter):
+        subscriber = Subscriber(event_filter, self.buffer_size)
+        self._subscribers.add(subscriber)
+        try:
+            yield subscriber
+        finally:
+            self._subscribers.discard(subscriber)
+
+    def publish_local(self, item: dict) -> None:
+        """Delivers an event to this worker's subscribers only (no NOTIFY)."""
+        server_id = item.get("server_id")
+        entry = fleet_snapshot.get(server_id) if server_id is not None else None
+        region_id = entry["region_id"] if entry else None
+        data = json.dumps(item, separators=(",", ":"), default=str)
+        key = coalesce_key(item)
+        for subscriber in self._subscribers:
+            if subscriber.filter.matches(item, region_id):
+                subscriber.offer(key, item["type"], data)
+
+    def on_notify(self, conn, pid, channel, payload) -> None:
+        if not self._subscribers:
+            return
+        try:
+            items = json.loads(payload)
+        except ValueError:
+            logger.warning("Malformed %s payload dropped", channel)
+            return
+        self.received += len(items)
+        for item in items:
+            self.publish_local(item)
+
+    def resync(self) -> None:
+        """pg_listener reconnect hook: events may have been lost, clients should reload."""
+        for subscriber in self._subscribers:
+            subscriber.offer(("resync",), "resync", "{}")
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": self.subscribers,
+            "received": self.received,
+            "dropped": sum(subscriber.dropped for subscriber in self._subscribers),
+        }
+
+
+event_hub = EventHub(settings.EVENT_BUFFER_SIZE)
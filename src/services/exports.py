@@ -0,0 +1,109 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator
+
+from sqlalchemy import Select, or_, select
+
+from src.config import settings
+from src.database import async_session
+from src.models.db_models import AlertHistory, AuditLog
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+ALERT_HISTORY_COLUMNS = [
+    AlertHistory.id,
+    AlertHistory.server_id,
+    AlertHistory.severity,
+    AlertHistory.source,
+    AlertHistory.alert_text,
+    AlertHistory.counter,
+    AlertHistory.stacktrace,
+    AlertHistory.timestamp,
+    AlertHistory.archived_at,
+]
+AUDIT_LOG_COLUMNS = [
+    AuditLog.id,
+    AuditLog.user_id,
+    AuditLog.actor_type,
+    AuditLog.action,
+    AuditLog.payload,
+    AuditLog.remote_addr,
+    AuditLog.created_at,
+]
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=_json_default)
+    return value
+
+
+def alert_history_query(server_id: int | None, start: datetime | None, end: datetime | None) -> Select:
+    # фильтр по archived_at отсекает лишние партиции
+    query = select(*ALERT_HISTORY_COLUMNS).order_by(AlertHistory.archived_at, AlertHistory.id)
+    if server_id is not None:
+        query = query.where(AlertHistory.server_id == server_id)
+    if start is not None:
+        query = query.where(AlertHistory.archived_at >= start)
+    if end is not None:
+        query = query.where(AlertHistory.archived_at < end)
+    return query
+
+
+def audit_log_query(
+    server_id: int | None, action: str | None, start: datetime | None, end: datetime | None
+) -> Select:
+    query = select(*AUDIT_LOG_COLUMNS).order_by(AuditLog.created_at, AuditLog.id)
+    if server_id is not None:
+        # действия над одним сервером пишут server_id, рассылки по списку серверов — server_ids;
+        # рассылки на регион или весь парк к серверу не привязаны
+        query = query.where(
+            or_(
+                AuditLog.payload["server_id"].astext == str(server_id),
+                AuditLog.payload["server_ids"].contains([server_id]),
+            )
+        )
+    if action is not None:
+        query = query.where(AuditLog.action == action)
+    if start is not None:
+        query = query.where(AuditLog.created_at >= start)
+    if end is not None:
+        query = query.where(AuditLog.created_at < end)
+    return query
+
+
+async def stream_export(query: Select, fmt: str) -> AsyncIterator[bytes]:
+    """Streams query results through a server-side cursor, EXPORT_FETCH_SIZE rows per chunk.
+
+    The generator is only advanced when the previous chunk has been sent, so
+    a slow client pauses the fetching and memory stays flat.
+    """
+    columns = [column.name for column in query.selected_columns]
+    async with async_session() as session:
+        result = await session.stream(query.execution_options(yield_per=settings.EXPORT_FETCH_SIZE))
+
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            yield buffer.getvalue().encode()
+            async for rows in result.partitions():
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows([_csv_value(value) for value in row] for row in rows)
+                yield buffer.getvalue().encode()
+        else:
+            async for rows in result.partitions():
+                yield "".join(
+                    json.dumps(dict(zip(columns, row)), default=_json_default) + "\n" for row in rows
+                ).encode()
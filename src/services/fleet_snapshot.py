@@ -0,0 +1,155 @@
+import asyncio
+import hashlib
+import logging
+from datetime import UTC
+from typing import Iterable
+
+from pydantic import TypeAdapter
+from sqlalchemy import and_, exists, select
+
+from src.config import settings
+from src.database import async_session
+from src.models.agent_models import AgentStatusRequest
+from src.models.db_models import Alert, Region, Server
+
+logger = logging.getLogger(__name__)
+
+# записи снапшота уже имеют форму admin_models.Server, валидировать их повторно незачем
+_servers_adapter = TypeAdapter(list[dict])
+
+
+def _aware(ts):
+    return ts if ts is None or ts.tzinfo is not None else ts.replace(tzinfo=UTC)
+
+
+class FleetSnapshot:
+    """In-memory copy of the GET /admin/servers listing.
+
+    Status and alert ingestion apply their changes incrementally; a periodic
+    reconcile against the database picks up writes made by other workers and
+    anything the deltas cannot see (region changes, resolved alerts). The
+    serialized body and its ETag are cached per version, so unchanged polls
+    cost neither a query nor serialization.
+    """
+
+    def __init__(self, reconcile_interval: float):
+        self.reconcile_interval = reconcile_interval
+        self._servers: dict[int, dict] = {}
+        self.version = 0
+        self._rendered_version = -1
+        self._body = b"[]"
+        self._etag = ""
+        self._loaded = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def _entry(self, server_id: int) -> dict:
+        entry = self._servers.get(server_id)
+        if entry is None:
+            entry = {
+                "id": server_id,
+                "region_id": None,
+                "region_name": None,
+                "ip": None,
+                "cgm_version": None,
+                "admin_version": None,
+                "last_update": None,
+                "has_critical_alerts": False,
+            }
+            self._servers[server_id] = entry
+            self.version += 1
+        return entry
+
+    def apply_statuses(self, statuses: Iterable[AgentStatusRequest]) -> None:
+        for status in statuses:
+            entry = self._entry(status.server_id)
+            last_update = _aware(status.timestamp)
+            if entry["last_update"] is not None and entry["last_update"] >= last_update:
+                continue
+            entry.update(
+                ip=status.ip,
+                cgm_version=status.cgm_version,
+                admin_version=status.admin_version,
+                last_update=last_update,
+            )
+            self.version += 1
+
+    def apply_alerts(self, rows: Iterable[dict]) -> None:
+        for row in rows:
+            entry = self._entry(row["server_id"])
+            if row["severity"] == "Critical" and not entry["has_critical_alerts"]:
+                entry["has_critical_alerts"] = True
+                self.version += 1
+
+    def apply_critical(self, flags: dict[int, bool]) -> None:
+        """Sets has_critical_alerts from a fresh check, e.g. after alerts were resolved."""
+        for server_id, has_critical in flags.items():
+            entry = self._entry(server_id)
+            if entry["has_critical_alerts"] != has_critical:
+                entry["has_critical_alerts"] = has_critical
+                self.version += 1
+
+    def get(self, server_id: int) -> dict | None:
+        return self._servers.get(server_id)
+
+    async def reconcile(self) -> None:
+        has_critical = exists().where(
+            and_(Alert.server_id == Server.id, Alert.active, Alert.severity == "Critical")
+        )
+        query = (
+            select(
+                Server.id,
+                Server.region_id,
+                Region.name.label("region_name"),
+                Server.ip,
+                Server.cgm_version,
+                Server.admin_version,
+                Server.last_update,
+                has_critical.label("has_critical_alerts"),
+            )
+            .outerjoin(Region, Region.id == Server.region_id)
+            .order_by(Server.id)
+        )
+        async with async_session() as session:
+            servers = {row.id: dict(row._mapping) for row in await session.execute(query)}
+
+        if servers != self._servers:
+            self._servers = servers
+            self.version += 1
+        self._loaded.set()
+
+    def render(self) -> tuple[bytes, str]:
+        """(JSON body, ETag) of the current version. The ETag is a content hash, so it matches across workers."""
+        if self._rendered_version != self.version:
+            servers = [self._servers[sid] for sid in sorted(self._servers)]
+            self._body = _servers_adapter.dump_json(servers)
+            self._etag = '"%s"' % hashlib.blake2b(self._body, digest_size=16).hexdigest()
+            self._rendered_version = self.version
+        return self._body, self._etag
+
+    async def ready(self) -> None:
+        if not self._loaded.is_set():
+            await self.reconcile()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.reconcile()
+            except Exception:
+                logger.exception("Fleet snapshot reconcile failed")
+            await asyncio.sleep(self.reconcile_interval)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+fleet_snapshot = FleetSnapshot(settings.FLEET_RECONCILE_INTERVAL)
@@ -0,0 +1,301 @@
+import asyncio
+import logging
+import math
+import time
+from datetime import datetime, timedelta
+from typing import Hashable, Iterable
+
+from sqlalchemy import and_, exists, func, select, update
+
+from src.config import settings
+from src.database import async_session
+from src.models.db_models import Alert, Server
+from src.services.alert_ingest import alert_fingerprint, alert_ingestor, record_alert_changes
+from src.services.fleet_snapshot import fleet_snapshot
+from src.utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+OFFLINE_SEVERITY = "Critical"
+OFFLINE_SOURCE = "heartbeat"
+# текст без чисел: отпечаток не должен зависеть от настроек
+OFFLINE_TEXT = "Server offline: heartbeat missed"
+OFFLINE_FINGERPRINT = alert_fingerprint(OFFLINE_SEVERITY, OFFLINE_SOURCE, OFFLINE_TEXT)
+
+
+class TimerWheel:
+    """Hashed timing wheel: schedule and cancel are O(1), a tick costs only what expires.
+
+    The wheel spans at least `horizon` seconds, so every deadline lands within
+    one rotation and a slot never holds entries for later rounds.
+    """
+
+    def __init__(self, tick: float, horizon: float):
+        self.tick = tick
+        self._slots: list[dict[Hashable, int]] = [{} for _ in range(math.ceil(horizon / tick) + 2)]
+        self._where: dict[Hashable, int] = {}
+        self._origin = time.monotonic()
+        self._current = 0
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._where
+
+    def schedule(self, key: Hashable, deadline: float) -> None:
+        """(Re)arms `key` to expire at monotonic time `deadline`."""
+        tick = max(math.ceil((deadline - self._origin) / self.tick), self._current + 1)
+        tick = min(tick, self._current + len(self._slots) - 1)
+        slot = tick % len(self._slots)
+        previous = self._where.get(key)
+        if previous is not None and previous != slot:
+            del self._slots[previous][key]
+        self._slots[slot][key] = tick
+        self._where[key] = slot
+
+    def cancel(self, key: Hashable) -> None:
+        slot = self._where.pop(key, None)
+        if slot is not None:
+            del self._slots[slot][key]
+
+    def advance(self, now: float) -> list[Hashable]:
+        """Moves the wheel to `now` and returns the keys whose deadline passed."""
+        target = math.floor((now - self._origin) / self.tick)
+        expired = []
+        while self._current < target:
+            self._current += 1
+            slot = self._slots[self._current % len(self._slots)]
+            if slot:
+                expired.extend(slot)
+                for key in slot:
+                    del self._where[key]
+                slot.clear()
+        return expired
+
+
+class HeartbeatTracker:
+    """Detects servers that stopped sending /agent/status.
+
+    Every heartbeat re-arms the server's timer in a `TimerWheel`; nothing is
+    scanned while servers keep reporting. When a timer fires, the expired
+    servers are checked against `servers.last_update` in one query (the
+    heartbeat may have reached another worker), and the ones that really went
+    silent get a Critical alert. The next heartbeat resolves it. Silence is
+    measured on `servers.last_seen` against the database clock, never on the
+    timestamps agents send.
+    """
+
+    def __init__(self, interval: float, missed_intervals: float, tick: float):
+        self.timeout = interval * missed_intervals
+        self.tick = tick
+        self._wheel = TimerWheel(tick, self.timeout)
+        # серверы с активным алертом недоступности
+        self._offline: set[int] = set()
+        self._recovered: set[int] = set()
+        self._task: asyncio.Task | None = None
+
+        self.expirations = 0
+        self.rearmed = 0
+        self.offline_raised = 0
+        self.recoveries = 0
+
+    @property
+    def tracked(self) -> int:
+        return len(self._wheel)
+
+    @property
+    def offline(self) -> int:
+        return len(self._offline)
+
+    def touch(self, server_id: int) -> None:
+        """Called for every accepted heartbeat."""
+        self._wheel.schedule(server_id, time.monotonic() + self.timeout)
+        if server_id in self._offline:
+            self._offline.discard(server_id)
+            self._recovered.add(server_id)
+
+    def touch_many(self, server_ids: Iterable[int]) -> None:
+        for server_id in server_ids:
+            self.touch(server_id)
+
+    def _arm_from(self, server_id: int, last_seen: datetime, db_now: datetime) -> None:
+        remaining = (last_seen + timedelta(seconds=self.timeout) - db_now).total_seconds()
+        self._wheel.schedule(server_id, time.monotonic() + remaining)
+
+    async def load(self) -> None:
+        """Arms a timer for every known server, so servers silent since the restart are detected too."""
+        async with async_session() as session:
+            db_now = await session.scalar(select(func.now()))
+            servers = await session.execute(
+                select(Server.id, Server.last_seen).where(Server.last_seen.is_not(None))
+            )
+            offline = await session.scalars(
+                select(Alert.server_id).where(Alert.active, Alert.fingerprint == OFFLINE_FINGERPRINT)
+            )
+            self._offline = set(offline)
+            for server_id, last_seen in servers:
+                if server_id not in self._offline and server_id not in self._wheel:
+                    self._arm_from(server_id, last_seen, db_now)
+
+    async def check_expired(self, server_ids: list[int]) -> None:
+        async with async_session() as session:
+            # часы БД, а не воркера: last_seen ставит now() при записи статуса
+            db_now = await session.scalar(select(func.now()))
+            cutoff = db_now - timedelta(seconds=self.timeout)
+            rows = await session.execute(select(Server.id, Server.last_seen).where(Server.id.in_(server_ids)))
+            silent = []
+            for server_id, last_seen in rows:
+                if server_id in self._wheel or server_id in self._offline:
+                    # heartbeat пришёл, пока шёл запрос
+                    continue
+                if last_seen is not None and last_seen > cutoff:
+                    # heartbeat получил другой воркер
+                    self.rearmed += 1
+                    self._arm_from(server_id, last_seen, db_now)
+                else:
+                    silent.append(server_id)
+
+            rows = [
+                {
+                    "server_id": server_id,
+                    "severity": OFFLINE_SEVERITY,
+                    "source": OFFLINE_SOURCE,
+                    "alert_text": OFFLINE_TEXT,
+                    "fingerprint": OFFLINE_FINGERPRINT,
+                    "counter": 1,
+                    "stacktrace": None,
+                }
+                for server_id in silent
+            ]
+            await alert_ingestor.write(session, rows)
+            await session.commit()
+        alert_ingestor.remember(rows)
+        self._offline.update(silent)
+        self.offline_raised += len(silent)
+        if silent:
+            logger.warning("%d servers went offline", len(silent))
+
+    async def resolve(self, server_ids: list[int]) -> None:
+        """Deactivates the offline alerts of servers that reported again."""
+        critical = exists().where(and_(Alert.server_id == Server.id, Alert.active, Alert.severity == "Critical"))
+        async with async_session() as session:
+            closed = await session.execute(
+                update(Alert)
+                .where(Alert.server_id.in_(server_ids), Alert.active, Alert.fingerprint == OFFLINE_FINGERPRINT)
+                .values(active=False)
+                .returning(Alert.server_id, Alert.severity, Alert.fingerprint)
+            )
+            record_alert_changes(session, closed=closed.all())
+            flags = dict(
+                (await session.execute(select(Server.id, critical).where(Server.id.in_(server_ids)))).all()
+            )
+            await session.commit()
+        fleet_snapshot.apply_critical(flags)
+        self.recoveries += len(server_ids)
+
+    async def resolve_elsewhere(self) -> None:
+        """Resolves offline alerts of servers that reported to another worker or before a restart."""
+        async with async_session() as session:
+            resolved = await session.execute(
+                update(Alert)
+                .where(
+                    Alert.active,
+                    Alert.fingerprint == OFFLINE_FINGERPRINT,
+                    Alert.server_id == Server.id,
+                    # оба времени — часы БД
+                    Server.last_seen > Alert.timestamp,
+                )
+                .values(active=False)
+                .returning(Alert.server_id, Alert.severity, Alert.fingerprint)
+            )
+            resolved = resolved.all()
+            record_alert_changes(session, closed=resolved)
+            active = set(
+                await session.scalars(
+                    select(Alert.server_id).where(Alert.active, Alert.fingerprint == OFFLINE_FINGERPRINT)
+                )
+            )
+            await session.commit()
+        self.recoveries += len(resolved)
+
+        # алерты, снятые здесь или другим воркером, снова ставим на таймер
+        now = time.monotonic()
+        for server_id in self._offline - active:
+            self._offline.discard(server_id)
+            if server_id not in self._wheel:
+                self._wheel.schedule(server_id, now + self.timeout)
+        # has_critical_alerts подхватит очередной reconcile снапшота
+
+    async def run_once(self) -> None:
+        expired = self._wheel.advance(time.monotonic())
+        if expired:
+            self.expirations += len(expired)
+            try:
+                await self.check_expired(expired)
+            except Exception:
+                # проверим снова на следующем тике
+                now = time.monotonic()
+                for server_id in expired:
+                    if server_id not in self._wheel:
+                        self._wheel.schedule(server_id, now)
+                raise
+
+        if self._recovered:
+            recovered, self._recovered = list(self._recovered), set()
+            try:
+                await self.resolve(recovered)
+            except Exception:
+                self._recovered.update(recovered)
+                raise
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.load()
+                break
+            except Exception:
+                logger.exception("Heartbeat tracker failed to load servers")
+                await asyncio.sleep(settings.FLEET_RECONCILE_INTERVAL)
+
+        next_sweep = time.monotonic() + settings.FLEET_RECONCILE_INTERVAL
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                await self.run_once()
+                if time.monotonic() >= next_sweep:
+                    next_sweep = time.monotonic() + settings.FLEET_RECONCILE_INTERVAL
+                    await self.resolve_elsewhere()
+            except Exception:
+                logger.exception("Heartbeat check failed")
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "tracked": self.tracked,
+            "offline": self.offline,
+            "expirations": self.expirations,
+            "rearmed": self.rearmed,
+            "offline_raised": self.offline_raised,
+            "recoveries": self.recoveries,
+        }
+
+
+heartbeat_tracker = HeartbeatTracker(
+    settings.AGENT_HEARTBEAT_INTERVAL, settings.HEARTBEAT_MISSED_INTERVALS, settings.HEARTBEAT_TICK
+)
+
+registry.callback_gauge("heartbeat_tracked_servers", "Servers with an armed heartbeat timer", lambda: heartbeat_tracker.tracked)
+registry.callback_gauge("servers_offline", "Servers with an active offline alert", lambda: heartbeat_tracker.offline)
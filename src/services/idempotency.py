@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Awaitable, Callable
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import settings
+from src.database import async_session
+from src.models.db_models import IdempotencyKey
+from src.utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# (server_id, scope, key)
+RequestKey = tuple[int, str, str]
+
+
+class IdempotencyStore:
+    """Answers retried agent writes with the response of the first attempt.
+
+    Responses are kept in a bounded in-memory window, so a retry that reaches
+    the same worker is answered without touching the database; a retry of a
+    request still in progress waits for it. Writes that go to the database
+    also store their key in `idempotency_keys` in the same transaction: a
+    retry that reaches another worker conflicts on it, rolls its own
+    transaction back and returns the stored response.
+    """
+
+    def __init__(self, window_size: int, ttl: float, purge_interval: float):
+        self.window_size = window_size
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        # key -> (response, monotonic time it expires)
+        self._window: OrderedDict[RequestKey, tuple[dict, float]] = OrderedDict()
+        self._inflight: dict[RequestKey, asyncio.Future] = {}
+        self._task: asyncio.Task | None = None
+
+        self.replays = 0
+        self.db_replays = 0
+        self.purged = 0
+
+    @staticmethod
+    def key(server_id: int, scope: str, key: str | None) -> RequestKey | None:
+        return None if key is None else (server_id, scope, key)
+
+    def get(self, key: RequestKey) -> dict | None:
+        entry = self._window.get(key)
+        if entry is None:
+            return None
+        response, expires = entry
+        if expires < time.monotonic():
+            del self._window[key]
+            return None
+        return response
+
+    def remember(self, key: RequestKey, response: dict) -> None:
+        self._window[key] = (response, time.monotonic() + self.ttl)
+        self._window.move_to_end(key)
+        while len(self._window) > self.window_size:
+            self._window.popitem(last=False)
+
+    async def run(self, key: RequestKey | None, handler: Callable[[], Awaitable[dict]]) -> dict:
+        """Runs `handler` once per key; replays get the remembered response."""
+        if key is None:
+            return await handler()
+        while True:
+            response = self.get(key)
+            if response is not None:
+                self.replays += 1
+                return response
+            pending = self._inflight.get(key)
+            if pending is None:
+                break
+            # первая попытка ещё выполняется; если она упадёт, повтор выполнится сам
+            await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            response = await handler()
+            self.remember(key, response)
+            return response
+        finally:
+            del self._inflight[key]
+            future.set_result(None)
+
+    async def commit(self, session: AsyncSession, key: RequestKey | None, response: dict) -> tuple[dict, bool]:
+        """Commits the caller's transaction together with the key.
+
+        If the key is already stored (the first attempt went through another
+        worker), rolls the transaction back instead. Returns (response for the
+        client, whether this transaction was committed).
+        """
+        if key is None:
+            await session.commit()
+            return response, True
+        server_id, scope, request_key = key
+        stored = await session.scalar(
+            insert(IdempotencyKey)
+            .values(server_id=server_id, scope=scope, key=request_key, response=response)
+            .on_conflict_do_nothing()
+            .returning(IdempotencyKey.server_id)
+        )
+        if stored is not None:
+            await session.commit()
+            return response, True
+
+        # конкурирующая вставка ждёт коммита первой попытки, так что её ответ уже виден
+        await session.rollback()
+        self.db_replays += 1
+        previous = await session.scalar(
+            select(IdempotencyKey.response).where(
+                IdempotencyKey.server_id == server_id,
+                IdempotencyKey.scope == scope,
+                IdempotencyKey.key == request_key,
+            )
+        )
+        # строку успели удалить по TTL — повтор пришёл слишком поздно, отвечаем своим ответом без записи
+        return (previous if previous is not None else response), False
+
+    async def purge(self) -> int:
+        async with async_session() as session:
+            result = await session.execute(
+                delete(IdempotencyKey).where(IdempotencyKey.created_at < func.now() - timedelta(seconds=self.ttl))
+            )
+            await session.commit()
+        self.purged += result.rowcount
+        return result.rowcount
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.purge_interval)
+            try:
+                await self.purge()
+            except Exception:
+                logger.exception("Idempotency key purge failed")
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "window": len(self._window),
+            "in_flight": len(self._inflight),
+            "replays": self.replays,
+            "db_replays": self.db_replays,
+            "purged": self.purged,
+        }
+
+
+idempotency_store = IdempotencyStore(
+    settings.IDEMPOTENCY_WINDOW_SIZE, settings.IDEMPOTENCY_TTL, settings.IDEMPOTENCY_PURGE_INTERVAL
+)
+
+registry.callback_counter(
+    "agent_idempotent_replays_total", "Agent retries answered from the in-memory window", lambda: idempotency_store.replays
+)
+registry.callback_counter(
+    "agent_idempotent_db_replays_total",
+    "Agent retries rolled back on a key stored by another worker",
+    lambda: idempotency_store.db_replays,
+)
@@ -0,0 +1,177 @@
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import and_, exists, or_, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models.db_models import Alert, CommandQueue, CommandResult, Region, Server
+
+# Поля, доступные через ?fields=; тяжёлые (last_status) отдаются только по запросу
+SERVER_FIELDS = {
+    "id": Server.id,
+    "region_id": Server.region_id,
+    "region_name": Region.name,
+    "ip": Server.ip,
+    "cgm_version": Server.cgm_version,
+    "admin_version": Server.admin_version,
+    "last_update": Server.last_update,
+    "has_critical_alerts": exists().where(
+        and_(Alert.server_id == Server.id, Alert.active, Alert.severity == "Critical")
+    ),
+    "last_status": Server.last_status,
+}
+DEFAULT_SERVER_FIELDS = [name for name in SERVER_FIELDS if name != "last_status"]
+
+ALERT_FIELDS = {
+    "id": Alert.id,
+    "server_id": Alert.server_id,
+    "severity": Alert.severity,
+    "source": Alert.source,
+    "alert_text": Alert.alert_text,
+    "counter": Alert.counter,
+    "stacktrace": Alert.stacktrace,
+    "timestamp": Alert.timestamp,
+    "active": Alert.active,
+    "created_at": Alert.created_at,
+}
+DEFAULT_ALERT_FIELDS = list(ALERT_FIELDS)
+
+
+def encode_cursor(ts: datetime | None, row_id: int) -> str:
+    raw = json.dumps([ts.isoformat() if ts is not None else None, row_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime | None, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        ts, row_id = json.loads(raw)
+        return (datetime.fromisoformat(ts) if ts is not None else None), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def parse_fields(fields: str | None, allowed: dict, default: list[str]) -> list[str]:
+    if not fields:
+        return default
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return names
+
+
+async def list_servers(
+    session: AsyncSession,
+    *,
+    limit: int,
+    cursor: str | None = None,
+    region_id: int | None = None,
+    since: datetime | None = None,
+    fields: str | None = None,
+) -> dict:
+    """Keyset page over (last_update, id), stalest first; never-reported servers come last."""
+    names = parse_fields(fields, SERVER_FIELDS, DEFAULT_SERVER_FIELDS)
+    query = select(
+        *(SERVER_FIELDS[name].label(name) for name in names),
+        Server.id.label("_id"),
+        Server.last_update.label("_ts"),
+    )
+    if "region_name" in names:
+        query = query.outerjoin(Region, Region.id == Server.region_id)
+    if region_id is not None:
+        query = query.where(Server.region_id == region_id)
+    if since is not None:
+        query = query.where(Server.last_update >= since)
+    if cursor is not None:
+        ts, last_id = decode_cursor(cursor)
+        if ts is None:
+            query = query.where(Server.last_update.is_(None), Server.id > last_id)
+        else:
+            query = query.where(
+                or_(
+                    Server.last_update > ts,
+                    and_(Server.last_update == ts, Server.id > last_id),
+                    Server.last_update.is_(None),
+                )
+            )
+    query = query.order_by(Server.last_update.asc().nulls_last(), Server.id).limit(limit + 1)
+
+    rows = (await session.execute(query)).all()
+    next_cursor = encode_cursor(rows[limit - 1]._ts, rows[limit - 1]._id) if len(rows) > limit else None
+    return {
+        "servers": [{name: getattr(row, name) for name in names} for row in rows[:limit]],
+        "next_cursor": next_cursor,
+    }
+
+
+async def list_alerts(
+    session: AsyncSession,
+    *,
+    limit: int,
+    cursor: str | None = None,
+    server_id: int | None = None,
+    region_id: int | None = None,
+    severity: str | None = None,
+    active: bool | None = None,
+    since: datetime | None = None,
+    fields: str | None = None,
+) -> dict:
+    """Keyset page over (timestamp, id), newest first."""
+    names = parse_fields(fields, ALERT_FIELDS, DEFAULT_ALERT_FIELDS)
+    query = select(
+        *(ALERT_FIELDS[name].label(name) for name in names),
+        Alert.id.label("_id"),
+        Alert.timestamp.label("_ts"),
+    )
+    if server_id is not None:
+        query = query.where(Alert.server_id == server_id)
+    if region_id is not None:
+        query = query.where(Alert.server_id.in_(select(Server.id).where(Server.region_id == region_id)))
+    if severity is not None:
+        query = query.where(Alert.severity == severity)
+    if active is not None:
+        query = query.where(Alert.active == active)
+    if since is not None:
+        query = query.where(Alert.timestamp >= since)
+    if cursor is not None:
+        ts, last_id = decode_cursor(cursor)
+        if ts is None:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.where(tuple_(Alert.timestamp, Alert.id) < tuple_(ts, last_id))
+    query = query.order_by(Alert.timestamp.desc(), Alert.id.desc()).limit(limit + 1)
+
+    rows = (await session.execute(query)).all()
+    next_cursor = encode_cursor(rows[limit - 1]._ts, rows[limit - 1]._id) if len(rows) > limit else None
+    return {
+        "alerts": [{name: getattr(row, name) for name in names} for row in rows[:limit]],
+        "next_cursor": next_cursor,
+    }
+
+
+async def list_command_failures(session: AsyncSession, correlation_id, *, limit: int, cursor: str | None = None) -> dict:
+    """Keyset page over id of a campaign's failed commands (idx_commands_correlation_status)."""
+    last_message = (
+        select(CommandResult.message)
+        .where(CommandResult.command_id == CommandQueue.id)
+        .order_by(CommandResult.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    query = select(
+        CommandQueue.id.label("command_id"),
+        CommandQueue.server_id,
+        CommandQueue.attempts,
+        CommandQueue.executed_at,
+        last_message.label("message"),
+    ).where(CommandQueue.correlation_id == correlation_id, CommandQueue.status == "failed")
+    if cursor is not None:
+        _, last_id = decode_cursor(cursor)
+        query = query.where(CommandQueue.id > last_id)
+    query = query.order_by(CommandQueue.id).limit(limit + 1)
+
+    rows = (await session.execute(query)).all()
+    next_cursor = encode_cursor(None, rows[limit - 1].command_id) if len(rows) > limit else None
+    return {"failures": [row._asdict() for row in rows[:limit]], "next_cursor": next_cursor}
@@ -0,0 +1,48 @@
+import re
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# FOR VALUES FROM ('2026-10-01 00:00:00+00') TO ('2026-11-01 00:00:00+00')
+_BOUND_RE = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+async def try_lock(session: AsyncSession, key: int) -> bool:
+    """Transaction-level advisory lock, so only one worker does the maintenance."""
+    return bool(await session.scalar(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": key}))
+
+
+async def create_partition(session: AsyncSession, parent: str, name: str, start: datetime, end: datetime) -> None:
+    await session.execute(
+        text(
+            f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF {parent} '
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+    )
+
+
+async def drop_partitions_before(session: AsyncSession, parent: str, cutoff: datetime) -> list[str]:
+    """Drops range partitions of `parent` whose upper bound is <= cutoff. Returns their names."""
+    result = await session.execute(
+        text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = CAST(:parent AS regclass)"
+        ),
+        {"parent": parent},
+    )
+    dropped = []
+    for name, bound in result.all():
+        match = _BOUND_RE.search(bound or "")
+        if match is None:
+            continue
+        if datetime.fromisoformat(match[2]) <= cutoff:
+            await session.execute(text(f'DROP TABLE "{name}"'))
+            dropped.append(name)
+    return dropped
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+from typing import Callable
+
+import asyncpg
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+# (connection, pid, channel, payload) -> None, как в asyncpg.Connection.add_listener
+NotifyCallback = Callable[[asyncpg.Connection, int, str, str], None]
+
+
+class PgListener:
+    """A single LISTEN connection per worker, fanned out to in-process subscribers.
+
+    The connection is supervised: when it drops, it is re-established with
+    backoff and every `on_reconnect` hook is called, because notifications
+    sent while disconnected are lost.
+    """
+
+    def __init__(self, dsn: str, reconnect_delay: float = 1.0, max_reconnect_delay: float = 30.0):
+        self.dsn = dsn
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self._callbacks: dict[str, list[NotifyCallback]] = {}
+        self._reconnect_hooks: list[Callable[[], None]] = []
+        self._conn: asyncpg.Connection | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def connected(self) -> bool:
+        return self._conn is not None and not self._conn.is_closed()
+
+    def subscribe(self, channel: str, callback: NotifyCallback) -> None:
+        """Must be called before `start()`; channels are LISTENed on (re)connect."""
+        self._callbacks.setdefault(channel, []).append(callback)
+
+    def on_reconnect(self, hook: Callable[[], None]) -> None:
+        self._reconnect_hooks.append(hook)
+
+    def _dispatch(self, conn, pid, channel, payload) -> None:
+        for callback in self._callbacks.get(channel, ()):
+            try:
+                callback(conn, pid, channel, payload)
+            except Exception:
+                logger.exception("NOTIFY handler failed for channel %s", channel)
+
+    async def _run(self) -> None:
+        delay = self.reconnect_delay
+        first = True
+        while True:
+            closed = asyncio.Event()
+            try:
+                self._conn = await asyncpg.connect(self.dsn)
+                self._conn.add_termination_listener(lambda _conn: closed.set())
+                for channel in self._callbacks:
+                    await self._conn.add_listener(channel, self._dispatch)
+            except (OSError, asyncpg.PostgresError):
+                logger.warning("LISTEN connection failed, retrying in %.1fs", delay)
+                await self._close()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+                continue
+
+            delay = self.reconnect_delay
+            if not first:
+                for hook in self._reconnect_hooks:
+                    hook()
+            first = False
+            await closed.wait()
+            logger.warning("LISTEN connection lost")
+            self._conn = None
+
+    async def _close(self) -> None:
+        if self._conn is not None:
+            try:
+                await self._conn.close(timeout=5)
+            except Exception:
+                self._conn.terminate()
+            self._conn = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._close()
+
+
+pg_listener = PgListener(settings.DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://"))
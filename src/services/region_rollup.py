@@ -0,0 +1,299 @@
+import asyncio
+import hashlib
+import logging
+from collections import Counter
+
+from pydantic import TypeAdapter
+from sqlalchemy import event, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.database import async_session
+from src.models.db_models import Region, RegionSummary
+from src.services.fleet_snapshot import fleet_snapshot
+from src.services.heartbeat import OFFLINE_FINGERPRINT
+from src.services.partitions import try_lock
+from src.utils.session_notes import pop_notes
+
+logger = logging.getLogger(__name__)
+
+# произвольная константа для pg_try_advisory_xact_lock: полный пересчёт делает один воркер
+REGION_RECOMPUTE_LOCK = 4_810_934
+
+# Канал, по которому пересчёт велит всем воркерам сбросить незаписанные дельты
+REGIONS_CHANNEL = "region_summaries"
+NOTIFY_SQL = text("SELECT pg_notify(:channel, '')")
+
+SEVERITY_COLUMNS = {
+    "Normal": "alerts_normal",
+    "Minor": "alerts_minor",
+    "Major": "alerts_major",
+    "Critical": "alerts_critical",
+}
+COUNTER_COLUMNS = ("server_count", "online_count", *SEVERITY_COLUMNS.values())
+
+# онлайн — сервер уже присылал статус и у него нет активного алерта недоступности (см. heartbeat)
+RECOMPUTE_SQL = text(
+    """
+    WITH srv AS (
+        SELECT s.region_id,
+               count(*) AS server_count,
+               count(*) FILTER (
+                   WHERE s.last_update IS NOT NULL
+                     AND NOT EXISTS (
+                         SELECT 1 FROM alerts a
+                         WHERE a.server_id = s.id AND a.active AND a.fingerprint = :offline_fingerprint
+                     )
+               ) AS online_count
+        FROM servers s
+        WHERE s.region_id IS NOT NULL
+        GROUP BY s.region_id
+    ), alr AS (
+        SELECT s.region_id,
+               count(*) FILTER (WHERE a.severity = 'Normal') AS alerts_normal,
+               count(*) FILTER (WHERE a.severity = 'Minor') AS alerts_minor,
+               count(*) FILTER (WHERE a.severity = 'Major') AS alerts_major,
+               count(*) FILTER (WHERE a.severity = 'Critical') AS alerts_critical
+        FROM alerts a
+        JOIN servers s ON s.id = a.server_id
+        WHERE a.active AND s.region_id IS NOT NULL
+        GROUP BY s.region_id
+    )
+    INSERT INTO region_summaries (
+        region_id, server_count, online_count,
+        alerts_normal, alerts_minor, alerts_major, alerts_critical, updated_at
+    )
+    SELECT r.id,
+           coalesce(srv.server_count, 0), coalesce(srv.online_count, 0),
+           coalesce(alr.alerts_normal, 0), coalesce(alr.alerts_minor, 0),
+           coalesce(alr.alerts_major, 0), coalesce(alr.alerts_critical, 0),
+           now()
+    FROM regions r
+    LEFT JOIN srv ON srv.region_id = r.id
+    LEFT JOIN alr ON alr.region_id = r.id
+    ON CONFLICT (region_id) DO UPDATE SET
+        server_count = excluded.server_count,
+        online_count = excluded.online_count,
+        alerts_normal = excluded.alerts_normal,
+        alerts_minor = excluded.alerts_minor,
+        alerts_major = excluded.alerts_major,
+        alerts_critical = excluded.alerts_critical,
+        updated_at = excluded.updated_at
+    """
+)
+
+_summaries_adapter = TypeAdapter(list[dict])
+
+
+class RegionRollup:
+    """Per-region server, online and active-alert counters, kept in memory.
+
+    Alert ingestion, rules and heartbeat tracking note which alerts their
+    transactions opened or closed (`record_alert_changes`), the status upsert
+    notes servers reporting for the first time; after the commit those become
+    counter deltas here. Deltas are added to `region_summaries`
+    every `flush_interval` seconds with atomic increments, and the table is
+    re-read, so every worker converges on the sum of all workers' deltas. A
+    full GROUP BY recompute every `recompute_interval` seconds (one worker,
+    advisory lock) corrects drift and picks up region reassignments and
+    deleted servers; it NOTIFYs every worker to drop its unflushed deltas,
+    which the recompute has already counted.
+    """
+
+    def __init__(self, flush_interval: float, recompute_interval: float):
+        self.flush_interval = flush_interval
+        self.recompute_interval = recompute_interval
+        # region_id -> строка region_summaries (+ name) из последнего чтения таблицы
+        self._base: dict[int, dict] = {}
+        # region_id -> ещё не записанные в таблицу дельты этого воркера
+        self._pending: dict[int, Counter] = {}
+        # записанные в таблицу, но ещё не перечитанные дельты
+        self._flushed: dict[int, Counter] = {}
+        self.version = 0
+        self._rendered_version = -1
+        self._body = b"[]"
+        self._etag = ""
+        self._loaded = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+        self.deltas = 0
+        self.flushes = 0
+        self.recomputes = 0
+
+    def apply(self, opened, closed, first_seen=()) -> None:
+        """Counter deltas for committed alert changes and first heartbeats; servers without a region are ignored."""
+        for server_id in first_seen:
+            entry = fleet_snapshot.get(server_id)
+            region_id = entry and entry["region_id"]
+            if region_id is None:
+                continue
+            self._pending.setdefault(region_id, Counter())["online_count"] += 1
+            self.deltas += 1
+            self.version += 1
+        for rows, sign in ((opened, 1), (closed, -1)):
+            for server_id, severity, fingerprint in rows:
+                entry = fleet_snapshot.get(server_id)
+                region_id = entry and entry["region_id"]
+                if region_id is None:
+                    continue
+                delta = self._pending.setdefault(region_id, Counter())
+                delta[SEVERITY_COLUMNS[severity]] += sign
+                if fingerprint == OFFLINE_FINGERPRINT:
+                    delta["online_count"] -= sign
+                self.deltas += 1
+                self.version += 1
+
+    async def load(self) -> None:
+        query = (
+            select(Region.id, Region.name, *(getattr(RegionSummary, column) for column in COUNTER_COLUMNS))
+            .outerjoin(RegionSummary, RegionSummary.region_id == Region.id)
+            .order_by(Region.id)
+        )
+        flushed = self._flushed
+        async with async_session() as session:
+            rows = await session.execute(query)
+            base = {
+                row.id: {
+                    "region_id": row.id,
+                    "region_name": row.name,
+                    **{column: getattr(row, column) or 0 for column in COUNTER_COLUMNS},
+                }
+                for row in rows
+            }
+        if self._flushed is flushed:
+            self._flushed = {}
+        if base != self._base:
+            self._base = base
+            self.version += 1
+        self._loaded.set()
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        rows = [
+            {"region_id": region_id, **{column: delta[column] for column in COUNTER_COLUMNS}}
+            for region_id, delta in pending.items()
+            if any(delta.values())
+        ]
+        try:
+            if rows:
+                stmt = insert(RegionSummary).values(rows)
+                table = RegionSummary.__table__
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[RegionSummary.region_id],
+                    set_={
+                        **{column: table.c[column] + stmt.excluded[column] for column in COUNTER_COLUMNS},
+                        "updated_at": text("now()"),
+                    },
+                )
+                async with async_session() as session:
+                    await session.execute(stmt)
+                    await session.commit()
+        except Exception:
+            # дельты удалённых регионов (ошибка FK) не возвращаем, иначе flush будет падать всегда
+            for region_id, delta in pending.items():
+                if region_id in self._base:
+                    self._pending.setdefault(region_id, Counter()).update(delta)
+            raise
+        self._flushed = pending
+        self.flushes += 1
+
+    async def recompute(self) -> bool:
+        async with async_session() as session:
+            if not await try_lock(session, REGION_RECOMPUTE_LOCK):
+                return False
+            # уже закоммиченные изменения пересчёт увидит сам; другие воркеры сбросят
+            # свои дельты по NOTIFY, а попавшие в таблицу до него исправит следующий пересчёт
+            self._pending = {}
+            await session.execute(RECOMPUTE_SQL, {"offline_fingerprint": OFFLINE_FINGERPRINT})
+            await session.execute(NOTIFY_SQL, {"channel": REGIONS_CHANNEL})
+            await session.commit()
+        self.recomputes += 1
+        return True
+
+    def on_notify(self, conn, pid, channel, payload: str) -> None:
+        if self._pending:
+            self._pending = {}
+            self.version += 1
+
+    def summaries(self) -> list[dict]:
+        result = []
+        for region_id, base in self._base.items():
+            summary = dict(base)
+            for deltas in (self._flushed, self._pending):
+                delta = deltas.get(region_id)
+                if delta:
+                    for column in COUNTER_COLUMNS:
+                        summary[column] += delta[column]
+            result.append(summary)
+        return result
+
+    def render(self) -> tuple[bytes, str]:
+        """(JSON body, ETag) of the current counters, serialized once per change."""
+        if self._rendered_version != self.version:
+            self._body = _summaries_adapter.dump_json(self.summaries())
+            self._etag = '"%s"' % hashlib.blake2b(self._body, digest_size=16).hexdigest()
+            self._rendered_version = self.version
+        return self._body, self._etag
+
+    async def ready(self) -> None:
+        if not self._loaded.is_set():
+            await self.load()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_recompute = loop.time()
+        while True:
+            try:
+                # при старте пересчёт обязателен: дельты упавшего воркера в таблицу не попали
+                if loop.time() >= next_recompute:
+                    await self.recompute()
+                    next_recompute = loop.time() + self.recompute_interval
+                await self.flush()
+            except Exception:
+                logger.exception("Region rollup flush failed")
+            try:
+                await self.load()
+            except Exception:
+                logger.exception("Region rollup reload failed")
+            await asyncio.sleep(self.flush_interval)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Final region rollup flush failed")
+
+    def stats(self) -> dict:
+        return {
+            "regions": len(self._base),
+            "pending_regions": len(self._pending),
+            "deltas": self.deltas,
+            "flushes": self.flushes,
+            "recomputes": self.recomputes,
+        }
+
+
+region_rollup = RegionRollup(settings.REGION_SUMMARY_FLUSH_INTERVAL, settings.REGION_RECOMPUTE_INTERVAL)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_counter_changes(session: Session) -> None:
+    opened = pop_notes(session, "alerts_opened")
+    closed = pop_notes(session, "alerts_closed")
+    first_seen = pop_notes(session, "servers_first_seen")
+    if opened or closed or first_seen:
+        region_rollup.apply(opened, closed, first_seen)
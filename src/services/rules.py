@@ -0,0 +1,248 @@
+import json
+import logging
+import operator
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Callable, Sequence
+
+import numpy as np
+from pydantic import ValidationError
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import settings
+from src.models.agent_models import AgentStatusRequest, AlertItem
+from src.models.db_models import Alert
+from src.models.rule_models import RuleCondition, RuleSet, ThresholdRule
+from src.services.alert_ingest import alert_fingerprint, alert_ingestor, record_alert_changes
+
+logger = logging.getLogger(__name__)
+
+RULE_SOURCE = "rules"
+
+_COMPARE = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+_VERSION_RE = re.compile(r"\d+")
+
+
+def version_key(version: str | None) -> tuple[int, ...]:
+    """'4.10.2-rc1' -> (4, 10, 2, 1); numeric parts only, so 4.10 sorts after 4.9."""
+    return tuple(int(part) for part in _VERSION_RE.findall(version or ""))
+
+
+# Колонки пачки статусов: {"metric:cpu": float64[], "field:cgm_version": object[]}
+Columns = dict[str, np.ndarray]
+Predicate = Callable[[Columns], np.ndarray]
+
+
+def compile_condition(condition: RuleCondition) -> tuple[str, Predicate]:
+    """Column name the condition reads and a vectorized predicate over it."""
+    if condition.metric is not None:
+        column = f"metric:{condition.metric}"
+        compare = _COMPARE[condition.op]
+        threshold = condition.value
+
+        def numeric(columns: Columns) -> np.ndarray:
+            values = columns[column]
+            # метрики нет в heartbeat (NaN) — условие не выполнено, в том числе для "!="
+            return compare(values, threshold) & ~np.isnan(values)
+
+        return column, numeric
+
+    column = f"field:{condition.field}"
+    if condition.op in ("in", "not in"):
+        allowed = set(condition.value)
+        negate = condition.op == "not in"
+        test = lambda value: (value in allowed) != negate
+    elif condition.op.startswith("version"):
+        compare = _COMPARE[condition.op[len("version"):]]
+        reference = version_key(condition.value)
+        test = lambda value: compare(version_key(value), reference)
+    else:
+        compare = _COMPARE[condition.op]
+        reference = condition.value
+        test = lambda value: compare(value, reference)
+
+    def text(columns: Columns) -> np.ndarray:
+        # различных версий/адресов в пачке мало: условие считается по уникальным значениям
+        uniques, inverse = np.unique(columns[column], return_inverse=True)
+        # пустое поле (агент его не прислал) не выполняет ни одно условие
+        hits = np.fromiter((value != "" and test(value) for value in uniques), dtype=bool, count=len(uniques))
+        return hits[inverse]
+
+    return column, text
+
+
+@dataclass
+class CompiledRule:
+    rule: ThresholdRule
+    fingerprint: str
+    columns: list[str]
+    predicates: list[Predicate]
+
+    def evaluate(self, columns: Columns, size: int) -> np.ndarray:
+        mask = np.ones(size, dtype=bool)
+        for predicate in self.predicates:
+            mask &= predicate(columns)
+        return mask
+
+
+def compile_rule(rule: ThresholdRule) -> CompiledRule:
+    compiled = [compile_condition(condition) for condition in rule.when]
+    return CompiledRule(
+        rule=rule,
+        fingerprint=alert_fingerprint(rule.severity, RULE_SOURCE, rule.text),
+        columns=[column for column, _ in compiled],
+        predicates=[predicate for _, predicate in compiled],
+    )
+
+
+def build_columns(statuses: Sequence[AgentStatusRequest], names: set[str]) -> Columns:
+    columns: Columns = {}
+    for name in names:
+        kind, key = name.split(":", 1)
+        if kind == "metric":
+            columns[name] = np.fromiter(
+                ((s.metrics or {}).get(key, np.nan) for s in statuses), dtype=np.float64, count=len(statuses)
+            )
+        else:
+            # None в object-массиве np.unique не сравнит со строками
+            columns[name] = np.array([getattr(s, key) or "" for s in statuses], dtype=object)
+    return columns
+
+
+class RuleEngine:
+    """Threshold rules from RULES_FILE evaluated column-wise on each batch of statuses.
+
+    Rules are compiled once per file version into vectorized predicates; the
+    file is re-read when its mtime changes, checked at most every
+    `reload_interval` seconds. Matches are upserted as alerts with source
+    'rules' through the regular alert path; rule alerts of servers in the
+    batch that no longer match are resolved.
+    """
+
+    def __init__(self, path: str, reload_interval: float):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._rules: list[CompiledRule] = []
+        self._columns: set[str] = set()
+        self._mtime: float | None = None
+        self._checked_at = 0.0
+        # файл правил существует (пусть и пустой): алерты удалённых правил нужно снимать
+        self.configured = False
+
+        self.reloads = 0
+        self.reload_errors = 0
+        self.evaluated = 0
+        self.matches = 0
+        self.resolved = 0
+
+    @property
+    def rules(self) -> list[ThresholdRule]:
+        return [compiled.rule for compiled in self._rules]
+
+    def load(self, raw: str) -> None:
+        data = json.loads(raw)
+        ruleset = RuleSet.model_validate({"rules": data} if isinstance(data, list) else data)
+        rules = [compile_rule(rule) for rule in ruleset.rules if rule.enabled]
+        self._rules = rules
+        self._columns = {column for compiled in rules for column in compiled.columns}
+        self.configured = True
+
+    def reload_if_changed(self) -> None:
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            if self.configured:
+                logger.warning("Rules file %s removed, rules disabled", self.path)
+            self._rules, self._columns, self._mtime, self.configured = [], set(), None, False
+            return
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.load(f.read())
+        except (OSError, ValueError, ValidationError):
+            # остаёмся на прежней версии правил
+            self.reload_errors += 1
+            logger.exception("Invalid rules file %s, keeping %d previous rules", self.path, len(self._rules))
+            return
+        self.reloads += 1
+        logger.info("Loaded %d rules from %s", len(self._rules), self.path)
+
+    def evaluate(self, statuses: Sequence[AgentStatusRequest]) -> list[tuple[CompiledRule, np.ndarray]]:
+        """(rule, indices into `statuses` that match it) for every rule with matches."""
+        if not self._rules or not statuses:
+            return []
+        columns = build_columns(statuses, self._columns)
+        self.evaluated += len(statuses)
+        result = []
+        for compiled in self._rules:
+            matched = np.flatnonzero(compiled.evaluate(columns, len(statuses)))
+            if len(matched):
+                result.append((compiled, matched))
+        return result
+
+    async def apply(self, session: AsyncSession, statuses: Sequence[AgentStatusRequest]) -> list[dict]:
+        """Writes alerts for matches and resolves stale rule alerts; returns the upserted rows. The caller commits."""
+        self.reload_if_changed()
+        if not self.configured or not statuses:
+            return []
+
+        items: dict[int, list[AlertItem]] = {}
+        firing: set[tuple[int, str]] = set()
+        for compiled, matched in self.evaluate(statuses):
+            rule = compiled.rule
+            for index in matched:
+                server_id = statuses[index].server_id
+                firing.add((server_id, compiled.fingerprint))
+                items.setdefault(server_id, []).append(
+                    AlertItem(severity=rule.severity, source=RULE_SOURCE, alert=rule.text, counter=1)
+                )
+        self.matches += len(firing)
+
+        # повторное срабатывание в пределах ALERT_CACHE_TTL в БД не пишется (кэш отпечатков)
+        rows = [row for server_id, server_items in items.items() for row in alert_ingestor.prepare(server_id, server_items)]
+        await alert_ingestor.write(session, rows)
+
+        server_ids = [s.server_id for s in statuses]
+        active = await session.execute(
+            select(Alert.id, Alert.server_id, Alert.severity, Alert.fingerprint).where(
+                Alert.server_id.in_(server_ids), Alert.active, Alert.source == RULE_SOURCE
+            )
+        )
+        stale = [row for row in active if (row.server_id, row.fingerprint) not in firing]
+        if stale:
+            await session.execute(update(Alert).where(Alert.id.in_([row.id for row in stale])).values(active=False))
+            record_alert_changes(session, closed=[(row.server_id, row.severity, row.fingerprint) for row in stale])
+            alert_ingestor.forget((row.server_id, row.fingerprint) for row in stale)
+            self.resolved += len(stale)
+        return rows
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "configured": self.configured,
+            "rules": len(self._rules),
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+            "evaluated": self.evaluated,
+            "matches": self.matches,
+            "resolved": self.resolved,
+        }
+
+
+rule_engine = RuleEngine(settings.RULES_FILE, settings.RULES_RELOAD_INTERVAL)
@@ -0,0 +1,250 @@
+import asyncio
+import logging
+from datetime import UTC, datetime, timedelta
+from typing import Sequence
+
+from sqlalchemy import Float, delete, func, select, text, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import settings
+from src.database import UPSERT_CHUNK_SIZE, async_session
+from src.models.agent_models import AgentStatusRequest
+from src.models.db_models import StatusRollup, StatusRollupWatermark, StatusSample
+from src.services.partitions import create_partition, drop_partitions_before, try_lock
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_LOCK = 4_810_933
+
+DAY = 86400
+RAW_STEP = settings.AGENT_HEARTBEAT_INTERVAL
+# (resolution, source, bucket seconds)
+ROLLUP_CHAIN = [("1m", "raw", 60), ("1h", "1m", 3600), ("1d", "1h", DAY)]
+RETENTION_DAYS = {
+    "raw": settings.STATUS_RAW_RETENTION_DAYS,
+    "1m": settings.STATUS_1M_RETENTION_DAYS,
+    "1h": settings.STATUS_1H_RETENTION_DAYS,
+    "1d": settings.STATUS_1D_RETENTION_DAYS,
+}
+STEPS = {"raw": RAW_STEP, "1m": 60, "1h": 3600, "1d": DAY}
+# за один проход агрегируется не больше стольких бакетов — догон после простоя идёт порциями
+MAX_BUCKETS_PER_PASS = 360
+SAMPLES_DAYS_AHEAD = 2
+ROLLUP_DELETE_BATCH = 10000
+
+_ON_CONFLICT = """
+    ON CONFLICT (resolution, server_id, metric, bucket) DO UPDATE SET
+        samples = EXCLUDED.samples,
+        value_min = EXCLUDED.value_min,
+        value_max = EXCLUDED.value_max,
+        value_sum = EXCLUDED.value_sum
+"""
+
+ROLLUP_FROM_RAW_SQL = """
+    INSERT INTO status_rollups (resolution, server_id, metric, bucket, samples, value_min, value_max, value_sum)
+    SELECT '{resolution}', s.server_id, m.key, date_bin(:step, s.ts, TIMESTAMPTZ '2000-01-01 00:00:00+00'),
+           count(*), min(m.value::float8), max(m.value::float8), sum(m.value::float8)
+    FROM status_samples s CROSS JOIN LATERAL jsonb_each_text(s.metrics) AS m(key, value)
+    WHERE s.ts >= :start AND s.ts < :end
+    GROUP BY 1, 2, 3, 4
+""" + _ON_CONFLICT
+
+ROLLUP_FROM_ROLLUP_SQL = """
+    INSERT INTO status_rollups (resolution, server_id, metric, bucket, samples, value_min, value_max, value_sum)
+    SELECT '{resolution}', server_id, metric, date_bin(:step, bucket, TIMESTAMPTZ '2000-01-01 00:00:00+00'),
+           sum(samples), min(value_min), max(value_max), sum(value_sum)
+    FROM status_rollups
+    WHERE resolution = '{source}' AND bucket >= :start AND bucket < :end
+    GROUP BY 1, 2, 3, 4
+""" + _ON_CONFLICT
+
+
+def floor_ts(ts: datetime, step: float) -> datetime:
+    return datetime.fromtimestamp(ts.timestamp() // step * step, UTC)
+
+
+async def insert_samples(session: AsyncSession, statuses: Sequence[AgentStatusRequest]) -> None:
+    """Appends heartbeat metrics to status_samples, stamped with the flush time.
+
+    Runs in a savepoint: a failure here (e.g. a missing partition) loses the
+    samples but never the status upsert of the same flush.
+    """
+    rows = [
+        {"server_id": s.server_id, "ts": datetime.now(UTC), "metrics": s.metrics}
+        for s in statuses
+        if s.metrics
+    ]
+    if not rows:
+        return
+    try:
+        async with session.begin_nested():
+            # лимит asyncpg — 32767 параметров на запрос
+            for i in range(0, len(rows), UPSERT_CHUNK_SIZE):
+                await session.execute(
+                    insert(StatusSample).values(rows[i:i + UPSERT_CHUNK_SIZE]).on_conflict_do_nothing()
+                )
+    except Exception:
+        logger.exception("Failed to store %d status samples", len(rows))
+
+
+class StatusRollupJob:
+    """Builds 1m/1h/1d aggregates and enforces retention of raw samples and rollups."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    async def _watermark(self, session: AsyncSession, resolution: str) -> datetime | None:
+        rolled_until = await session.scalar(
+            select(StatusRollupWatermark.rolled_until).where(StatusRollupWatermark.resolution == resolution)
+        )
+        if rolled_until is not None:
+            return rolled_until
+        # до первого прохода с таблицей отметок — по последнему бакету
+        last = await session.scalar(
+            select(func.max(StatusRollup.bucket)).where(StatusRollup.resolution == resolution)
+        )
+        return last + timedelta(seconds=STEPS[resolution]) if last is not None else None
+
+    async def _advance(self, session: AsyncSession, resolution: str, rolled_until: datetime) -> None:
+        stmt = insert(StatusRollupWatermark).values(resolution=resolution, rolled_until=rolled_until)
+        await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[StatusRollupWatermark.resolution],
+                set_={"rolled_until": stmt.excluded.rolled_until},
+            )
+        )
+
+    async def rollup(self, session: AsyncSession, now: datetime) -> None:
+        # сэмплы пишутся с временем flush, так что запаздывают не больше чем на интервал flush
+        end = floor_ts(now - timedelta(seconds=settings.STATUS_FLUSH_INTERVAL * 2 + 5), 60)
+        for resolution, source, step in ROLLUP_CHAIN:
+            end = floor_ts(end, step)
+            start = await self._watermark(session, resolution)
+            if start is None:
+                start = floor_ts(end - timedelta(days=RETENTION_DAYS[source]), step)
+            stop = min(end, start + timedelta(seconds=step * MAX_BUCKETS_PER_PASS))
+            if start < stop:
+                sql = ROLLUP_FROM_RAW_SQL if source == "raw" else ROLLUP_FROM_ROLLUP_SQL
+                await session.execute(
+                    text(sql.format(resolution=resolution, source=source)),
+                    {"step": timedelta(seconds=step), "start": start, "end": stop},
+                )
+                # отметка двигается и по пустому окну (простой, свежая установка), иначе агрегация встанет
+                await self._advance(session, resolution, stop)
+            # старшие уровни агрегируют только то, что младший уже закрыл
+            end = stop
+
+    async def enforce_retention(self, session: AsyncSession, now: datetime) -> None:
+        today = floor_ts(now, DAY)
+        for offset in range(SAMPLES_DAYS_AHEAD + 1):
+            day = today + timedelta(days=offset)
+            await create_partition(
+                session, "status_samples", f"status_samples_d{day:%Y%m%d}", day, day + timedelta(days=1)
+            )
+        await drop_partitions_before(
+            session, "status_samples", today - timedelta(days=RETENTION_DAYS["raw"])
+        )
+
+        for resolution in ("1m", "1h", "1d"):
+            cutoff = now - timedelta(days=RETENTION_DAYS[resolution])
+            expired = (
+                select(StatusRollup.server_id, StatusRollup.metric, StatusRollup.bucket)
+                .where(StatusRollup.resolution == resolution, StatusRollup.bucket < cutoff)
+                .limit(ROLLUP_DELETE_BATCH)
+            )
+            await session.execute(
+                delete(StatusRollup).where(
+                    StatusRollup.resolution == resolution,
+                    tuple_(StatusRollup.server_id, StatusRollup.metric, StatusRollup.bucket).in_(expired),
+                )
+            )
+
+    async def run_once(self) -> None:
+        now = datetime.now(UTC)
+        async with async_session() as session:
+            if not await try_lock(session, ROLLUP_LOCK):
+                return
+            await self.enforce_retention(session, now)
+            await self.rollup(session, now)
+            await session.commit()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Status rollup failed")
+            await asyncio.sleep(self.interval)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def pick_resolution(start: datetime, end: datetime, max_points: int, now: datetime) -> str:
+    """The finest level that still covers `start` and returns at most `max_points` buckets."""
+    span = (end - start).total_seconds()
+    for resolution in ("raw", "1m", "1h", "1d"):
+        if start < now - timedelta(days=RETENTION_DAYS[resolution]):
+            continue
+        if span / STEPS[resolution] <= max_points:
+            return resolution
+    return "1d"
+
+
+async def query_history(
+    session: AsyncSession, server_id: int, metric: str, start: datetime, end: datetime, max_points: int
+) -> dict:
+    resolution = pick_resolution(start, end, max_points, datetime.now(UTC))
+    if resolution == "raw":
+        value = StatusSample.metrics[metric].astext.cast(Float)
+        rows = await session.execute(
+            select(StatusSample.ts, value.label("value"))
+            .where(
+                StatusSample.server_id == server_id,
+                StatusSample.ts >= start,
+                StatusSample.ts < end,
+                StatusSample.metrics.has_key(metric),
+            )
+            .order_by(StatusSample.ts)
+        )
+        points = [
+            {"t": row.ts, "min": row.value, "max": row.value, "avg": row.value, "count": 1} for row in rows
+        ]
+    else:
+        rows = await session.execute(
+            select(StatusRollup)
+            .where(
+                StatusRollup.resolution == resolution,
+                StatusRollup.server_id == server_id,
+                StatusRollup.metric == metric,
+                StatusRollup.bucket >= floor_ts(start, STEPS[resolution]),
+                StatusRollup.bucket < end,
+            )
+            .order_by(StatusRollup.bucket)
+        )
+        points = [
+            {
+                "t": r.bucket,
+                "min": r.value_min,
+                "max": r.value_max,
+                "avg": r.value_sum / r.samples,
+                "count": r.samples,
+            }
+            for r in rows.scalars()
+        ]
+    return {"server_id": server_id, "metric": metric, "resolution": resolution, "points": points}
+
+
+status_rollup_job = StatusRollupJob(settings.STATUS_ROLLUP_INTERVAL)
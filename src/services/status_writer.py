@@ -0,0 +1,305 @@
+import asyncio
+import logging
+import time
+from datetime import UTC, datetime
+from typing import Iterable, Sequence
+
+from sqlalchemy import func, literal_column
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import settings
+from src.database import UPSERT_CHUNK_SIZE, async_session
+from src.models.agent_models import AgentStatusRequest
+from src.models.db_models import Server
+from src.services.alert_ingest import alert_ingestor
+from src.services.events import emit
+from src.services.fleet_snapshot import fleet_snapshot
+from src.services.rules import rule_engine
+from src.services.status_series import insert_samples
+from src.utils.metrics import registry
+from src.utils.session_notes import add_notes
+
+logger = logging.getLogger(__name__)
+
+status_flush_seconds = registry.histogram("status_flush_duration_seconds", "Write-behind status flush latency")
+
+
+def _aware(ts: datetime) -> datetime:
+    return ts if ts.tzinfo is not None else ts.replace(tzinfo=UTC)
+
+
+def latest_per_server(statuses: Iterable[AgentStatusRequest]) -> list[AgentStatusRequest]:
+    latest: dict[int, AgentStatusRequest] = {}
+    for status in statuses:
+        current = latest.get(status.server_id)
+        if current is None or _aware(current.timestamp) <= _aware(status.timestamp):
+            latest[status.server_id] = status
+    return list(latest.values())
+
+
+async def upsert_statuses(session: AsyncSession, statuses: Sequence[AgentStatusRequest]) -> None:
+    """Bulk upsert of heartbeats into `servers`. Older heartbeats never overwrite newer ones.
+
+    Expects at most one status per server (see `latest_per_server`): ON CONFLICT
+    cannot touch the same row twice in one statement. Servers reporting for the
+    first time are noted for region_rollup (`servers_first_seen`).
+    """
+    # подзапрос в RETURNING видит снимок до вставки: last_update ещё не было — первый heartbeat
+    first_seen = literal_column(
+        "NOT EXISTS (SELECT 1 FROM servers prior WHERE prior.id = servers.id AND prior.last_update IS NOT NULL)"
+    )
+    rows = [
+        {
+            "id": s.server_id,
+            "ip": s.ip,
+            "cgm_version": s.cgm_version,
+            "admin_version": s.admin_version,
+            "last_update": _aware(s.timestamp),
+            # время приёма по часам БД (с задержкой write-behind): по нему heartbeat ищет пропавшие серверы
+            "last_seen": func.now(),
+            "last_status": s.model_dump(mode="json", exclude={"agent_key"}),
+        }
+        for s in statuses
+    ]
+    for i in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        stmt = insert(Server).values(rows[i:i + UPSERT_CHUNK_SIZE])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Server.id],
+            set_={
+                "ip": stmt.excluded.ip,
+                "cgm_version": stmt.excluded.cgm_version,
+                "admin_version": stmt.excluded.admin_version,
+                "last_update": stmt.excluded.last_update,
+                "last_seen": stmt.excluded.last_seen,
+                "last_status": stmt.excluded.last_status,
+            },
+            where=Server.last_update.is_(None) | (Server.last_update < stmt.excluded.last_update),
+        ).returning(Server.id, first_seen)
+        result = await session.execute(stmt)
+        add_notes(session, "servers_first_seen", [server_id for server_id, first in result if first])
+
+
+async def apply_rules(session: AsyncSession, statuses: Sequence[AgentStatusRequest]) -> list[dict]:
+    """Threshold-rule alerts for the batch, in a savepoint: a broken rule never fails the status flush."""
+    try:
+        async with session.begin_nested():
+            return await rule_engine.apply(session, statuses)
+    except Exception:
+        logger.exception("Failed to apply rules to %d statuses", len(statuses))
+        return []
+
+
+async def persist_statuses(session: AsyncSession, statuses: Sequence[AgentStatusRequest]) -> list[dict]:
+    """Everything a batch of statuses writes, inside the caller's transaction.
+
+    Returns the rule alert rows to hand to `statuses_committed` after the commit.
+    """
+    await upsert_statuses(session, statuses)
+    await insert_samples(session, statuses)
+    emit(
+        session,
+        (
+            {
+                "type": "server.status",
+                "server_id": s.server_id,
+                "ip": s.ip,
+                "cgm_version": s.cgm_version,
+                "admin_version": s.admin_version,
+                "last_update": _aware(s.timestamp).isoformat(),
+            }
+            for s in statuses
+        ),
+    )
+    return await apply_rules(session, statuses)
+
+
+def is_data_error(exc: Exception) -> bool:
+    """The database rejected the rows themselves, as opposed to a lost connection or an outage."""
+    return (
+        isinstance(exc, DBAPIError)
+        and not isinstance(exc, (OperationalError, InterfaceError))
+        and not exc.connection_invalidated
+    )
+
+
+def statuses_committed(statuses: Sequence[AgentStatusRequest], rule_alerts: Sequence[dict] = ()) -> None:
+    """In-memory follow-ups once `persist_statuses` has been committed."""
+    fleet_snapshot.apply_statuses(statuses)
+    alert_ingestor.remember(rule_alerts)
+
+
+class StatusWriteBehind:
+    """Buffers agent heartbeats in memory and flushes them as one bulk upsert.
+
+    Repeated heartbeats from the same server are merged, so the buffer holds
+    at most one (the newest) status per server_id. A flush happens every
+    `flush_interval` seconds or as soon as `batch_size` servers are pending.
+    A failed batch goes back to the buffer; after `max_attempts` failures in
+    a row it is written in halves, so a status the database rejects on its
+    own is dropped instead of blocking every later flush.
+    """
+
+    def __init__(self, flush_interval: float, batch_size: int, max_attempts: int):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self._pending: dict[int, AgentStatusRequest] = {}
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+        # неудачные flush подряд
+        self._failures = 0
+
+        # метрики
+        self.submitted = 0
+        self.merged = 0
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.flush_errors = 0
+        self.dropped = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    def submit(self, status: AgentStatusRequest) -> None:
+        self.submitted += 1
+        current = self._pending.get(status.server_id)
+        if current is not None:
+            self.merged += 1
+            if _aware(current.timestamp) > _aware(status.timestamp):
+                return
+        self._pending[status.server_id] = status
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+
+            started = time.perf_counter()
+            statuses = list(batch.values())
+            # server_id уже записанных (или отброшенных) частей пакета при записи половинами
+            done: set[int] = set()
+            try:
+                if self._failures >= self.max_attempts:
+                    await self._write_split(statuses, done)
+                else:
+                    await self._write(statuses)
+            except BaseException as exc:
+                # и при отмене задачи: пакет уже вынут из _pending, иначе он пропадёт
+                if isinstance(exc, Exception):
+                    self.flush_errors += 1
+                    self._failures += 1
+                self._requeue({server_id: s for server_id, s in batch.items() if server_id not in done})
+                raise
+            self._failures = 0
+
+            elapsed = time.perf_counter() - started
+            self.flushes += 1
+            self.flushed_rows += len(batch)
+            status_flush_seconds.observe(elapsed)
+            self.last_flush_seconds = elapsed
+            self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+            return len(batch)
+
+    async def _write(self, statuses: list[AgentStatusRequest]) -> None:
+        async with async_session() as session:
+            rule_alerts = await persist_statuses(session, statuses)
+            await session.commit()
+        statuses_committed(statuses, rule_alerts)
+
+    async def _write_split(self, statuses: list[AgentStatusRequest], done: set[int]) -> None:
+        """Writes the batch in halves down to single statuses, adding the server ids of written
+        parts to `done`. A single status rejected with a data error is dropped; other errors propagate."""
+        try:
+            await self._write(statuses)
+        except Exception as exc:
+            if len(statuses) == 1:
+                if not is_data_error(exc):
+                    raise
+                self.dropped += 1
+                logger.error("Dropping status of server %d rejected by the database: %s", statuses[0].server_id, exc)
+            else:
+                middle = len(statuses) // 2
+                await self._write_split(statuses[:middle], done)
+                await self._write_split(statuses[middle:], done)
+                return
+        done.update(s.server_id for s in statuses)
+
+    def _requeue(self, batch: dict[int, AgentStatusRequest]) -> None:
+        # heartbeat, пришедшие во время неудачного flush, новее — их не трогаем
+        for server_id, status in batch.items():
+            current = self._pending.get(server_id)
+            if current is None or _aware(current.timestamp) < _aware(status.timestamp):
+                self._pending[server_id] = status
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Status flush failed, %d servers pending", self.queue_depth)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            # цикл доделывает текущий flush и выходит; отмена — только если flush завис
+            self._stopping = True
+            self._wakeup.set()
+            try:
+                await asyncio.wait_for(self._task, timeout=settings.SHUTDOWN_DRAIN_TIMEOUT)
+            except (asyncio.CancelledError, asyncio.TimeoutError):
+                pass
+            self._task = None
+        await self.drain(settings.SHUTDOWN_DRAIN_TIMEOUT)
+
+    async def drain(self, timeout: float) -> None:
+        """Flushes everything still buffered, retrying until `timeout`; used on shutdown."""
+        deadline = time.monotonic() + timeout
+        while self._pending:
+            try:
+                await self.flush()
+            except Exception:
+                if time.monotonic() >= deadline:
+                    logger.error("Shutdown: %d buffered statuses were not written", self.queue_depth)
+                    return
+                logger.exception("Shutdown flush failed, retrying")
+                await asyncio.sleep(0.5)
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue_depth,
+            "submitted": self.submitted,
+            "merged": self.merged,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "flush_errors": self.flush_errors,
+            "dropped": self.dropped,
+            "last_flush_seconds": self.last_flush_seconds,
+            "max_flush_seconds": self.max_flush_seconds,
+        }
+
+
+status_writer = StatusWriteBehind(
+    settings.STATUS_FLUSH_INTERVAL, settings.STATUS_BATCH_SIZE, settings.STATUS_FLUSH_MAX_ATTEMPTS
+)
+
+registry.callback_gauge("status_write_queue_depth", "Servers with a buffered heartbeat", lambda: status_writer.queue_depth)
+registry.callback_counter("status_heartbeats_merged_total", "Heartbeats merged in the buffer", lambda: status_writer.merged)
@@ -0,0 +1,136 @@
+import json
+import zlib
+from typing import Any, Callable, Coroutine
+
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+
+from src.config import settings
+
+try:
+    import msgpack
+except ImportError:  # msgpack не обязателен: без него доступен только JSON
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # без zstandard принимаются только gzip и несжатые тела
+    zstandard = None
+
+MSGPACK_CONTENT_TYPES = {"application/msgpack", "application/x-msgpack", "application/vnd.msgpack"}
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Request body exceeds {settings.AGENT_MAX_BODY_BYTES} bytes")
+
+
+def inflate(body: bytes, content_encoding: str, limit: int) -> bytes:
+    """Decompresses a request body, never producing more than `limit` bytes."""
+    if content_encoding in ("", "identity"):
+        inflated = body
+    elif content_encoding in ("gzip", "x-gzip"):
+        decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        try:
+            inflated = decompressor.decompress(body, limit + 1)
+        except zlib.error:
+            raise HTTPException(status_code=400, detail="Malformed gzip body")
+    elif content_encoding == "zstd" and zstandard is not None:
+        try:
+            with zstandard.ZstdDecompressor().stream_reader(body) as reader:
+                chunks, size = [], 0
+                while size <= limit:
+                    chunk = reader.read(min(65536, limit + 1 - size))
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+                    size += len(chunk)
+            inflated = b"".join(chunks)
+        except zstandard.ZstdError:
+            raise HTTPException(status_code=400, detail="Malformed zstd body")
+    else:
+        raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {content_encoding}")
+
+    if len(inflated) > limit:
+        raise _too_large()
+    return inflated
+
+
+def _media_type(value: str | None) -> str:
+    return (value or "").split(";", 1)[0].strip().lower()
+
+
+def accepts_msgpack(request: Request) -> bool:
+    if msgpack is None:
+        return False
+    return any(_media_type(part) in MSGPACK_CONTENT_TYPES for part in request.headers.get("accept", "").split(","))
+
+
+async def decode_request(request: Request) -> Request:
+    """Inflates gzip/zstd bodies and turns msgpack into the JSON FastAPI expects.
+
+    Returns a request whose body/JSON caches are already filled, so the
+    regular body parsing validates into the same pydantic models.
+    """
+    content_encoding = request.headers.get("content-encoding", "").strip().lower()
+    content_type = _media_type(request.headers.get("content-type"))
+    is_msgpack = content_type in MSGPACK_CONTENT_TYPES
+    if not content_encoding and not is_msgpack:
+        return request
+
+    raw = await request.body()
+    if len(raw) > settings.AGENT_MAX_BODY_BYTES:
+        raise _too_large()
+    body = inflate(raw, content_encoding, settings.AGENT_MAX_BODY_BYTES)
+
+    decoded: Any = None
+    if is_msgpack:
+        if msgpack is None:
+            raise HTTPException(status_code=415, detail="msgpack is not supported by this server")
+        try:
+            decoded = msgpack.unpackb(body, raw=False, timestamp=3)
+        except (ValueError, msgpack.ExtraData, msgpack.FormatError, msgpack.StackError):
+            raise HTTPException(status_code=400, detail="Malformed msgpack body")
+
+    headers = [
+        (name, value)
+        for name, value in request.scope["headers"]
+        if name not in (b"content-encoding", b"content-length") and not (is_msgpack and name == b"content-type")
+    ]
+    if is_msgpack:
+        headers.append((b"content-type", b"application/json"))
+    scope = dict(request.scope, headers=headers)
+
+    decoded_request = Request(scope, request.receive)
+    decoded_request._body = body
+    if is_msgpack:
+        decoded_request._json = decoded
+    return decoded_request
+
+
+def to_msgpack(response: Response) -> Response:
+    # ответы агентам маленькие (сообщение, список команд), повторный разбор JSON дешевле отдельного пути сериализации
+    payload = msgpack.packb(json.loads(response.body), use_bin_type=True, datetime=True)
+    headers = {
+        name: value
+        for name, value in response.headers.items()
+        if name not in ("content-length", "content-type")
+    }
+    return Response(content=payload, status_code=response.status_code, headers=headers, media_type=MSGPACK_MEDIA_TYPE)
+
+
+class AgentRoute(APIRoute):
+    """Route class for agent endpoints: compressed and msgpack bodies in, msgpack out on request."""
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            request = await decode_request(request)
+            response = await handler(request)
+            if isinstance(response, JSONResponse) and accepts_msgpack(request):
+                return to_msgpack(response)
+            return response
+
+        return route_handler
@@ -0,0 +1,111 @@
+import re
+import time
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.utils.metrics import registry
+
+http_request_seconds = registry.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ("method", "route", "status"),
+)
+http_requests_in_flight = registry.gauge("http_requests_in_flight", "HTTP requests being served")
+db_statement_seconds = registry.histogram(
+    "db_statement_duration_seconds",
+    "SQL statement latency by statement fingerprint",
+    ("statement",),
+)
+
+# отпечатков больше этого числа не заводим — остальное идёт в "other"
+MAX_FINGERPRINTS = 500
+FINGERPRINT_LENGTH = 160
+
+_PLACEHOLDER_RE = re.compile(r"\$\d+|%\(\w+\)s|'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LIST_RE = re.compile(r"\(\?(?:, \?)+\)")
+_ROWS_RE = re.compile(r"(\(\?\)|\(\.\.\.\))(?:, (?:\(\?\)|\(\.\.\.\)))+")
+_SPACE_RE = re.compile(r"\s+")
+_fingerprints: dict[str, str] = {}
+_distinct: set[str] = set()
+
+
+def statement_fingerprint(statement: str) -> str:
+    """Normalized statement: literals and placeholders become ?, value lists collapse."""
+    fingerprint = _fingerprints.get(statement)
+    if fingerprint is None:
+        fingerprint = _SPACE_RE.sub(" ", statement).strip()
+        fingerprint = _PLACEHOLDER_RE.sub("?", fingerprint)
+        fingerprint = _LIST_RE.sub("(...)", fingerprint)
+        fingerprint = _ROWS_RE.sub(r"\1, ...", fingerprint)
+        fingerprint = fingerprint[:FINGERPRINT_LENGTH]
+        if fingerprint not in _distinct:
+            if len(_distinct) >= MAX_FINGERPRINTS:
+                fingerprint = "other"
+            else:
+                _distinct.add(fingerprint)
+        # сам текст запроса тоже ограничен: multi-row INSERT даёт новый текст на каждый размер пачки
+        if len(_fingerprints) < MAX_FINGERPRINTS * 20:
+            _fingerprints[statement] = fingerprint
+    return fingerprint
+
+
+def install_sql_metrics(engine: AsyncEngine) -> None:
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_metrics_started", None)
+        if started is not None:
+            db_statement_seconds.observe(time.perf_counter() - started, statement_fingerprint(statement))
+
+    pool = sync_engine.pool
+    registry.callback_gauge("db_pool_size", "Configured pool size", pool.size)
+    registry.callback_gauge("db_pool_checked_out", "Connections currently checked out", pool.checkedout)
+    registry.callback_gauge("db_pool_overflow", "Connections opened above pool_size", pool.overflow)
+
+
+def route_template(scope) -> str:
+    """/api/v1/agent/commands/42/result -> /api/v1/agent/commands/{command_id}/result."""
+    # сырой путь в метке — кардинальность без границ; неотмаршрутизированные запросы схлопываем в одну метку
+    route = scope.get("route")
+    if route is None:
+        return "<unmatched>"
+    # шаблон маршрута без префиксов include_router; префиксы статические — берём их из самого пути
+    template = route.path
+    depth = template.count("/")
+    prefix = "/".join(scope["path"].split("/")[:-depth]) if depth else scope["path"]
+    return prefix + template
+
+
+class MetricsMiddleware:
+    """ASGI middleware: latency per route template and in-flight requests."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_in_flight.dec()
+            route = route_template(scope)
+            http_request_seconds.observe(time.perf_counter() - started, scope["method"], route, str(status))
@@ -0,0 +1,54 @@
+from typing import Iterable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, SessionTransaction
+
+# Заметки транзакции в session.info (события, изменения алертов, переходы команд),
+# которые после коммита забирают слушатели after_commit/before_commit
+NOTE_KEYS: set[str] = set()
+_SAVEPOINTS = "note_savepoints"
+
+
+def add_notes(session, key: str, items: Iterable) -> None:
+    """Appends notes to the session's transaction; a rolled-back savepoint takes its own notes back."""
+    NOTE_KEYS.add(key)
+    session.info.setdefault(key, []).extend(items)
+
+
+def pop_notes(session, key: str) -> list:
+    return session.info.pop(key, None) or []
+
+
+def get_notes(session, key: str) -> list:
+    return session.info.get(key) or []
+
+
+@event.listens_for(Session, "after_transaction_create")
+def _savepoint_started(session: Session, transaction: SessionTransaction) -> None:
+    if transaction.nested:
+        marks = {key: len(session.info.get(key, ())) for key in NOTE_KEYS}
+        session.info.setdefault(_SAVEPOINTS, {})[transaction] = marks
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _savepoint_rolled_back(session: Session, previous_transaction: SessionTransaction) -> None:
+    if not previous_transaction.nested:
+        return
+    marks = session.info.get(_SAVEPOINTS, {}).pop(previous_transaction, None)
+    if marks is None:
+        return
+    # ключи, впервые появившиеся внутри savepoint, откатываются целиком
+    for key in NOTE_KEYS:
+        notes = session.info.get(key)
+        if notes:
+            del notes[marks.get(key, 0):]
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _transaction_ended(session: Session, transaction: SessionTransaction) -> None:
+    if transaction.parent is not None:
+        return
+    # после коммита заметки уже забраны; остались только от отката или close() без коммита
+    session.info.pop(_SAVEPOINTS, None)
+    for key in NOTE_KEYS:
+        session.info.pop(key, None)
@@ -0,0 +1,47 @@
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+
+class FakeResult:
+    def __init__(self, rows=(), rowcount=None):
+        self.rows = [SimpleNamespace(**row) if isinstance(row, dict) else row for row in rows]
+        self.rowcount = len(self.rows) if rowcount is None else rowcount
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def all(self):
+        return list(self.rows)
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+
+class FakeSession:
+    """AsyncSession stand-in: `execute` and `scalar` return the queued results in order and record the statements."""
+
+    def __init__(self, *results: FakeResult, scalars=()):
+        self.results = list(results)
+        self.scalars = list(scalars)
+        self.statements = []
+        self.added = []
+        self.info = {}
+        self.commits = 0
+
+    async def execute(self, statement, params=None):
+        self.statements.append(statement)
+        return self.results.pop(0) if self.results else FakeResult()
+
+    async def scalar(self, statement, params=None):
+        self.statements.append(statement)
+        return self.scalars.pop(0) if self.scalars else None
+
+    @asynccontextmanager
+    async def begin_nested(self):
+        yield
+
+    def add(self, obj):
+        self.added.append(obj)
+
+    async def commit(self):
+        self.commits += 1
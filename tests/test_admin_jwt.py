@@ -0,0 +1,89 @@
+import time
+from contextlib import asynccontextmanager
+
+import jwt
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+from fakes import FakeResult, FakeSession
+from src.config import settings
+from src.security import admin_jwt
+from src.security.admin_jwt import AdminPrincipal, AdminTokenCache, create_jwt, hash_password, verify_password
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    """Counts admin_users lookups; the user `alice` has the `viewer` role."""
+    opened = []
+
+    @asynccontextmanager
+    async def open_session():
+        opened.append(FakeSession(FakeResult([{"id": 1, "username": "alice", "role": "viewer"}])))
+        yield opened[-1]
+
+    monkeypatch.setattr(admin_jwt, "async_session", open_session)
+    monkeypatch.setattr(admin_jwt, "admin_token_cache", AdminTokenCache(10, 60))
+    return opened
+
+
+def bearer(token):
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+def test_password_hash_roundtrip():
+    password_hash = hash_password("s3cret")
+    assert verify_password("s3cret", password_hash)
+    assert not verify_password("wrong", password_hash)
+    assert not verify_password("s3cret", "garbage")
+
+
+async def test_verified_token_is_served_from_cache(lookups):
+    token = create_jwt("alice")
+    first = await admin_jwt.get_current_admin(bearer(token))
+    second = await admin_jwt.get_current_admin(bearer(token))
+    assert first == second == AdminPrincipal(user_id=1, username="alice", role="viewer")
+    assert len(lookups) == 1
+
+
+async def test_expired_or_forged_token_is_rejected(lookups):
+    expired = jwt.encode(
+        {"sub": "alice", "exp": int(time.time()) - 10}, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM
+    )
+    forged = jwt.encode({"sub": "alice", "exp": int(time.time()) + 60}, "other-secret", algorithm="HS256")
+    for token in (expired, forged):
+        with pytest.raises(HTTPException) as error:
+            await admin_jwt.get_current_admin(bearer(token))
+        assert error.value.status_code == 401
+    assert lookups == []
+
+
+async def test_cached_token_expires_with_its_exp():
+    cache = AdminTokenCache(10, 60)
+    principal = AdminPrincipal(user_id=1, username="alice", role="admin")
+    cache.put("short", principal, time.time() - 1)
+    cache.put("long", principal, time.time() + 3600)
+    assert cache.get("short") is None
+    assert cache.get("long") == principal
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 1}
+
+
+def test_cache_evicts_least_recently_used():
+    cache = AdminTokenCache(2, 60)
+    principal = AdminPrincipal(user_id=1, username="alice", role="admin")
+    for token in ("a", "b"):
+        cache.put(token, principal, time.time() + 60)
+    cache.get("a")
+    cache.put("c", principal, time.time() + 60)
+    assert cache.get("b") is None
+    assert cache.get("a") == cache.get("c") == principal
+
+
+async def test_role_is_enforced_from_the_principal():
+    viewer = AdminPrincipal(user_id=1, username="alice", role="viewer")
+    assert await admin_jwt.require_viewer(viewer) == viewer
+    with pytest.raises(HTTPException) as error:
+        await admin_jwt.require_admin(viewer)
+    assert error.value.status_code == 403
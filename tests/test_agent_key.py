@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from src.security import agent_key
+from src.security.agent_key import AgentIdentity, agent_key_cache, ensure_server, hash_agent_key, verify_agent_key
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    agent_key_cache.clear()
+    yield
+    agent_key_cache.clear()
+
+
+def test_ensure_server_allows_own_and_listed_servers():
+    agent = AgentIdentity(server_id=1, key_hash="h", allowed_server_ids=frozenset({2}))
+    ensure_server(agent, 1)
+    ensure_server(agent, 2)
+    with pytest.raises(HTTPException) as exc:
+        ensure_server(agent, 3)
+    assert exc.value.status_code == 403
+
+
+async def test_server_id_zero_is_a_valid_key(monkeypatch):
+    async def lookup(key_hash):
+        return AgentIdentity(server_id=0, key_hash=key_hash)
+
+    monkeypatch.setattr(agent_key, "_lookup_identity", lookup)
+    assert (await verify_agent_key("key")).server_id == 0
+    # второй раз из кэша
+    assert (await verify_agent_key("key")).server_id == 0
+
+
+async def test_unknown_key_is_cached_as_invalid(monkeypatch):
+    calls = 0
+
+    async def lookup(key_hash):
+        nonlocal calls
+        calls += 1
+        return None
+
+    monkeypatch.setattr(agent_key, "_lookup_identity", lookup)
+    for _ in range(2):
+        with pytest.raises(HTTPException) as exc:
+            await verify_agent_key("unknown")
+        assert exc.value.status_code == 401
+    assert calls == 1
+
+
+async def test_cancelled_leader_does_not_hang_followers(monkeypatch):
+    started = asyncio.Event()
+    calls = 0
+
+    async def lookup(key_hash):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            started.set()
+            await asyncio.sleep(3600)
+        return AgentIdentity(server_id=7, key_hash=key_hash)
+
+    monkeypatch.setattr(agent_key, "_lookup_identity", lookup)
+    leader = asyncio.create_task(verify_agent_key("key"))
+    await started.wait()
+    follower = asyncio.create_task(verify_agent_key("key"))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    identity = await asyncio.wait_for(follower, timeout=1)
+    assert identity.server_id == 7
+    assert leader.cancelled()
+    assert hash_agent_key("key") not in agent_key._lookups
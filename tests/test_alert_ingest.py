@@ -0,0 +1,80 @@
+from contextlib import asynccontextmanager
+
+import pytest
+
+from fakes import FakeSession
+from src.models.agent_models import AlertItem
+from src.services import alert_ingest
+from src.services.alert_ingest import AlertIngestor, alert_fingerprint
+
+pytestmark = pytest.mark.anyio
+
+ITEMS = [AlertItem(severity="Major", source="disk", alert="Disk almost full", counter=3)]
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    opened = []
+
+    @asynccontextmanager
+    async def session():
+        opened.append(FakeSession())
+        yield opened[-1]
+
+    monkeypatch.setattr(alert_ingest, "async_session", session)
+    return opened
+
+
+async def test_commit_hook_replaces_the_commit(sessions):
+    ingestor = AlertIngestor(cache_size=100, cache_ttl=60)
+    calls = []
+
+    async def commit(session, rows):
+        calls.append(len(rows))
+        return True
+
+    assert await ingestor.ingest(1, ITEMS, commit) == 1
+    assert calls == [1]
+    assert sessions[0].commits == 0
+    # записанный алерт запомнен: повтор отсекается без запроса к БД
+    assert await ingestor.ingest(1, ITEMS) == 0
+    assert len(sessions) == 1
+
+
+async def test_rows_are_not_remembered_when_the_hook_rolls_back(sessions):
+    ingestor = AlertIngestor(cache_size=100, cache_ttl=60)
+
+    async def commit(session, rows):
+        return False
+
+    assert await ingestor.ingest(1, ITEMS, commit) == 0
+    assert await ingestor.ingest(1, ITEMS) == 1
+    assert sessions[1].commits == 1
+
+
+def test_fingerprint_ignores_whitespace_and_case_of_the_text():
+    assert alert_fingerprint("Major", "disk", "Disk  almost\nFULL ") == alert_fingerprint("Major", "disk", "disk almost full")
+    assert alert_fingerprint("Major", None, "x") == alert_fingerprint("Major", "", "x")
+    assert alert_fingerprint("Major", "disk", "x") != alert_fingerprint("Minor", "disk", "x")
+
+
+def test_prepare_keeps_the_highest_counter_per_fingerprint():
+    ingestor = AlertIngestor(cache_size=100, cache_ttl=60)
+    items = [
+        AlertItem(severity="Major", source="disk", alert="Disk almost full", counter=5),
+        AlertItem(severity="Major", source="disk", alert="disk almost  full", counter=2),
+        AlertItem(severity="Minor", source="cpu", alert="CPU high", counter=1),
+    ]
+    rows = ingestor.prepare(1, items)
+    assert sorted((row["source"], row["counter"]) for row in rows) == [("cpu", 1), ("disk", 5)]
+
+
+def test_prepare_skips_alerts_written_with_the_same_counter(monkeypatch):
+    monkeypatch.setattr(alert_ingest.fleet_snapshot, "apply_alerts", lambda rows: None)
+    ingestor = AlertIngestor(cache_size=100, cache_ttl=60)
+    ingestor.remember(ingestor.prepare(1, ITEMS))
+    assert ingestor.prepare(1, ITEMS) == []
+    assert ingestor.prepare(2, ITEMS) != []
+    bumped = [AlertItem(severity="Major", source="disk", alert="Disk almost full", counter=4)]
+    assert [row["counter"] for row in ingestor.prepare(1, bumped)] == [4]
+    assert ingestor.cache_hits == 1
@@ -0,0 +1,72 @@
+import asyncio
+import json
+import os
+from datetime import UTC, datetime
+
+import pytest
+
+from src.services.audit import AuditSink
+
+
+def spill_lines(path, count, start=0):
+    with open(path, "a", encoding="utf-8") as f:
+        for i in range(start, start + count):
+            f.write(json.dumps({"action": f"a{i}", "created_at": datetime.now(UTC).isoformat()}) + "\n")
+
+
+@pytest.mark.anyio
+async def test_spill_file_is_drained_in_portions(tmp_path):
+    path = str(tmp_path / "spill.jsonl")
+    sink = AuditSink(max_size=3, flush_interval=1, batch_size=10, overflow_policy="spill", spill_path=path)
+    spill_lines(path, 5)
+
+    await sink._load_spilled()
+    assert [e["action"] for e in sink._queue] == ["a0", "a1", "a2"]
+    assert not os.path.exists(path)
+
+    # пока очередь полна, файл не читается; новые записи уходят в свежий файл
+    spill_lines(path, 1, start=5)
+    await sink._load_spilled()
+    assert len(sink._queue) == 3
+
+    sink._queue.clear()
+    await sink._load_spilled()
+    assert [e["action"] for e in sink._queue] == ["a3", "a4"]
+    assert not os.path.exists(sink._draining_path)
+
+    sink._queue.clear()
+    await sink._load_spilled()
+    assert [e["action"] for e in sink._queue] == ["a5"]
+    assert not os.path.exists(path)
+
+
+@pytest.mark.anyio
+async def test_compaction_keeps_only_unloaded_records(tmp_path):
+    path = str(tmp_path / "spill.jsonl")
+    sink = AuditSink(max_size=2, flush_interval=1, batch_size=10, overflow_policy="spill", spill_path=path)
+    spill_lines(path, 5)
+    await sink._load_spilled()
+    sink._compact_draining()
+
+    restarted = AuditSink(max_size=10, flush_interval=1, batch_size=10, overflow_policy="spill", spill_path=path)
+    await restarted._load_spilled()
+    assert [e["action"] for e in restarted._queue] == ["a2", "a3", "a4"]
+
+
+@pytest.mark.anyio
+async def test_overflow_is_spilled_off_the_event_loop(tmp_path, monkeypatch):
+    path = str(tmp_path / "spill.jsonl")
+    sink = AuditSink(max_size=1, flush_interval=1, batch_size=10, overflow_policy="spill", spill_path=path)
+    threads = []
+    to_thread = asyncio.to_thread
+
+    async def tracked(func, *args):
+        threads.append(func.__name__)
+        return await to_thread(func, *args)
+
+    monkeypatch.setattr(asyncio, "to_thread", tracked)
+    await asyncio.gather(*(sink.record(f"a{i}") for i in range(6)))
+    assert "_write_spill" in threads
+    with open(path, encoding="utf-8") as f:
+        assert sorted(json.loads(line)["action"] for line in f) == ["a1", "a2", "a3", "a4", "a5"]
+    assert sink.spilled == 5
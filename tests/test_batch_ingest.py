@@ -0,0 +1,35 @@
+import pytest
+from fastapi import HTTPException
+
+from src.security.agent_key import AgentIdentity
+from src.services.batch_ingest import ingest_batch
+
+pytestmark = pytest.mark.anyio
+
+
+def status_item(server_id: int) -> dict:
+    return {
+        "type": "status",
+        "data": {
+            "agent_key": "k",
+            "server_id": server_id,
+            "ip": "10.0.0.1",
+            "cgm_version": "1.0",
+            "admin_version": "1.0",
+            "timestamp": "2026-10-19T10:00:00Z",
+        },
+    }
+
+
+async def test_batch_for_another_server_is_refused():
+    agent = AgentIdentity(server_id=1, key_hash="h")
+    with pytest.raises(HTTPException) as exc:
+        await ingest_batch([status_item(1), status_item(2)], agent)
+    assert exc.value.status_code == 403
+
+
+async def test_invalid_items_are_reported_per_item():
+    agent = AgentIdentity(server_id=1, key_hash="h")
+    response = await ingest_batch([{"type": "status", "data": {}}], agent)
+    assert (response.accepted, response.rejected) == (0, 1)
+    assert response.results[0].status == "error"
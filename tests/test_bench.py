@@ -0,0 +1,67 @@
+import httpx
+import pytest
+
+from bench.__main__ import percentile, statement_count, summarize
+from bench.fleet import Mix, Recorder, VirtualAgent
+from src.config import settings
+from src.models.agent_models import AgentAlertsRequest, AgentStatusRequest
+
+pytestmark = pytest.mark.anyio
+
+
+def test_percentile():
+    values = [0.1 * i for i in range(1, 101)]
+    assert percentile([], 0.5) == 0.0
+    assert percentile(values, 0.0) == values[0]
+    assert percentile(values, 0.5) == values[50]
+    assert percentile(values, 1.0) == values[-1]
+
+
+def test_summarize_counts_errors_and_statements():
+    recorder = Recorder()
+    for seconds, ok in ((0.01, True), (0.02, True), (0.5, False), (0.03, True)):
+        recorder.observe("status", seconds, ok)
+    summary = summarize(recorder, elapsed=2.0, statements=8)
+    assert summary["requests"] == 4
+    assert summary["errors"] == 1
+    assert summary["rps"] == 2.0
+    assert summary["db_statements_per_request"] == 2.0
+    assert summary["operations"]["status"]["max_ms"] == 500.0
+
+
+async def test_statement_count_sums_worker_counters():
+    metrics = (
+        "# TYPE db_statement_duration_seconds histogram\n"
+        'db_statement_duration_seconds_count{operation="select"} 12.0\n'
+        'db_statement_duration_seconds_count{operation="insert"} 3.0\n'
+        'db_statement_duration_seconds_sum{operation="insert"} 0.5\n'
+    )
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, text=metrics))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        assert await statement_count(client) == 15
+
+
+async def test_virtual_agent_sends_valid_requests():
+    requests = []
+
+    def handle(request):
+        requests.append(request)
+        return httpx.Response(200, json=[] if request.method == "GET" else {"message": "ok"})
+
+    recorder = Recorder()
+    mix = Mix(interval=0, alerts_ratio=1.0, alerts_per_request=3)
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handle), base_url="http://bench") as client:
+        agent = VirtualAgent(client, 42, "key", mix, recorder)
+        await agent.tick()
+        await agent.tick()
+
+    api = settings.API_VERSION
+    assert [request.url.path for request in requests] == [
+        f"{api}/agent/status", f"{api}/agent/alerts", f"{api}/agent/commands"
+    ] * 2
+    AgentStatusRequest.model_validate_json(requests[0].content)
+    alerts = AgentAlertsRequest.model_validate_json(requests[1].content)
+    assert len(alerts.alerts) == 3
+    assert requests[0].headers["x-api-key"] == "key"
+    assert {op: len(values) for op, values in recorder.latencies.items()} == {"status": 2, "alerts": 2, "commands": 2}
+    assert recorder.errors == {}
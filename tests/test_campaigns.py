@@ -0,0 +1,89 @@
+import uuid
+from collections import namedtuple
+from datetime import UTC, datetime
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from fakes import FakeResult, FakeSession
+from src.models.agent_models import CommandResultRequest
+from src.security.agent_key import AgentIdentity
+from src.services.campaigns import CampaignProgress, campaign_progress, record_command_transitions
+from src.services.commands import claim_commands, complete_command, sweep_commands
+from src.services.listings import decode_cursor, list_command_failures
+from src.utils.session_notes import pop_notes
+
+CID = uuid.uuid4()
+AGENT = AgentIdentity(server_id=1, key_hash="h")
+
+
+def claimed(command_id):
+    return {"id": command_id, "type": "restart", "payload": None, "created_at": datetime.now(UTC), "correlation_id": CID}
+
+
+@pytest.mark.anyio
+async def test_command_lifecycle_moves_campaign_counters():
+    progress = CampaignProgress(flush_interval=1, recount_interval=60)
+
+    session = FakeSession(FakeResult([claimed(1), claimed(2), claimed(3)]))
+    await claim_commands(session, server_id=1, limit=10)
+    progress.apply(pop_notes(session, "command_transitions"))
+    assert dict(progress._pending[CID]) == {"pending": -3, "sent": 3}
+
+    session = FakeSession(FakeResult([{"server_id": 1, "status": "sent", "correlation_id": CID}]))
+    await complete_command(session, 1, CommandResultRequest(status="success"), AGENT)
+    progress.apply(pop_notes(session, "command_transitions"))
+
+    # истёк ttl у отправленной команды; у второй истёк lease, и она вернулась в очередь
+    session = FakeSession(
+        FakeResult([{"correlation_id": CID, "status": "sent"}]),
+        FakeResult([{"correlation_id": CID, "status": "pending"}]),
+    )
+    assert await sweep_commands(session, batch_size=10) == (1, 1)
+    progress.apply(pop_notes(session, "command_transitions"))
+
+    assert dict(progress._pending[CID]) == {"pending": -2, "sent": 0, "done": 1, "failed": 1}
+    assert progress.transitions == 6
+
+
+def test_transitions_reach_counters_only_after_commit():
+    with Session(create_engine("sqlite://")) as session:
+        session.execute(text("SELECT 1"))
+        record_command_transitions(session, [(CID, "pending", "sent"), (None, "pending", "sent"), (CID, "sent", "sent")])
+        session.rollback()
+        assert CID not in campaign_progress._pending
+
+        session.execute(text("SELECT 1"))
+        record_command_transitions(session, [(CID, "pending", "sent")])
+        session.commit()
+    try:
+        assert dict(campaign_progress._pending[CID]) == {"pending": -1, "sent": 1}
+    finally:
+        campaign_progress._pending.pop(CID, None)
+
+
+def test_recount_notify_drops_unflushed_deltas():
+    progress = CampaignProgress(flush_interval=1, recount_interval=60)
+    progress.apply([(CID, "pending", "sent")])
+    progress.on_notify(None, 0, "command_campaigns", "")
+    assert progress._pending == {}
+
+
+Failure = namedtuple("Failure", "command_id server_id attempts executed_at message")
+
+
+@pytest.mark.anyio
+async def test_failures_are_paged_by_command_id():
+    rows = [Failure(command_id, 1, 3, None, "timeout") for command_id in (5, 7, 9)]
+    session = FakeSession(FakeResult(rows))
+    page = await list_command_failures(session, CID, limit=2)
+    assert [row["command_id"] for row in page["failures"]] == [5, 7]
+    assert decode_cursor(page["next_cursor"]) == (None, 7)
+
+    session = FakeSession(FakeResult(rows[2:]))
+    page = await list_command_failures(session, CID, limit=2, cursor=page["next_cursor"])
+    assert [row["command_id"] for row in page["failures"]] == [9]
+    assert page["next_cursor"] is None
+    params = session.statements[0].compile().params
+    assert 7 in params.values()
@@ -0,0 +1,36 @@
+import pytest
+
+from fakes import FakeResult, FakeSession
+from src.models.agent_models import CommandResultRequest
+from src.security.agent_key import AgentIdentity
+from src.services.commands import CommandWaiters, complete_command
+
+pytestmark = pytest.mark.anyio
+
+AGENT = AgentIdentity(server_id=1, key_hash="h")
+
+
+async def test_result_for_another_servers_command_is_refused():
+    session = FakeSession(FakeResult([{"server_id": 2, "status": "sent", "correlation_id": None}]))
+    assert not await complete_command(session, 10, CommandResultRequest(status="success"), AGENT)
+    assert session.added == []
+    assert len(session.statements) == 1
+
+
+async def test_result_closes_own_command():
+    session = FakeSession(FakeResult([{"server_id": 1, "status": "sent", "correlation_id": None}]))
+    assert await complete_command(session, 10, CommandResultRequest(status="failed", message="boom"), AGENT)
+    assert len(session.statements) == 2
+    assert session.added[0].status == "failed"
+
+
+async def test_notify_wakes_every_listed_server_once():
+    waiters = CommandWaiters()
+    # одна строка от statement-триггера fan-out, одна — от row-триггера возврата в pending
+    with waiters.watch(7) as seven, waiters.watch(8) as eight, waiters.watch(9) as nine:
+        waiters.on_notify(None, 0, "command_queue", "7,9")
+        assert seven.is_set() and nine.is_set() and not eight.is_set()
+        waiters.on_notify(None, 0, "command_queue", "8")
+        assert eight.is_set()
+        waiters.on_notify(None, 0, "command_queue", "garbage")
+    assert waiters.waiting == 0
@@ -0,0 +1,109 @@
+import gzip
+from datetime import UTC, datetime
+
+import pytest
+from fastapi import APIRouter, FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from src.config import settings
+from src.utils import encoding
+from src.utils.encoding import AgentRoute, inflate
+
+msgpack = encoding.msgpack
+needs_msgpack = pytest.mark.skipif(msgpack is None, reason="msgpack is not installed")
+
+
+class Body(BaseModel):
+    server_id: int
+    timestamp: datetime
+
+
+@pytest.fixture
+def client():
+    router = APIRouter(route_class=AgentRoute)
+
+    @router.post("/status")
+    async def status(req: Body):
+        return {"server_id": req.server_id, "timestamp": req.timestamp}
+
+    app = FastAPI()
+    app.include_router(router)
+    return TestClient(app)
+
+
+def test_gzip_roundtrip_and_limit():
+    body = b'{"server_id": 1}' * 10
+    assert inflate(gzip.compress(body), "gzip", len(body)) == body
+    with pytest.raises(HTTPException) as error:
+        inflate(gzip.compress(body), "gzip", len(body) - 1)
+    assert error.value.status_code == 413
+
+
+def test_zstd_roundtrip_and_limit():
+    zstandard = pytest.importorskip("zstandard")
+    body = b"x" * 200_000
+    compressed = zstandard.ZstdCompressor().compress(body)
+    assert inflate(compressed, "zstd", len(body)) == body
+    with pytest.raises(HTTPException) as error:
+        inflate(compressed, "zstd", 1000)
+    assert error.value.status_code == 413
+
+
+@pytest.mark.parametrize("body, content_encoding, status_code", [(b"not gzip", "gzip", 400), (b"{}", "br", 415)])
+def test_rejected_encodings(body, content_encoding, status_code):
+    with pytest.raises(HTTPException) as error:
+        inflate(body, content_encoding, 1000)
+    assert error.value.status_code == status_code
+
+
+def test_gzip_json_body_validates_into_the_model(client):
+    response = client.post(
+        "/status",
+        content=gzip.compress(b'{"server_id": 7, "timestamp": "2026-03-01T00:00:00Z"}'),
+        headers={"content-type": "application/json", "content-encoding": "gzip"},
+    )
+    assert response.status_code == 200
+    assert response.json()["server_id"] == 7
+
+
+@needs_msgpack
+def test_msgpack_in_and_out(client):
+    payload = msgpack.packb({"server_id": 7, "timestamp": datetime(2026, 3, 1, tzinfo=UTC)}, datetime=True)
+    response = client.post(
+        "/status",
+        content=payload,
+        headers={"content-type": "application/msgpack", "accept": "application/msgpack"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(response.content)["server_id"] == 7
+
+
+@needs_msgpack
+def test_malformed_msgpack_is_400(client):
+    response = client.post("/status", content=b"\xc1", headers={"content-type": "application/msgpack"})
+    assert response.status_code == 400
+
+
+def test_oversize_compressed_body_is_413(client, monkeypatch):
+    monkeypatch.setattr(settings, "AGENT_MAX_BODY_BYTES", 100)
+    response = client.post(
+        "/status",
+        content=gzip.compress(b" " * 1000 + b'{"server_id": 7, "timestamp": "2026-03-01T00:00:00Z"}'),
+        headers={"content-type": "application/json", "content-encoding": "gzip"},
+    )
+    assert response.status_code == 413
+    response = client.post("/status", content=b" " * 200, headers={"content-encoding": "identity"})
+    assert response.status_code == 413
+
+
+def test_without_msgpack_the_reply_stays_json(client, monkeypatch):
+    monkeypatch.setattr(encoding, "msgpack", None)
+    response = client.post(
+        "/status",
+        json={"server_id": 7, "timestamp": "2026-03-01T00:00:00Z"},
+        headers={"accept": "application/msgpack"},
+    )
+    assert response.status_code == 200
+    assert response.json()["server_id"] == 7
@@ -0,0 +1,23 @@
+import json
+
+from src.services.events import MAX_PAYLOAD_BYTES, _payloads
+
+
+def status_event(server_id: int, version: str = "1.0") -> dict:
+    return {"type": "server.status", "server_id": server_id, "ip": "10.0.0.1", "cgm_version": version}
+
+
+def test_payloads_are_split_under_the_notify_limit():
+    events = [status_event(i) for i in range(500)]
+    payloads = _payloads(events)
+    assert len(payloads) > 1
+    assert all(len(payload) <= MAX_PAYLOAD_BYTES for payload in payloads)
+    assert [item["server_id"] for payload in payloads for item in json.loads(payload)] == list(range(500))
+
+
+def test_oversized_event_keeps_only_key_fields():
+    payloads = _payloads([status_event(1, "x" * 20_000), status_event(2)])
+    items = [item for payload in payloads for item in json.loads(payload)]
+    assert items[0] == {"type": "server.status", "server_id": 1, "truncated": True}
+    assert items[1]["cgm_version"] == "1.0"
+    assert all(len(payload) <= MAX_PAYLOAD_BYTES for payload in payloads)
@@ -0,0 +1,10 @@
+from sqlalchemy.dialects import postgresql
+
+from src.services.exports import audit_log_query
+
+
+def test_audit_server_filter_matches_single_server_and_fan_out_payloads():
+    compiled = audit_log_query(5, None, None, None).compile(dialect=postgresql.dialect())
+    sql = str(compiled)
+    assert "->>" in sql and "@>" in sql
+    assert set(map(str, compiled.params.values())) == {"server_id", "server_ids", "5", "[5]"}
@@ -0,0 +1,54 @@
+import json
+from datetime import UTC, datetime, timedelta
+
+from src.models.agent_models import AgentStatusRequest
+from src.services.fleet_snapshot import FleetSnapshot
+
+T0 = datetime(2000, 1, 1, tzinfo=UTC)
+
+
+def status(server_id, ts, version="1.0"):
+    return AgentStatusRequest(
+        agent_key="k", server_id=server_id, ip="10.0.0.1", cgm_version=version, admin_version="1", timestamp=ts
+    )
+
+
+def test_older_status_does_not_overwrite_newer():
+    snapshot = FleetSnapshot(reconcile_interval=60)
+    snapshot.apply_statuses([status(1, T0 + timedelta(seconds=10), "2.0")])
+    version = snapshot.version
+    snapshot.apply_statuses([status(1, T0, "1.0")])
+    assert snapshot.get(1)["cgm_version"] == "2.0"
+    assert snapshot.version == version
+
+
+def test_naive_timestamps_compare_as_utc():
+    snapshot = FleetSnapshot(reconcile_interval=60)
+    snapshot.apply_statuses([status(1, T0)])
+    snapshot.apply_statuses([status(1, (T0 + timedelta(seconds=1)).replace(tzinfo=None), "2.0")])
+    assert snapshot.get(1)["cgm_version"] == "2.0"
+    assert snapshot.get(1)["last_update"].tzinfo is not None
+
+
+def test_render_is_cached_per_version_and_etag_follows_content():
+    snapshot = FleetSnapshot(reconcile_interval=60)
+    snapshot.apply_statuses([status(2, T0), status(1, T0)])
+    body, etag = snapshot.render()
+    assert [server["id"] for server in json.loads(body)] == [1, 2]
+    assert snapshot.render() == (body, etag)
+
+    snapshot.apply_alerts([{"server_id": 1, "severity": "Minor"}])
+    assert snapshot.render()[1] == etag
+    snapshot.apply_alerts([{"server_id": 1, "severity": "Critical"}])
+    assert snapshot.render()[1] != etag
+
+    snapshot.apply_critical({1: False})
+    assert snapshot.render() == (body, etag)
+
+
+def test_etag_matches_across_workers():
+    first, second = FleetSnapshot(reconcile_interval=60), FleetSnapshot(reconcile_interval=60)
+    first.apply_statuses([status(1, T0)])
+    second.apply_statuses([status(1, T0 - timedelta(seconds=5)), status(1, T0)])
+    assert first.version != second.version
+    assert first.render()[1] == second.render()[1]
@@ -0,0 +1,81 @@
+from contextlib import asynccontextmanager
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+from fakes import FakeResult, FakeSession
+from src.services import heartbeat
+from src.services.heartbeat import HeartbeatTracker, TimerWheel
+
+pytestmark = pytest.mark.anyio
+
+# часы БД; часы воркера и агента в проверке не участвуют
+DB_NOW = datetime(2000, 1, 1, 12, 0, tzinfo=UTC)
+
+
+@pytest.fixture
+def session(monkeypatch):
+    fake = FakeSession(
+        FakeResult([(1, DB_NOW - timedelta(seconds=5)), (2, DB_NOW - timedelta(seconds=60))]),
+        scalars=[DB_NOW],
+    )
+
+    @asynccontextmanager
+    async def open_session():
+        yield fake
+
+    monkeypatch.setattr(heartbeat, "async_session", open_session)
+    written = []
+
+    async def write(session, rows):
+        written.extend(row["server_id"] for row in rows)
+
+    monkeypatch.setattr(heartbeat.alert_ingestor, "write", write)
+    monkeypatch.setattr(heartbeat.alert_ingestor, "remember", lambda rows: None)
+    return written
+
+
+async def test_silence_is_measured_on_last_seen_by_the_database_clock(session):
+    tracker = HeartbeatTracker(interval=10, missed_intervals=3, tick=1)
+    await tracker.check_expired([1, 2])
+    assert session == [2]
+    assert tracker.offline == 1
+    # сервер 1 видел другой воркер 5 с назад по часам БД — таймер снова взведён
+    assert 1 in tracker._wheel and tracker.rearmed == 1
+
+
+def test_timer_wheel_expires_keys_once_their_deadline_passed():
+    wheel = TimerWheel(tick=1, horizon=30)
+    origin = wheel._origin
+    wheel.schedule("a", origin + 5)
+    wheel.schedule("b", origin + 10)
+    assert len(wheel) == 2
+    assert wheel.advance(origin + 4.5) == []
+    assert wheel.advance(origin + 5) == ["a"]
+    assert "a" not in wheel and "b" in wheel
+    assert wheel.advance(origin + 100) == ["b"]
+    assert len(wheel) == 0
+
+
+def test_timer_wheel_reschedule_and_cancel():
+    wheel = TimerWheel(tick=1, horizon=30)
+    origin = wheel._origin
+    wheel.schedule("a", origin + 5)
+    wheel.schedule("a", origin + 20)
+    wheel.schedule("b", origin + 5)
+    wheel.cancel("b")
+    wheel.cancel("missing")
+    assert wheel.advance(origin + 10) == []
+    assert wheel.advance(origin + 20) == ["a"]
+
+
+def test_timer_wheel_clamps_deadlines_into_one_rotation():
+    wheel = TimerWheel(tick=1, horizon=10)
+    origin = wheel._origin
+    wheel.advance(origin + 3)
+    # прошедший срок срабатывает на следующем тике, а слишком дальний — не позже одного оборота
+    wheel.schedule("past", origin)
+    wheel.schedule("far", origin + 1000)
+    assert wheel.advance(origin + 4) == ["past"]
+    assert wheel.advance(origin + 3 + len(wheel._slots) - 2) == []
+    assert wheel.advance(origin + 3 + len(wheel._slots) - 1) == ["far"]
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+from src.utils.instrumentation import route_template
+
+seen = []
+
+
+class RecordRoute:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        await self.app(scope, receive, send)
+        if scope["type"] == "http":
+            seen.append(route_template(scope))
+
+
+def test_route_template_keeps_static_segments_equal_to_a_parameter():
+    agent = APIRouter(prefix="/agent")
+
+    @agent.get("/servers/{name}/servers")
+    def servers(name: str):
+        return {}
+
+    api = APIRouter(prefix="/api/v1")
+    api.include_router(agent)
+    app = FastAPI()
+    app.include_router(api)
+    app.add_middleware(RecordRoute)
+
+    client = TestClient(app)
+    client.get("/api/v1/agent/servers/servers/servers")
+    client.get("/nowhere")
+    assert seen == ["/api/v1/agent/servers/{name}/servers", "<unmatched>"]
@@ -0,0 +1,45 @@
+from datetime import UTC, datetime
+
+import pytest
+
+from fakes import FakeResult, FakeSession
+from src.services.alert_archive import partition_name
+from src.services.partitions import add_months, drop_partitions_before
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize(
+    "month, months, expected",
+    [
+        (datetime(2026, 11, 1), 1, datetime(2026, 12, 1)),
+        (datetime(2026, 12, 1), 1, datetime(2027, 1, 1)),
+        (datetime(2026, 1, 1), -1, datetime(2025, 12, 1)),
+        (datetime(2026, 3, 1), -14, datetime(2025, 1, 1)),
+    ],
+)
+def test_add_months_crosses_year_boundaries(month, months, expected):
+    assert add_months(month, months) == expected
+
+
+def test_partition_name():
+    assert partition_name(datetime(2026, 3, 1, tzinfo=UTC)) == "alert_history_y2026m03"
+
+
+async def test_drops_only_partitions_ending_before_cutoff():
+    session = FakeSession(
+        FakeResult(
+            [
+                ("alert_history_y2026m01", "FOR VALUES FROM ('2026-01-01 00:00:00+00') TO ('2026-02-01 00:00:00+00')"),
+                ("alert_history_y2026m02", "FOR VALUES FROM ('2026-02-01 00:00:00+00') TO ('2026-03-01 00:00:00+00')"),
+                ("alert_history_y2026m03", "FOR VALUES FROM ('2026-03-01 00:00:00+00') TO ('2026-04-01 00:00:00+00')"),
+                ("alert_history_default", "DEFAULT"),
+            ]
+        )
+    )
+    dropped = await drop_partitions_before(session, "alert_history", datetime(2026, 3, 1, tzinfo=UTC))
+    assert dropped == ["alert_history_y2026m01", "alert_history_y2026m02"]
+    assert [str(statement) for statement in session.statements[1:]] == [
+        'DROP TABLE "alert_history_y2026m01"',
+        'DROP TABLE "alert_history_y2026m02"',
+    ]
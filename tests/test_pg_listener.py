@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from src.services import pg_listener as pg_listener_module
+from src.services.pg_listener import PgListener
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeConnection:
+    def __init__(self):
+        self.listeners = {}
+        self.on_terminate = None
+        self.closed = False
+
+    async def add_listener(self, channel, callback):
+        self.listeners[channel] = callback
+
+    def add_termination_listener(self, callback):
+        self.on_terminate = callback
+
+    def is_closed(self):
+        return self.closed
+
+    async def close(self, timeout=None):
+        self.closed = True
+
+    def drop(self):
+        self.closed = True
+        self.on_terminate(self)
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    opened = []
+
+    async def connect(dsn):
+        opened.append(FakeConnection())
+        return opened[-1]
+
+    monkeypatch.setattr(pg_listener_module.asyncpg, "connect", connect)
+    return opened
+
+
+async def wait_for(condition):
+    for _ in range(100):
+        if condition():
+            return
+        await asyncio.sleep(0)
+    raise AssertionError("condition not reached")
+
+
+async def test_notifications_fan_out_and_a_failing_handler_is_isolated(connections):
+    listener = PgListener("postgresql://test")
+    received = []
+
+    def broken(conn, pid, channel, payload):
+        raise RuntimeError
+
+    listener.subscribe("command_queue", broken)
+    listener.subscribe("command_queue", lambda conn, pid, channel, payload: received.append(payload))
+    await listener.start()
+    try:
+        await wait_for(lambda: connections and "command_queue" in connections[0].listeners)
+        connections[0].listeners["command_queue"](connections[0], 1, "command_queue", "7,8")
+        assert received == ["7,8"]
+        assert listener.connected
+    finally:
+        await listener.stop()
+
+
+async def test_reconnect_relistens_and_calls_hooks(connections):
+    listener = PgListener("postgresql://test")
+    listener.subscribe("command_queue", lambda *args: None)
+    resynced = []
+    listener.on_reconnect(lambda: resynced.append(1))
+    await listener.start()
+    try:
+        await wait_for(lambda: connections and connections[0].on_terminate)
+        assert resynced == []
+        connections[0].drop()
+        await wait_for(lambda: len(connections) == 2 and "command_queue" in connections[1].listeners)
+        await wait_for(lambda: resynced == [1])
+    finally:
+        await listener.stop()
@@ -0,0 +1,86 @@
+import pytest
+from fastapi import APIRouter, Depends, FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from src.security import rate_limit
+from src.security.agent_key import AgentIdentity, AgentKeyCache, hash_agent_key
+from src.security.rate_limit import AgentIngestRoute, AgentRateLimiter, ConcurrencyGate
+
+looked_up = []
+
+
+def lookup():
+    looked_up.append(1)
+
+
+class Body(BaseModel):
+    server_id: int
+
+
+def client(monkeypatch, gate_limit=10, burst=1):
+    monkeypatch.setattr(rate_limit, "ingest_gate", ConcurrencyGate(gate_limit, retry_after=1, jitter=0))
+    monkeypatch.setattr(
+        rate_limit, "agent_rate_limiter", AgentRateLimiter(0, burst, {}, max_keys=2, max_unverified_keys=2, jitter=0)
+    )
+    router = APIRouter(route_class=AgentIngestRoute)
+
+    @router.post("/status")
+    async def status(req: Body, _=Depends(lookup)):
+        return {"server_id": req.server_id}
+
+    app = FastAPI()
+    app.include_router(router)
+    looked_up.clear()
+    return TestClient(app)
+
+
+def test_overloaded_request_is_shed_before_body_and_key_lookup(monkeypatch):
+    response = client(monkeypatch, gate_limit=0).post("/status", content=b"not json", headers={"X-API-Key": "k"})
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
+    assert looked_up == []
+
+
+def test_bucket_is_per_api_key(monkeypatch):
+    http = client(monkeypatch, burst=1)
+    assert http.post("/status", json={"server_id": 1}, headers={"X-API-Key": "a"}).status_code == 200
+    # ретранслятор, пишущий за другой сервер, берёт токены из того же bucket
+    assert http.post("/status", json={"server_id": 2}, headers={"X-API-Key": "a"}).status_code == 429
+    assert http.post("/status", json={"server_id": 1}, headers={"X-API-Key": "b"}).status_code == 200
+    assert len(looked_up) == 2
+
+
+def test_override_by_key_hash():
+    limiter = AgentRateLimiter(1, 1, {hash_agent_key("relay"): (5.0, 100.0)}, max_keys=10, max_unverified_keys=10, jitter=0)
+    assert limiter.limits(hash_agent_key("relay")) == (5.0, 100.0)
+    assert limiter.limits(hash_agent_key("other")) == (1, 1)
+
+
+def test_unverified_keys_do_not_evict_verified_buckets(monkeypatch):
+    cache = AgentKeyCache(10, 60, 10, 60)
+    monkeypatch.setattr(rate_limit, "agent_key_cache", cache)
+    real = hash_agent_key("real")
+    cache.put(real, AgentIdentity(server_id=1, key_hash=real))
+    limiter = AgentRateLimiter(0, 1, {}, max_keys=10, max_unverified_keys=2, jitter=0)
+
+    limiter.check(real)
+    for i in range(100):
+        limiter.check(hash_agent_key(f"random-{i}"))
+    assert limiter.stats()["buckets"] == 1
+    assert limiter.stats()["unverified_buckets"] == 2
+    # bucket настоящего агента не сброшен вытеснением: токенов по-прежнему нет
+    with pytest.raises(HTTPException):
+        limiter.check(real)
+
+
+def test_bucket_moves_over_once_the_key_is_verified(monkeypatch):
+    cache = AgentKeyCache(10, 60, 10, 60)
+    monkeypatch.setattr(rate_limit, "agent_key_cache", cache)
+    key = hash_agent_key("new")
+    limiter = AgentRateLimiter(0, 1, {}, max_keys=10, max_unverified_keys=10, jitter=0)
+    limiter.check(key)
+    cache.put(key, AgentIdentity(server_id=1, key_hash=key))
+    with pytest.raises(HTTPException):
+        limiter.check(key)
+    assert limiter.stats()["unverified_buckets"] == 0
@@ -0,0 +1,64 @@
+from datetime import UTC, datetime
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session
+
+from fakes import FakeResult, FakeSession
+from src.models.agent_models import AgentStatusRequest
+from src.services.alert_ingest import record_alert_changes
+from src.services.region_rollup import RegionRollup, fleet_snapshot, region_rollup
+from src.services.status_writer import upsert_statuses
+from src.utils.session_notes import pop_notes
+
+
+def test_alert_changes_of_rolled_back_savepoint_are_not_counted(monkeypatch):
+    applied, notified = [], []
+    monkeypatch.setattr(region_rollup, "apply", lambda opened, closed, first_seen: applied.append((opened, closed)))
+    engine = create_engine("sqlite://")
+    # события алертов уходят через pg_notify перед коммитом
+    event.listen(
+        engine,
+        "connect",
+        lambda conn, record: conn.create_function("pg_notify", 2, lambda channel, payload: notified.append(payload)),
+    )
+    with Session(engine) as session:
+        session.execute(text("SELECT 1"))
+        record_alert_changes(session, opened=[(1, "Major", "disk")])
+        with pytest.raises(ValueError):
+            # так apply_rules откатывает правила, упавшие посреди работы
+            with session.begin_nested():
+                record_alert_changes(session, opened=[(1, "Critical", "cpu")], closed=[(1, "Major", "disk")])
+                raise ValueError
+        session.commit()
+    assert applied == [([(1, "Major", "disk")], [])]
+    assert len(notified) == 1 and '"cpu"' not in notified[0]
+
+
+def test_recompute_notify_drops_unflushed_deltas():
+    rollup = RegionRollup(flush_interval=1, recompute_interval=60)
+    rollup._pending = {1: {"alerts_major": 1}}
+    version = rollup.version
+    rollup.on_notify(None, 0, "region_summaries", "")
+    assert rollup._pending == {}
+    assert rollup.version == version + 1
+
+
+@pytest.mark.anyio
+async def test_first_heartbeat_counts_the_server_online(monkeypatch):
+    statuses = [
+        AgentStatusRequest(
+            agent_key="k", server_id=server_id, ip="10.0.0.1", cgm_version="1", admin_version="1",
+            timestamp=datetime.now(UTC),
+        )
+        for server_id in (1, 2)
+    ]
+    session = FakeSession(FakeResult([(1, True), (2, False)]))
+    await upsert_statuses(session, statuses)
+    first_seen = pop_notes(session, "servers_first_seen")
+    assert first_seen == [1]
+
+    monkeypatch.setattr(fleet_snapshot, "get", lambda server_id: {"region_id": 7})
+    rollup = RegionRollup(flush_interval=1, recompute_interval=60)
+    rollup.apply((), (), first_seen)
+    assert dict(rollup._pending[7]) == {"online_count": 1}
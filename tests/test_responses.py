@@ -0,0 +1,26 @@
+import json
+from datetime import UTC, datetime
+
+import pytest
+
+from src.utils import responses
+from src.utils.responses import ORJSONResponse
+
+CONTENT = {"id": 1, "ts": "2026-03-01T00:00:00+00:00", "tags": ["a", "b"], "nested": {"x": None}}
+
+
+def test_body_matches_standard_json():
+    assert json.loads(ORJSONResponse(CONTENT).body) == CONTENT
+
+
+@pytest.mark.skipif(responses.orjson is None, reason="orjson is not installed")
+def test_orjson_handles_datetimes_and_non_string_keys():
+    body = ORJSONResponse({1: datetime(2026, 3, 1, tzinfo=UTC)}).body
+    assert json.loads(body) == {"1": "2026-03-01T00:00:00+00:00"}
+
+
+def test_falls_back_to_json_without_orjson(monkeypatch):
+    monkeypatch.setattr(responses, "orjson", None)
+    response = ORJSONResponse(CONTENT)
+    assert json.loads(response.body) == CONTENT
+    assert response.media_type == "application/json"
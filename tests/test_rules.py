@@ -0,0 +1,102 @@
+import json
+from datetime import UTC, datetime
+
+import pytest
+from pydantic import ValidationError
+
+from src.models.agent_models import AgentStatusRequest
+from src.models.rule_models import RuleCondition
+from src.services.rules import RuleEngine, version_key
+
+RULES = [
+    {"name": "cpu", "severity": "Major", "text": "CPU above 90%", "when": [{"metric": "cpu", "op": ">", "value": 90}]},
+    {
+        "name": "old agent on hot disk",
+        "severity": "Critical",
+        "text": "Outdated agent with a full disk",
+        "when": [
+            {"field": "cgm_version", "op": "version<", "value": "4.10"},
+            {"metric": "disk", "op": ">=", "value": 95},
+        ],
+    },
+    {"name": "idle", "severity": "Minor", "text": "CPU idle", "when": [{"metric": "cpu", "op": "!=", "value": 0}],
+     "enabled": False},
+]
+
+
+def status(server_id, cgm_version="4.10.0", **metrics):
+    return AgentStatusRequest(
+        agent_key="k", server_id=server_id, ip="10.0.0.1", cgm_version=cgm_version, admin_version="1",
+        timestamp=datetime(2026, 3, 1, tzinfo=UTC), metrics=metrics or None,
+    )
+
+
+@pytest.fixture
+def engine():
+    engine = RuleEngine(path="unused.json", reload_interval=60)
+    engine.load(json.dumps(RULES))
+    return engine
+
+
+def matches(engine, statuses):
+    return {
+        compiled.rule.name: [statuses[i].server_id for i in indices] for compiled, indices in engine.evaluate(statuses)
+    }
+
+
+def test_version_key_orders_numerically():
+    assert version_key("4.10.2-rc1") == (4, 10, 2, 1)
+    assert version_key("4.9") < version_key("4.10")
+    assert version_key(None) == ()
+
+
+def test_disabled_rules_are_not_loaded(engine):
+    assert [rule.name for rule in engine.rules] == ["cpu", "old agent on hot disk"]
+
+
+def test_conditions_are_combined_per_status(engine):
+    statuses = [
+        status(1, cpu=95),
+        status(2, cgm_version="4.9.1", disk=97),
+        status(3, cgm_version="4.11", disk=99, cpu=10),
+        status(4, cgm_version="4.9.1", disk=50),
+    ]
+    assert matches(engine, statuses) == {"cpu": [1], "old agent on hot disk": [2]}
+    assert engine.evaluated == 4
+
+
+def test_missing_metric_or_field_never_matches():
+    engine = RuleEngine(path="unused.json", reload_interval=60)
+    engine.load(json.dumps([
+        {"name": "ne", "severity": "Minor", "text": "cpu", "when": [{"metric": "cpu", "op": "!=", "value": 0}]},
+        {
+            "name": "notin",
+            "severity": "Minor",
+            "text": "ver",
+            "when": [{"field": "cgm_version", "op": "not in", "value": ["4.10"]}],
+        },
+    ]))
+    statuses = [status(1, cgm_version=""), status(2, cgm_version="4.9", cpu=5)]
+    assert matches(engine, statuses) == {"ne": [2], "notin": [2]}
+
+
+def test_invalid_rules_file_keeps_previous_rules(engine, tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text("[{\"name\": \"broken\"}]")
+    engine.path, engine.reload_interval = str(path), 0
+    engine.reload_if_changed()
+    assert engine.reload_errors == 1
+    assert len(engine.rules) == 2
+
+    path.unlink()
+    engine.reload_if_changed()
+    assert engine.rules == [] and not engine.configured
+
+
+def test_condition_operands_are_validated():
+    with pytest.raises(ValidationError):
+        RuleCondition(metric="cpu", field="ip", op=">", value=1)
+    with pytest.raises(ValidationError):
+        RuleCondition(metric="cpu", op="in", value=["1"])
+    with pytest.raises(ValidationError):
+        RuleCondition(field="ip", op="in", value="10.0.0.1")
@@ -0,0 +1,41 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from src.utils.session_notes import add_notes, get_notes, pop_notes
+
+
+@pytest.fixture
+def session():
+    with Session(create_engine("sqlite://")) as session:
+        session.execute(text("SELECT 1"))
+        yield session
+
+
+def test_rolled_back_savepoint_takes_back_only_its_notes(session):
+    add_notes(session, "test_notes", ["outer"])
+    with pytest.raises(ValueError):
+        with session.begin_nested():
+            add_notes(session, "test_notes", ["inner"])
+            add_notes(session, "test_inner_only", ["inner"])
+            raise ValueError
+    assert get_notes(session, "test_notes") == ["outer"]
+    assert get_notes(session, "test_inner_only") == []
+
+
+def test_committed_savepoint_keeps_its_notes(session):
+    with session.begin_nested():
+        add_notes(session, "test_notes", ["inner"])
+    assert get_notes(session, "test_notes") == ["inner"]
+    assert pop_notes(session, "test_notes") == ["inner"]
+
+
+def test_rollback_and_close_discard_notes(session):
+    add_notes(session, "test_notes", ["a"])
+    session.rollback()
+    assert get_notes(session, "test_notes") == []
+
+    session.execute(text("SELECT 1"))
+    add_notes(session, "test_notes", ["b"])
+    session.close()
+    assert get_notes(session, "test_notes") == []
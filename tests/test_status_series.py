@@ -0,0 +1,88 @@
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from pydantic import ValidationError
+
+from fakes import FakeSession
+from src.database import UPSERT_CHUNK_SIZE
+from src.models.agent_models import AgentStatusRequest
+from src.services.status_series import (
+    MAX_BUCKETS_PER_PASS,
+    RETENTION_DAYS,
+    STEPS,
+    StatusRollupJob,
+    floor_ts,
+    insert_samples,
+    pick_resolution,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+def watermark_updates(session: FakeSession) -> dict:
+    updates = {}
+    for statement in session.statements:
+        if getattr(statement, "table", None) is not None and statement.table.name == "status_rollup_watermarks":
+            params = statement.compile().params
+            updates[params["resolution"]] = params["rolled_until"]
+    return updates
+
+
+async def test_watermark_moves_past_an_empty_window():
+    now = datetime(2026, 10, 19, 12, 0, tzinfo=UTC)
+    # 1m отстала на сутки (простой), 1h и 1d ещё ни разу не считались
+    behind = datetime(2026, 10, 18, 12, 0, tzinfo=UTC)
+    session = FakeSession(scalars=[behind, None, None, None, None, None])
+    await StatusRollupJob(60).rollup(session, now)
+
+    assert watermark_updates(session)["1m"] == behind + timedelta(minutes=MAX_BUCKETS_PER_PASS)
+
+
+async def test_samples_are_inserted_in_chunks():
+    statuses = [
+        AgentStatusRequest(
+            agent_key="k",
+            server_id=i,
+            ip="10.0.0.1",
+            cgm_version="1",
+            admin_version="1",
+            timestamp=datetime.now(UTC),
+            metrics={"cpu": 1.0},
+        )
+        for i in range(UPSERT_CHUNK_SIZE * 2 + 1)
+    ]
+    session = FakeSession()
+    await insert_samples(session, statuses)
+    assert len(session.statements) == 3
+
+
+@pytest.mark.parametrize("value", [float("nan"), float("inf"), float("-inf")])
+def test_non_finite_metrics_are_rejected(value):
+    with pytest.raises(ValidationError):
+        AgentStatusRequest(
+            agent_key="k", server_id=1, ip="10.0.0.1", cgm_version="1", admin_version="1",
+            timestamp=datetime.now(UTC), metrics={"cpu": value},
+        )
+
+
+def test_floor_ts_aligns_to_step():
+    ts = datetime(2026, 3, 1, 10, 17, 42, 500000, tzinfo=UTC)
+    assert floor_ts(ts, 60) == datetime(2026, 3, 1, 10, 17, tzinfo=UTC)
+    assert floor_ts(ts, 3600) == datetime(2026, 3, 1, 10, tzinfo=UTC)
+    assert floor_ts(ts, 86400) == datetime(2026, 3, 1, tzinfo=UTC)
+
+
+def test_pick_resolution_prefers_the_finest_level_within_max_points():
+    now = datetime(2026, 3, 1, tzinfo=UTC)
+    start = now - timedelta(hours=1)
+    assert pick_resolution(start, now, 3600 // STEPS["raw"], now) == "raw"
+    assert pick_resolution(start, now, 60, now) == "1m"
+    assert pick_resolution(start, now, 1, now) == "1h"
+
+
+def test_pick_resolution_skips_levels_already_expired_at_start():
+    now = datetime(2026, 3, 1, tzinfo=UTC)
+    start = now - timedelta(days=RETENTION_DAYS["raw"] + 1)
+    assert pick_resolution(start, start + timedelta(minutes=10), 10_000, now) == "1m"
+    start = now - timedelta(days=RETENTION_DAYS["1h"] + 1)
+    assert pick_resolution(start, start + timedelta(minutes=10), 10_000, now) == "1d"
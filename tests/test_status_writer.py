@@ -0,0 +1,140 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import UTC, datetime
+
+import pytest
+from sqlalchemy.exc import DataError, OperationalError
+
+from fakes import FakeSession
+from src.models.agent_models import AgentStatusRequest
+from src.services import status_writer as status_writer_module
+from src.services.status_writer import StatusWriteBehind
+
+pytestmark = pytest.mark.anyio
+
+
+def status(server_id):
+    return AgentStatusRequest(
+        agent_key="k", server_id=server_id, ip="10.0.0.1", cgm_version="1", admin_version="1",
+        timestamp=datetime.now(UTC),
+    )
+
+
+@pytest.fixture
+def slow_persist(monkeypatch):
+    """persist_statuses that waits until the test releases it."""
+    started, release, written = asyncio.Event(), asyncio.Event(), []
+
+    async def persist(session, statuses):
+        started.set()
+        await release.wait()
+        written.extend(statuses)
+        return []
+
+    @asynccontextmanager
+    async def session():
+        yield FakeSession()
+
+    monkeypatch.setattr(status_writer_module, "persist_statuses", persist)
+    monkeypatch.setattr(status_writer_module, "async_session", session)
+    monkeypatch.setattr(status_writer_module, "statuses_committed", lambda statuses, rule_alerts: None)
+    return started, release, written
+
+
+async def test_cancelled_flush_puts_the_batch_back(slow_persist):
+    started, release, written = slow_persist
+    writer = StatusWriteBehind(flush_interval=60, batch_size=100, max_attempts=3)
+    writer.submit(status(1))
+    task = asyncio.create_task(writer.flush())
+    await started.wait()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert list(writer._pending) == [1]
+    assert writer.flush_errors == 0
+
+
+async def test_stop_lets_the_running_flush_finish(slow_persist):
+    started, release, written = slow_persist
+    writer = StatusWriteBehind(flush_interval=60, batch_size=1, max_attempts=3)
+    await writer.start()
+    writer.submit(status(1))
+    await started.wait()
+    stopping = asyncio.create_task(writer.stop())
+    await asyncio.sleep(0)
+    writer.submit(status(2))
+    release.set()
+    await stopping
+    assert sorted(s.server_id for s in written) == [1, 2]
+    assert writer.queue_depth == 0
+
+
+@pytest.fixture
+def failing_persist(monkeypatch):
+    """persist_statuses failing for the servers in `bad` with the error in `error`."""
+    bad, written, error = set(), [], {"cls": DataError}
+
+    async def persist(session, statuses):
+        if bad & {s.server_id for s in statuses}:
+            raise error["cls"]("INSERT", {}, Exception("invalid input"))
+        written.extend(s.server_id for s in statuses)
+        return []
+
+    @asynccontextmanager
+    async def session():
+        yield FakeSession()
+
+    monkeypatch.setattr(status_writer_module, "persist_statuses", persist)
+    monkeypatch.setattr(status_writer_module, "async_session", session)
+    monkeypatch.setattr(status_writer_module, "statuses_committed", lambda statuses, rule_alerts: None)
+    return bad, written, error
+
+
+async def test_rejected_status_is_isolated_and_dropped(failing_persist):
+    bad, written, _ = failing_persist
+    bad.add(3)
+    writer = StatusWriteBehind(flush_interval=60, batch_size=100, max_attempts=2)
+    for server_id in range(1, 6):
+        writer.submit(status(server_id))
+    for _ in range(2):
+        with pytest.raises(DataError):
+            await writer.flush()
+    assert writer.queue_depth == 5
+
+    assert await writer.flush() == 5
+    assert sorted(written) == [1, 2, 4, 5]
+    assert writer.dropped == 1
+    assert writer.queue_depth == 0
+
+
+async def test_outage_keeps_the_batch(failing_persist):
+    bad, written, error = failing_persist
+    bad.add(3)
+    error["cls"] = OperationalError
+    writer = StatusWriteBehind(flush_interval=60, batch_size=100, max_attempts=1)
+    writer.submit(status(1))
+    writer.submit(status(2))
+    writer.submit(status(3))
+    for _ in range(2):
+        with pytest.raises(OperationalError):
+            await writer.flush()
+    # при сбое связи статус не отбрасывается; записанные при делении части в буфер не возвращаются
+    assert sorted(written) == [1, 2]
+    assert list(writer._pending) == [3]
+    assert writer.dropped == 0
+
+
+async def test_drain_gives_up_at_the_deadline_and_keeps_the_buffer(failing_persist):
+    bad, written, error = failing_persist
+    bad.add(1)
+    error["cls"] = OperationalError
+    writer = StatusWriteBehind(flush_interval=60, batch_size=1, max_attempts=3)
+    writer.submit(status(1))
+    writer.submit(status(2))
+    await writer.drain(timeout=0)
+    assert writer.queue_depth == 2
+
+    bad.clear()
+    await writer.drain(timeout=0)
+    assert sorted(written) == [1, 2]
+    assert writer.queue_depth == 0